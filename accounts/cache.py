@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+
+
+# the alias of the cache (in settings.CACHES) which keeps the logged in users for a short time
+USERS_CACHE_ALIAS = 'users'
+
+
+def _user_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def get_user(request):
+    """
+    Like django.contrib.auth.get_user, but read the session's user from the cache.
+    The user is cached when it's read from the database and deleted from the cache when it's saved.
+    """
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    cache = caches[USERS_CACHE_ALIAS]
+    user = cache.get(_user_key(user_id))
+    if user is None:
+        # read and verify it like django does
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            # a save between the read and this set leaves a stale user for the (short) timeout of the cache
+            cache.set(_user_key(user.pk), user)
+        return user
+
+    # verify the session like django does, e.g. the password may have been changed in another session
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash())):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+def invalidate_user(user_id):
+    caches[USERS_CACHE_ALIAS].delete(_user_key(user_id))
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.cache import USERS_CACHE_ALIAS
+
+
+
+class CachedSessionAndUserTests(TestCase):
+    def setUp(self):
+        caches[USERS_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.client.login(username='testuser', password='testpass123')
+        self.url = reverse('timing:chart-data-api', kwargs={'kind': 'subject'})
+
+    def get_queried_tables(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return ' '.join(query['sql'] for query in context.captured_queries)
+
+    def test_session_and_user_are_read_from_the_cache(self):
+        self.assertIn('"accounts_user"', self.get_queried_tables())
+        queried_tables = self.get_queried_tables()
+        self.assertNotIn('"django_session"', queried_tables)
+        self.assertNotIn('"accounts_user"', queried_tables)
+
+    def test_saving_the_user_invalidates_the_cached_one(self):
+        self.get_queried_tables()
+        self.user.first_name = 'changed'
+        self.user.save()
+        self.assertIn('"accounts_user"', self.get_queried_tables())
+        self.assertEqual(self.client.get(self.url).wsgi_request.user.first_name, 'changed')
+
+    def test_inactive_user_is_logged_out(self):
+        self.get_queried_tables()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_session_of_a_changed_password_is_logged_out(self):
+        self.get_queried_tables()
+        # change the cached user's password hash, like a password change in another process would
+        cache = caches[USERS_CACHE_ALIAS]
+        key = f'accounts:user:{self.user.pk}'
+        cached_user = cache.get(key)
+        cached_user.set_password('newpass123')
+        cache.set(key, cached_user)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
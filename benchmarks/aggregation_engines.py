@@ -0,0 +1,75 @@
+"""
+Compare the pure-Python and the NumPy aggregation engines on in-memory rows.
+
+Run it from the project root (numpy must be installed):
+    python -m benchmarks.aggregation_engines
+"""
+import datetime
+import os
+import random
+import time
+import uuid
+
+import django
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from timing.aggregation import get_aggregation_engine  # noqa: E402
+from timing.views import create_dates_list  # noqa: E402
+
+
+SUBJECTS_COUNT = 40
+TAGS_COUNT = 100
+DAYS_COUNT = 730
+ROWS_COUNTS = (10_000, 100_000, 1_000_000)
+REPEAT = 3
+
+
+def make_fixture(rows_count, seed=0):
+    rnd = random.Random(seed)
+    subject_ids = [uuid.uuid4() for _ in range(SUBJECTS_COUNT)]
+    tag_ids = [uuid.uuid4() for _ in range(TAGS_COUNT)]
+    max_date = datetime.date(2022, 5, 1)
+    min_date = max_date - datetime.timedelta(days=DAYS_COUNT - 1)
+    dates = create_dates_list(min_date, max_date)
+    # (subject_id, date, duration) rows and (tag_id, duration) rows, as they are read with values_list
+    date_rows = [(rnd.choice(subject_ids), rnd.choice(dates), rnd.randint(1, 120)) for _ in range(rows_count)]
+    tag_rows = [(rnd.choice(tag_ids), rnd.randint(1, 120)) for _ in range(rows_count)]
+    return subject_ids, dates, date_rows, tag_rows
+
+
+def best_time(func, *args):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    engines = {name: get_aggregation_engine(name) for name in ('python', 'numpy')}
+    print(f'{SUBJECTS_COUNT} subjects, {TAGS_COUNT} tags, {DAYS_COUNT} days, best of {REPEAT} runs (seconds)')
+    print(f'{"rows":>10} {"operation":>20} {"python":>10} {"numpy":>10} {"speedup":>8}')
+    for rows_count in ROWS_COUNTS:
+        subject_ids, dates, date_rows, tag_rows = make_fixture(rows_count)
+        python_engine, numpy_engine = engines['python'], engines['numpy']
+        # both engines must agree before being compared
+        assert (python_engine.date_subject_matrix(date_rows, subject_ids, dates)
+                == numpy_engine.date_subject_matrix(date_rows, subject_ids, dates))
+        assert dict(python_engine.sum_durations_by_key(tag_rows)) == numpy_engine.sum_durations_by_key(tag_rows)
+
+        for operation, args in (
+            ('date_subject_matrix', (date_rows, subject_ids, dates)),
+            ('sum_durations_by_key', (tag_rows,)),
+        ):
+            python_seconds = best_time(getattr(python_engine, operation), *args)
+            numpy_seconds = best_time(getattr(numpy_engine, operation), *args)
+            print(f'{rows_count:>10} {operation:>20} {python_seconds:>10.4f} {numpy_seconds:>10.4f} '
+                  f'{python_seconds / numpy_seconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
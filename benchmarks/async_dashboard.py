@@ -0,0 +1,129 @@
+"""
+Compare the latency of the dashboard on the WSGI path (timing.views.home) with the async view
+(timing.async_views.home, which runs its reads at once), with a simulated database latency added to
+every query. On both paths the page is followed by its three chart api requests, sent at once like a
+browser does, so the page (time to first byte) and the whole dashboard are both measured.
+
+Run it from the project root, it creates (and destroys) its own test database:
+    python -m benchmarks.async_dashboard test
+"""
+import asyncio
+import datetime
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.db import close_old_connections, connection  # noqa: E402
+from django.db.backends.utils import CursorWrapper  # noqa: E402
+from django.test import AsyncRequestFactory, RequestFactory  # noqa: E402
+
+from timing import async_views, views  # noqa: E402
+from timing.cache import CHARTS_CACHE_ALIAS  # noqa: E402
+from timing.imports import create_timelogs  # noqa: E402
+
+
+SUBJECTS_COUNT = 20
+TAGS_COUNT = 10
+DAYS_COUNT = 365
+TIMELOGS_PER_DAY = 3
+LATENCIES_MS = (0, 2, 5, 20)
+REPEAT = 5
+
+
+def add_query_latency(seconds):
+    """Sleep before every query, like a database on another host would"""
+    execute = CursorWrapper.execute
+
+    def slow_execute(self, sql, params=None):
+        time.sleep(seconds)
+        return execute(self, sql, params)
+
+    CursorWrapper.execute = slow_execute
+    return lambda: setattr(CursorWrapper, 'execute', execute)
+
+
+def make_fixture(seed=0):
+    rnd = random.Random(seed)
+    user = get_user_model().objects.create_user(username='benchmark', password='benchmark', email='benchmark@email.com')
+    today = datetime.date.today()
+    rows = [
+        (
+            today - datetime.timedelta(days=day), f'subject {rnd.randrange(SUBJECTS_COUNT)}', rnd.randint(10, 120),
+            (f'tag {rnd.randrange(TAGS_COUNT)}',), ''
+        )
+        for day in range(DAYS_COUNT) for _ in range(TIMELOGS_PER_DAY)
+    ]
+    create_timelogs(user, rows)
+    return user
+
+
+def wsgi_home(user):
+    request = RequestFactory().get('/home/')
+    request.user = user
+    views.home(request)
+
+
+def asgi_home(user):
+    request = AsyncRequestFactory().get('/home/')
+    request.user = user
+    asyncio.run(async_views.home(request))
+
+
+def fetch_chart(user, kind):
+    request = RequestFactory().get(f'/api/charts/{kind}/')
+    request.user = user
+    try:
+        views.chart_data_api(request, kind)
+    finally:
+        close_old_connections()
+
+
+def measure(home, user):
+    """Return the best times (ms) of the page and of the whole dashboard with cold chart caches"""
+    best_home, best_dashboard = float('inf'), float('inf')
+    with ThreadPoolExecutor(max_workers=len(views.CHART_KINDS)) as executor:
+        for _ in range(REPEAT):
+            caches[CHARTS_CACHE_ALIAS].clear()
+            started = time.perf_counter()
+            home(user)
+            home_done = time.perf_counter()
+            list(executor.map(lambda kind: fetch_chart(user, kind), views.CHART_KINDS))
+            finished = time.perf_counter()
+            best_home, best_dashboard = min(best_home, home_done - started), min(best_dashboard, finished - started)
+    return best_home * 1000, best_dashboard * 1000
+
+
+def main():
+    old_name = connection.settings_dict['NAME']
+    # a file, not the shared in-memory sqlite database: django never closes the connections of an
+    # in-memory database, so the worker threads' ones would be garbage-collected while others query it
+    connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'async_dashboard.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        user = make_fixture()
+        print(f'{DAYS_COUNT * TIMELOGS_PER_DAY} timelogs, best of {REPEAT}, cold chart cache')
+        print(f'{"latency/query":>14} {"":>6} {"wsgi (ms)":>10} {"async (ms)":>11} {"speedup":>8}')
+        for latency_ms in LATENCIES_MS:
+            remove_latency = add_query_latency(latency_ms / 1000)
+            try:
+                wsgi_times, asgi_times = measure(wsgi_home, user), measure(asgi_home, user)
+            finally:
+                remove_latency()
+            for label, wsgi_ms, asgi_ms in zip(('page', 'total'), wsgi_times, asgi_times):
+                print(f'{latency_ms:>12}ms {label:>6} {wsgi_ms:>10.1f} {asgi_ms:>11.1f} {wsgi_ms / asgi_ms:>7.2f}x')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark the date based chart aggregation against the number of timelogs.
+
+Run it from the project root:
+    python -m benchmarks.date_based_chart
+"""
+import datetime
+import os
+import random
+import time
+import uuid
+from types import SimpleNamespace
+
+import django
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from timing.views import create_date_based_chart_data, create_dates_list  # noqa: E402
+
+
+SUBJECTS_COUNT = 40
+DAYS_COUNT = 730
+TIMELOGS_COUNTS = (2500, 5000, 10000, 20000, 40000)
+REPEAT = 3
+
+
+def legacy_date_based_chart_data(related_timelogs, subjects, dates, available_dates):
+    # the previous implementation which rescans all timelogs for each (subject, date) pair
+    datasets = []
+    for subject in subjects:
+        data = []
+        for date in dates:
+            if date in available_dates:
+                spent_mins = sum(duration for subject_id, timelog_date, duration in related_timelogs
+                                 if timelog_date == date and subject_id == subject.pk)
+                data.append(round((spent_mins / 60), 1))
+            else:
+                data.append(0)
+        datasets.append({'label': subject.name, 'data': data})
+    return {'labels': [d.isoformat() for d in dates], 'datasets': datasets}
+
+
+def make_fixture(timelogs_count, seed=0):
+    rnd = random.Random(seed)
+    subjects = [SimpleNamespace(pk=uuid.uuid4(), name=f'subject {i}') for i in range(SUBJECTS_COUNT)]
+    max_date = datetime.date(2022, 5, 1)
+    min_date = max_date - datetime.timedelta(days=DAYS_COUNT - 1)
+    # (subject_id, date, duration) rows, as they are read with values_list
+    timelogs = [
+        (
+            rnd.choice(subjects).pk,
+            min_date + datetime.timedelta(days=rnd.randrange(DAYS_COUNT)),
+            rnd.randint(1, 120),
+        )
+        for _ in range(timelogs_count)
+    ]
+    dates = create_dates_list(min_date, max_date)
+    available_dates = {date for _, date, _ in timelogs}
+    return timelogs, subjects, dates, available_dates
+
+
+def best_time(func, *args):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    print(f'{SUBJECTS_COUNT} subjects, {DAYS_COUNT} days, best of {REPEAT} runs')
+    print(f'{"timelogs":>10} {"seconds":>10} {"us/timelog":>11}')
+    for timelogs_count in TIMELOGS_COUNTS:
+        args = make_fixture(timelogs_count)
+        seconds = best_time(create_date_based_chart_data, *args)
+        print(f'{timelogs_count:>10} {seconds:>10.4f} {seconds / timelogs_count * 1e6:>11.2f}')
+
+    # the old implementation is too slow for the big sizes, so compare them on a small one
+    args = make_fixture(500)
+    new_data = create_date_based_chart_data(*args)
+    legacy_data = legacy_date_based_chart_data(*args)
+    assert new_data['labels'] == legacy_data['labels']
+    assert [d['data'] for d in new_data['datasets']] == [d['data'] for d in legacy_data['datasets']]
+    print(f'\n500 timelogs: legacy {best_time(legacy_date_based_chart_data, *args):.4f}s, '
+          f'single pass {best_time(create_date_based_chart_data, *args):.4f}s (identical output)')
+
+
+if __name__ == '__main__':
+    main()
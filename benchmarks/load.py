@@ -0,0 +1,185 @@
+"""
+End-to-end load benchmark: seed users (see the seed_load command) and drive the main pages and the
+chart data api through the test client, then report the p50/p95 latency and the query count of each
+view as JSON.
+
+The data is generated with a fixed seed and the chart and fragment caches are cleared before each
+request (unless --warm), so the runs of the same options are comparable over time. Save a run with
+--output and pass it as --baseline to a later run to see the changes.
+
+Run it from the project root, it creates (and destroys) its own test database:
+    python -m benchmarks.load test --users 5 --years 2 --output load.json
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.core.cache import caches  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from timing.cache import CHARTS_CACHE_ALIAS  # noqa: E402
+from timing.seeding import seed_users  # noqa: E402
+from timing.views import CHART_KINDS, DATE_BUCKETS  # noqa: E402
+
+
+DATE_RANGE_DAYS = 30
+
+
+def get_scenarios(end_date, page):
+    """Return the (name, path) of the requests of each user"""
+    date_range = f'start={end_date - datetime.timedelta(days=DATE_RANGE_DAYS - 1)}&end={end_date}'
+    scenarios = [
+        ('home', reverse('timing:home')),
+        ('home_date_range', f'{reverse("timing:home")}?{date_range}'),
+        ('timelogs_page', f'{reverse("timing:timelogs")}?page={page}'),
+        ('subjects', reverse('timing:subjects')),
+        ('tags', reverse('timing:tags')),
+    ]
+    # the home page only renders the layout, the charts' aggregation is fetched from the api
+    for kind in CHART_KINDS:
+        chart_url = reverse('timing:chart-data-api', kwargs={'kind': kind})
+        scenarios += [
+            (f'chart_{kind}', chart_url),
+            (f'chart_{kind}_date_range', f'{chart_url}?{date_range}'),
+        ]
+    # the whole history in each bucket of the date based chart
+    chart_url = reverse('timing:chart-data-api', kwargs={'kind': 'date'})
+    scenarios += [(f'chart_date_by_{bucket}', f'{chart_url}?bucket={bucket}') for bucket in DATE_BUCKETS]
+    return scenarios
+
+
+def percentile(values, percent):
+    """The nearest-rank percentile, it's always one of the measured values"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(users, scenarios, requests_per_user, warm):
+    """Request each scenario requests_per_user times for each user, return the latencies and query counts"""
+    measurements = {name: {'latencies_ms': [], 'queries': []} for name, _ in scenarios}
+    clients = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+
+    for _ in range(requests_per_user):
+        for client in clients:
+            for name, path in scenarios:
+                if not warm:
+                    caches[CHARTS_CACHE_ALIAS].clear()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    elapsed = time.perf_counter() - started
+                if response.status_code != 200:
+                    raise RuntimeError(f'{path} returned {response.status_code}')
+                measurements[name]['latencies_ms'].append(elapsed * 1000)
+                measurements[name]['queries'].append(len(queries))
+    return measurements
+
+
+def summarize(measurements, baseline=None):
+    views = {}
+    for name, measured in measurements.items():
+        latencies = measured['latencies_ms']
+        views[name] = {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'queries': max(measured['queries']),
+        }
+        if baseline and name in baseline.get('views', {}):
+            before = baseline['views'][name]
+            views[name]['baseline'] = {
+                'p50_change': round(views[name]['p50_ms'] / before['p50_ms'] - 1, 3) if before['p50_ms'] else None,
+                'p95_change': round(views[name]['p95_ms'] / before['p95_ms'] - 1, 3) if before['p95_ms'] else None,
+                'queries_change': views[name]['queries'] - before['queries'],
+            }
+    return views
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=3, help='Number of seeded users (default: 3).')
+    parser.add_argument('--subjects', type=int, default=20, help='Subjects per user (default: 20).')
+    parser.add_argument('--tags', type=int, default=10, help='Tags per user (default: 10).')
+    parser.add_argument('--years', type=float, default=1, help='Years of timelog history (default: 1).')
+    parser.add_argument('--timelogs-per-day', type=int, default=3, help='Timelogs of each day (default: 3).')
+    parser.add_argument('--seed', type=int, default=0, help='The random seed (default: 0).')
+    parser.add_argument('--requests', type=int, default=20, help='Requests of each view per user (default: 20).')
+    parser.add_argument('--page', type=int, default=10, help='The requested page of /timelogs/ (default: 10).')
+    parser.add_argument('--warm', action='store_true', help="Don't clear the chart and fragment caches.")
+    parser.add_argument('--output', help='Write the JSON report to this file (default: stdout).')
+    parser.add_argument('--baseline', help='A previous JSON report to compare with.')
+    # the "test" argument only switches the settings to the test database
+    args = parser.parse_args([arg for arg in sys.argv[1:] if arg != 'test'])
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        end_date = datetime.date.today()
+        started = time.perf_counter()
+        users = seed_users(
+            args.users, args.subjects, args.tags, args.years, args.timelogs_per_day,
+            username_prefix='benchmark', seed=args.seed, end_date=end_date
+        )
+        seed_seconds = time.perf_counter() - started
+        measurements = run(users, get_scenarios(end_date, args.page), args.requests, args.warm)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report = {
+        'meta': {
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': get_git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seed_seconds': round(seed_seconds, 2),
+            'options': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        },
+        'views': summarize(measurements, baseline),
+    }
+    content = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(content + '\n')
+    else:
+        print(content)
+
+
+if __name__ == '__main__':
+    main()
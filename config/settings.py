@@ -54,12 +54,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so the latency of the requests includes the other middlewares
+    'timing.metrics.MetricsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedUserAuthenticationMiddleware',
+    'timing.profiling.ProfilingMiddleware',
+    'timing.routers.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,7 +97,13 @@ if 'test' in sys.argv:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
-        }
+        },
+        # a second database for testing the replica routing (timing.tests.test_routers),
+        # it's not in TIMING_REPLICA_DATABASES, so the other tests don't read from it
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db-replica.sqlite3',
+        },
     }
 else:
     DATABASES = {
@@ -106,6 +116,90 @@ else:
             'PORT': int(os.environ.get('DATABASE_PORT', '3306')),
         }
     }
+    # read replicas of the default database, e.g. DATABASE_REPLICA_HOSTS=replica1,replica2
+    # adds the 'replica_1' and 'replica_2' aliases (the tests use the default database for them)
+    replica_hosts = [host.strip() for host in os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',') if host.strip()]
+    for number, host in enumerate(replica_hosts, start=1):
+        DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+
+# the dashboard, the lists and the exports read from these databases (see timing.routers)
+TIMING_REPLICA_DATABASES = [alias for alias in DATABASES if alias.startswith('replica_')]
+# how long a browser reads from the primary after it writes, so it sees its own writes despite the replica lag
+TIMING_REPLICA_PIN_SECONDS = int(os.environ.get('DJANGO_REPLICA_PIN_SECONDS', '10'))
+DATABASE_ROUTERS = ['timing.routers.ReplicaRouter']
+
+# where the profiles of the requests that staff users profile with ?profile=1 are saved (see timing.profiling)
+TIMING_PROFILING_DIR = os.environ.get('DJANGO_PROFILING_DIR', str(BASE_DIR / 'profiles'))
+# the addresses which can read /metrics, and a directory the workers share to report their metrics together
+TIMING_METRICS_ALLOWED_IPS = os.environ.get('DJANGO_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+TIMING_METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR')
+# what a view that breaks its query budget does: 'raise' an error or 'warn' (log it), see timing.query_budget
+TIMING_QUERY_BUDGET_MODE = os.environ.get('DJANGO_QUERY_BUDGET_MODE', 'raise' if DEBUG else 'warn')
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# the local-memory cache evicts the least recently used entries beyond MAX_ENTRIES.
+# it's per process, so use a shared backend (e.g. Redis or Memcached) if you run several workers.
+
+# the cache tier of the sessions, the logged in users and the chart data: 'locmem' (per process), 'file'
+# (shared by the workers of a host) or the path of a shared backend with its location, e.g.
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache DJANGO_CACHE_LOCATION=redis://127.0.0.1:6379
+CACHE_TIER_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+# the default is shared by all the processes of the host, so a logout, a password change or a data change
+# is seen by every worker at once. the tests use the local-memory one, so no run sees the previous one's entries
+CACHE_TIER_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', 'locmem' if 'test' in sys.argv else 'file')
+CACHE_TIER_LOCATION = os.environ.get('DJANGO_CACHE_LOCATION', '')
+
+
+def cache_tier(alias, timeout, max_entries=None):
+    if CACHE_TIER_BACKEND == 'locmem':
+        location = alias
+    elif CACHE_TIER_BACKEND == 'file':
+        location = os.path.join(CACHE_TIER_LOCATION or (BASE_DIR / 'cache'), alias)
+    else:
+        location = CACHE_TIER_LOCATION
+    config = {
+        'BACKEND': CACHE_TIER_BACKENDS.get(CACHE_TIER_BACKEND, CACHE_TIER_BACKEND),
+        'LOCATION': location,
+        # the aliases may share a server
+        'KEY_PREFIX': alias,
+        'TIMEOUT': timeout,
+    }
+    if CACHE_TIER_BACKEND in CACHE_TIER_BACKENDS:
+        # the other backends don't take this option
+        config['OPTIONS'] = {'MAX_ENTRIES': max_entries or int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', '10000'))}
+    return config
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # the sessions are also kept in the database (cached_db), so they survive the cache's evictions
+    'sessions': cache_tier('sessions', timeout=None),
+    # short-lived, a user is deleted from it when it's saved (see accounts.cache)
+    'users': cache_tier('users', timeout=int(os.environ.get('DJANGO_USER_CACHE_TIMEOUT', '300'))),
+    # the users' data versions are bumped by every process that writes timelogs (the web workers, the
+    # imports, the management commands and run_worker), so with several processes it must be shared
+    'charts': cache_tier(
+        'charts',
+        timeout=int(os.environ.get('DJANGO_CHARTS_CACHE_TIMEOUT', '3600')),
+        max_entries=int(os.environ.get('DJANGO_CHARTS_CACHE_MAX_ENTRIES', '1000')),
+    ),
+}
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# the dashboard aggregation engine: 'python' or 'numpy' (needs numpy to be installed)
+TIMING_AGGREGATION_ENGINE = os.environ.get('DJANGO_AGGREGATION_ENGINE', 'python')
+# serve the dashboard with the async view (timing.async_views.home) which runs its reads concurrently,
+# it's meant for ASGI deployments (config.asgi), under WSGI each request would run its own event loop
+TIMING_ASYNC_VIEWS = True if os.environ.get('DJANGO_ASYNC_VIEWS') else False
 
 
 # Password validation
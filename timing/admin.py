@@ -1,9 +1,69 @@
+from django import forms
 from django.contrib import admin
+from django.db import transaction
 
-from .models import TimeLog, Subject, Tag
+from .forms import daily_limit_error
+from .models import TimeLog, Subject, Tag, DailySubjectTotal, DailyTotal, Job
+from .rollups import discard_timelog, discard_timelogs, get_remaining_minutes, record_timelog
 
 
 
-admin.site.register(TimeLog)
+class TimeLogAdminForm(forms.ModelForm):
+    class Meta:
+        model = TimeLog
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        user, date, duration = (cleaned_data.get(field) for field in ('user', 'date', 'duration'))
+        if user and date and duration:
+            remaining_minutes = get_remaining_minutes(user.pk, date)
+            # the instance isn't changed yet, an edited timelog's own minutes are free for it
+            if not self.instance._state.adding and (self.instance.user_id, self.instance.date) == (user.pk, date):
+                remaining_minutes += self.instance.duration
+            if duration > remaining_minutes:
+                raise daily_limit_error(date, remaining_minutes)
+        return cleaned_data
+
+
+@admin.register(TimeLog)
+class TimeLogAdmin(admin.ModelAdmin):
+    """Keep the daily totals in step with the timelogs that are added, changed and deleted here"""
+    form = TimeLogAdminForm
+
+    def save_model(self, request, obj, form, change):
+        # the admin saves in a transaction, so a timelog over the limit is rolled back with the totals
+        if change:
+            discard_timelog(TimeLog.objects.select_for_update().get(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        record_timelog(obj)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            discard_timelog(obj)
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for user_id in queryset.order_by().values_list('user', flat=True).distinct():
+                discard_timelogs(user_id, queryset)
+            super().delete_queryset(request, queryset)
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """The rollups follow the timelogs, so they're only shown (see the rebuild_rollups command)"""
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Tag)
 admin.site.register(Subject)
+admin.site.register(DailySubjectTotal, RollupAdmin)
+admin.site.register(DailyTotal, RollupAdmin)
+admin.site.register(Job)
@@ -0,0 +1,106 @@
+"""
+The pure-Python aggregation engine of the dashboard (see get_aggregation_engine), an engine has
+date_subject_matrix(rows, subject_ids, dates), subject_totals(daily_totals) and tag_totals(timelogs).
+"""
+from collections import defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+
+AGGREGATION_ENGINES = {
+    'python': 'timing.aggregation',
+    'numpy': 'timing.numpy_aggregation',
+}
+
+
+def get_aggregation_engine(name=None):
+    name = name or getattr(settings, 'TIMING_AGGREGATION_ENGINE', 'python')
+    if name not in AGGREGATION_ENGINES:
+        raise ImproperlyConfigured(f'Unknown aggregation engine "{name}", choose one of {list(AGGREGATION_ENGINES)}.')
+    try:
+        return import_module(AGGREGATION_ENGINES[name])
+    except ImportError as exc:
+        raise ImproperlyConfigured(f'The "{name}" aggregation engine is not available: {exc}') from exc
+
+
+def date_subject_matrix(rows, subject_ids, dates):
+    """
+    Sum up the minutes of (subject_id, date, minutes) rows into a subjects × dates matrix (list of lists).
+    """
+    spent_mins_table = sum_durations_by_subject_and_date(rows)
+    return [[spent_mins_table.get((subject_id, date), 0) for date in dates] for subject_id in subject_ids]
+
+
+def subject_totals(daily_totals):
+    """Return a dict that maps each subject_id of a DailySubjectTotal queryset to its total minutes"""
+    return sum_durations_by_subject(daily_totals, duration_field='total_minutes')
+
+
+def tag_totals(timelogs):
+    """Return a dict that maps each tag_id of a TimeLog queryset to its total minutes"""
+    return sum_durations_by_tag(timelogs)
+
+
+def sum_durations_by_key(rows):
+    """
+    Sum up the minutes of (key, minutes) rows in a single pass.
+    Return a dict that maps each key to its total minutes.
+    """
+    totals = defaultdict(int)
+    for key, minutes in rows:
+        totals[key] += minutes
+    return totals
+
+
+
+def sum_durations_by_subject_and_date(rows):
+    """
+    Bucket the (subject_id, date, minutes) rows in a single pass and sum up their minutes.
+    Return a dict that maps each (subject_id, date) pair to its total minutes.
+    """
+    spent_mins_table = defaultdict(int)
+    for subject_id, date, minutes in rows:
+        spent_mins_table[(subject_id, date)] += minutes
+    return spent_mins_table
+
+
+def sum_durations_by_subject_and_period(daily_totals, bucket='day'):
+    """
+    Sum up the minutes of a DailySubjectTotal queryset per subject and day, week or month
+    in the database, so the number of rows depends on the number of buckets, not days.
+    Return (subject_id, first date of the bucket, minutes) rows.
+    """
+    if bucket == 'day':
+        return daily_totals.order_by().values_list('subject', 'date', 'total_minutes')
+    trunc = {'week': TruncWeek, 'month': TruncMonth}[bucket]
+    return (
+        daily_totals.order_by().annotate(period=trunc('date'))
+        .values_list('subject', 'period').annotate(Sum('total_minutes'))
+    )
+
+
+def sum_durations_by_subject(queryset, duration_field='duration'):
+    """
+    Sum up the durations (minutes) of a TimeLog (or DailySubjectTotal) queryset per subject
+    with a GROUP BY query.
+    Return a dict that maps each subject_id to its total minutes.
+    """
+    # clear the default ordering, otherwise it would be added to the GROUP BY clause
+    return dict(queryset.order_by().values_list('subject').annotate(Sum(duration_field)))
+
+
+def sum_durations_by_tag(timelogs):
+    """
+    Sum up the durations (minutes) of a TimeLog queryset per tag with a GROUP BY query
+    over the TimeLog.tags through table.
+    Return a dict that maps each tag_id to its total minutes.
+    """
+    # join from the timelogs side, so the through table is searched by timelog_id instead of scanned
+    return dict(
+        timelogs.order_by().filter(tags__isnull=False)
+        .values_list('tags').annotate(Sum('duration'))
+    )
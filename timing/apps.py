@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TimingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'timing'
+
+    def ready(self):
+        # connect the signal receivers
+        from . import signals  # noqa: F401
@@ -0,0 +1,52 @@
+"""
+Async versions of the dashboard views for ASGI deployments (see settings.TIMING_ASYNC_VIEWS).
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.shortcuts import render
+
+from .query_budget import query_budget
+from .routers import read_from_replica
+from .views import create_home_context, get_user_date_bounds
+
+
+
+async def run_query(func, *args):
+    """Run a sync function that reads the database in a worker thread, concurrently with the others"""
+    def run():
+        try:
+            return func(*args)
+        finally:
+            # the worker thread doesn't get the request signals, so close its connection like a request would
+            close_old_connections()
+    return await sync_to_async(run, thread_sensitive=False)()
+
+
+@query_budget(2, name='timing.async_views.get_authenticated_user')
+def get_authenticated_user(request):
+    # the lazy request.user reads the session and the database, so it's resolved in a sync thread
+    return request.user if request.user.is_authenticated else None
+
+
+@query_budget(1, name='timing.async_views.get_recent_timelogs')
+def get_recent_timelogs(user):
+    return list(user.timelogs.select_related('subject')[:10])
+
+
+@read_from_replica
+async def home(request):
+    user = await sync_to_async(get_authenticated_user)(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+
+    (min_date, max_date), timelogs = await asyncio.gather(
+        run_query(query_budget(1, name='timing.async_views.get_user_date_bounds')(get_user_date_bounds), user),
+        run_query(get_recent_timelogs, user)
+    )
+    # the charts are fetched from the chart data api by the page itself
+    context = create_home_context(request, min_date, max_date, timelogs)
+    render_within_budget = query_budget(0, name='timing.async_views.home')(render)
+    return await sync_to_async(render_within_budget)(request, 'timing/home.html', context)
@@ -0,0 +1,78 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Subject
+
+
+# the default and the maximum number of autocomplete results
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+
+
+def prefix_upper_bound(prefix):
+    """Return the smallest string that is greater than every string starting with the prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_names(queryset, prefix='', limit=AUTOCOMPLETE_LIMIT):
+    """
+    Return (pk, name) pairs of a subject or tag queryset whose names start with the prefix,
+    the most recently used first.
+    The prefix is searched as a range (LOWER(name) >= prefix AND LOWER(name) < upper bound),
+    so it's a seek on the (user, LOWER(name)) unique index instead of a scan.
+    """
+    queryset = queryset.alias(lower_name=Lower('name'))
+    prefix = prefix.strip().lower()
+    if prefix:
+        queryset = queryset.filter(
+            lower_name__gte=prefix,
+            lower_name__lt=prefix_upper_bound(prefix),
+            lower_name__startswith=prefix
+        )
+    return list(
+        queryset.order_by(F('last_used').desc(nulls_last=True), 'lower_name')
+        .values_list('pk', 'name')[:limit]
+    )
+
+
+def mark_used(timelog):
+    """Move the subject and tags of a saved timelog to the top of the autocomplete results"""
+    now = timezone.now()
+    Subject.objects.filter(pk=timelog.subject_id).update(last_used=now)
+    timelog.tags.update(last_used=now)
+
+
+class LazyChoicesMixin:
+    """
+    Render only the selected options of a model choice field. The other options are loaded
+    from the autocomplete endpoint of the data-autocomplete-url attribute as the user types,
+    so the size of the page doesn't grow with the number of the user's subjects and tags.
+    """
+    def optgroups(self, name, value, attrs=None):
+        all_choices = self.choices
+        selected = [v for v in value if v]
+        queryset = all_choices.queryset.none()
+        if selected:
+            try:
+                queryset = all_choices.queryset.filter(pk__in=selected)
+            except (ValueError, ValidationError):
+                pass
+        empty_label = all_choices.field.empty_label
+        self.choices = [('', empty_label)] if empty_label is not None else []
+        self.choices += [all_choices.choice(obj) for obj in queryset]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = all_choices
+
+
+class LazySelect(LazyChoicesMixin, forms.Select):
+    pass
+
+
+class LazySelectMultiple(LazyChoicesMixin, forms.SelectMultiple):
+    pass
@@ -0,0 +1,130 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .routers import reads_from_replica
+
+
+
+# the alias of the cache (in settings.CACHES) which keeps the users' chart data
+CHARTS_CACHE_ALIAS = 'charts'
+
+
+def _version_key(user_id):
+    return f'timing:data-version:{user_id}'
+
+
+def _chart_data_key(user_id, *key_parts):
+    # key parts may come from the query string, so hash them to keep the key short and safe
+    digest = hashlib.md5(repr(key_parts).encode()).hexdigest()
+    return f'timing:chart-data:{user_id}:{digest}'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def bump_data_version(user_id):
+    """
+    Give the user's data a new version, so all of the user's cached chart data gets stale.
+    It's called whenever the user's timelogs, subjects or tags change.
+    """
+    cache = caches[CHARTS_CACHE_ALIAS]
+    cache.set(_version_key(user_id), _new_version(), timeout=None)
+    # a request may read the new version before this transaction is committed and cache
+    # chart data of the old rows under it, so bump it once more after the commit
+    transaction.on_commit(lambda: cache.set(_version_key(user_id), _new_version(), timeout=None))
+
+
+def get_or_create_chart_data(user_id, key_parts, create_chart_data):
+    """
+    Return the user's cached chart data for key_parts (e.g. the date range) if it's built for
+    the current version of user's data, otherwise call create_chart_data() and cache the result.
+    """
+    cache = caches[CHARTS_CACHE_ALIAS]
+    version_key = _version_key(user_id)
+    chart_data_key = _chart_data_key(user_id, *key_parts)
+    # get the version and the chart data with a single cache read
+    cached = cache.get_many([version_key, chart_data_key])
+    version = cached.get(version_key)
+    if version is not None and chart_data_key in cached:
+        cached_version, chart_data = cached[chart_data_key]
+        if cached_version == version:
+            return chart_data
+
+    if version is None:
+        # the version is evicted (or never set), don't override it if another request set it meanwhile
+        cache.add(version_key, _new_version(), timeout=None)
+        version = cache.get(version_key)
+    chart_data = create_chart_data()
+    # a replica may not have the latest changes yet, which'd be cached under the current version
+    if not reads_from_replica():
+        cache.set(chart_data_key, (version, chart_data))
+    return chart_data
+
+
+class FragmentCacheStats:
+    """The hits and misses of the cached template fragments (of this process) and the render time of the misses"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.render_seconds = Counter()
+
+    def record_hit(self, name):
+        with self._lock:
+            self.hits[name] += 1
+
+    def record_miss(self, name, render_seconds):
+        with self._lock:
+            self.misses[name] += 1
+            self.render_seconds[name] += render_seconds
+
+    def as_dict(self):
+        """Return the counters of each fragment, a hit saves about the average render time of the misses"""
+        with self._lock:
+            stats = {}
+            for name in sorted(self.hits.keys() | self.misses.keys()):
+                average_render_ms = self.render_seconds[name] * 1000 / self.misses[name] if self.misses[name] else 0
+                stats[name] = {
+                    'hits': self.hits[name],
+                    'misses': self.misses[name],
+                    'render_ms': round(self.render_seconds[name] * 1000, 3),
+                    'saved_ms': round(self.hits[name] * average_render_ms, 3),
+                }
+            return stats
+
+    def reset(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+            self.render_seconds.clear()
+
+
+fragment_cache_stats = FragmentCacheStats()
+
+
+def get_or_render_fragment(user_id, name, vary_on, render):
+    """
+    Return the user's cached template fragment, or render() and cache it. Like the chart data, it's
+    cached for the current version of the user's data, which changes whenever any of the user's
+    timelogs, subjects or tags is saved or deleted (so the latest last_modified isn't needed).
+    """
+    rendered = False
+
+    def timed_render():
+        nonlocal rendered
+        rendered = True
+        started = time.perf_counter()
+        content = render()
+        fragment_cache_stats.record_miss(name, time.perf_counter() - started)
+        return content
+
+    content = get_or_create_chart_data(user_id, ('fragment', name, *vary_on), timed_render)
+    if not rendered:
+        fragment_cache_stats.record_hit(name)
+    return content
@@ -0,0 +1,89 @@
+"""
+Set-wise deletion of subjects and accounts with many timelogs, in short chunked transactions.
+"""
+from django.db import router, transaction
+
+from .cache import bump_data_version
+from .models import DailySubjectTotal, DailyTotal, Subject, Tag, TimeLog
+from .rollups import discard_timelogs
+
+
+# the timelogs deleted in each transaction
+DELETE_CHUNK_SIZE = 500
+# larger deletions run in the background
+BACKGROUND_DELETION_THRESHOLD = DELETE_CHUNK_SIZE
+
+
+
+def _delete_in_chunks(queryset, chunk_size, before_delete=None):
+    """
+    Delete the rows of the queryset set-wise, chunk_size rows per transaction, without the collector.
+    Yield the number of deleted rows after each chunk. The queryset's model must not have reverse
+    relations other than the ones before_delete(pks) deletes first.
+    """
+    using = router.db_for_write(queryset.model)
+    # read the pks from the database that's written, not from a replica
+    queryset = queryset.using(using).order_by()
+    while True:
+        with transaction.atomic(using=using):
+            pks = list(queryset.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                return
+            if before_delete is not None:
+                before_delete(pks)
+            # a plain DELETE ... WHERE id IN (...), the rows aren't loaded and the signals aren't sent
+            deleted = queryset.model.objects.filter(pk__in=pks)._raw_delete(using)
+        yield deleted
+
+
+def _delete_timelogs_in_chunks(timelogs, chunk_size, before_delete=None):
+    using = router.db_for_write(TimeLog)
+
+    def delete_tag_rows(pks):
+        if before_delete is not None:
+            before_delete(pks)
+        TimeLog.tags.through.objects.filter(timelog_id__in=pks)._raw_delete(using)
+
+    return _delete_in_chunks(timelogs, chunk_size, before_delete=delete_tag_rows)
+
+
+def delete_subject(subject, chunk_size=DELETE_CHUNK_SIZE, progress=None):
+    """
+    Delete a subject with its timelogs chunk by chunk and remove their minutes from the rollups, call
+    progress(deleted_timelogs) after each chunk. Return the number of deleted timelogs.
+    """
+    deleted = 0
+    chunks = _delete_timelogs_in_chunks(
+        TimeLog.objects.filter(subject=subject), chunk_size,
+        before_delete=lambda pks: discard_timelogs(subject.user_id, TimeLog.objects.filter(pk__in=pks))
+    )
+    for chunk_deleted in chunks:
+        deleted += chunk_deleted
+        bump_data_version(subject.user_id)
+        if progress is not None:
+            progress(deleted)
+    # its timelogs and daily subject totals are gone, so the collector has nothing to load
+    subject.delete()
+    return deleted
+
+
+def delete_user(user, chunk_size=DELETE_CHUNK_SIZE, progress=None):
+    """
+    Delete an account with all of its data chunk by chunk, call progress(deleted_timelogs) after
+    each chunk of timelogs. Return the number of deleted timelogs.
+    The rollups are deleted after the timelogs, if it's interrupted run rebuild_rollups for the user.
+    """
+    deleted = 0
+    for chunk_deleted in _delete_timelogs_in_chunks(TimeLog.objects.filter(user=user), chunk_size):
+        deleted += chunk_deleted
+        bump_data_version(user.pk)
+        if progress is not None:
+            progress(deleted)
+    for model in (DailySubjectTotal, DailyTotal, Subject, Tag):
+        # nothing refers to these rows anymore
+        for _ in _delete_in_chunks(model.objects.filter(user=user), chunk_size):
+            pass
+    bump_data_version(user.pk)
+    # its data is gone, so the collector has nothing to load
+    user.delete()
+    return deleted
@@ -0,0 +1,83 @@
+"""
+Streaming export of a user's timelogs as CSV or NDJSON, in the format that timing.imports reads.
+"""
+import csv
+import json
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .imports import TAGS_SEPARATOR, TIMELOG_FIELDS
+from .models import TimeLog
+
+
+# the number of timelogs that are read (and written to the response) at once
+EXPORT_CHUNK_SIZE = 2000
+
+
+
+def iter_timelog_records(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield chunks of the user's timelogs in date order, as lists of (date, subject name, duration,
+    tag names, description) tuples. Each chunk is read with its own keyset query, which starts after
+    the last row of the previous one, and its tags with a single query. So the memory use doesn't
+    grow with the number of timelogs on any database (MySQL's client fetches a whole result at once).
+    """
+    timelogs = (
+        TimeLog.objects.filter(user=user).order_by('date', 'last_modified', 'pk')
+        .values_list('pk', 'date', 'last_modified', 'subject__name', 'duration', 'description')
+    )
+    chunk = list(timelogs[:chunk_size])
+    while chunk:
+        tag_names = defaultdict(list)
+        timelog_tags = (
+            TimeLog.tags.through.objects.filter(timelog_id__in=[row[0] for row in chunk])
+            .order_by('tag__name').values_list('timelog_id', 'tag__name')
+        )
+        for timelog_id, name in timelog_tags:
+            tag_names[timelog_id].append(name)
+        yield [
+            (date, subject_name, duration, tag_names[pk], description)
+            for pk, date, _, subject_name, duration, description in chunk
+        ]
+        if len(chunk) < chunk_size:
+            return
+        pk, date, last_modified = chunk[-1][:3]
+        # the rows after (date, last_modified, pk), the date__gte lets the database seek the index
+        chunk = list(timelogs.filter(
+            Q(date__gt=date) | Q(last_modified__gt=last_modified) | Q(last_modified=last_modified, pk__gt=pk),
+            date__gte=date
+        )[:chunk_size])
+
+
+class Echo:
+    """A file-like object that returns what is written to it, so the csv writer's rows can be streamed"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(chunks):
+    """Yield the header and then the rows of each chunk of timelog records as CSV"""
+    writer = csv.writer(Echo())
+    # the header is sent before the first query runs
+    yield writer.writerow(TIMELOG_FIELDS)
+    for chunk in chunks:
+        yield ''.join(
+            writer.writerow((date.isoformat(), subject_name, duration, TAGS_SEPARATOR.join(tags), description))
+            for date, subject_name, duration, tags, description in chunk
+        )
+
+
+def stream_ndjson(chunks):
+    """Yield each chunk of timelog records as NDJSON lines"""
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(TIMELOG_FIELDS, (date.isoformat(), subject_name, duration, tags, description)))) + '\n'
+            for date, subject_name, duration, tags, description in chunk
+        )
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+}
@@ -2,8 +2,28 @@ import datetime
 
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Lower
+from django.urls import reverse
 
+from .autocomplete import LazySelect, LazySelectMultiple
 from .models import TimeLog, Subject, Tag
+from .rollups import DAILY_MINUTES_LIMIT, get_remaining_minutes
+
+
+def daily_limit_error(date, remaining_minutes):
+    """Return the validation error of a timelog that doesn't fit in the remaining minutes of its date"""
+    if remaining_minutes:
+        return ValidationError(f'Your remaind duration for '
+                               f'{date} is {remaining_minutes // 60} hours and {remaining_minutes % 60} minutes.')
+    return ValidationError(f'There is no time left for {date}')
+
+
+def name_exists(queryset, name):
+    """
+    Check case-insensitively if a subject or tag queryset has the name, with a single
+    lookup on the (user, LOWER(name)) unique index instead of loading every name.
+    """
+    return queryset.alias(lower_name=Lower('name')).filter(lower_name=name.lower()).exists()
 
 
 class DateForm(forms.Form):
@@ -48,9 +68,12 @@ class TimeLogForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.registrant_user = kwargs.pop('registrant_user', None)
         super().__init__(*args, **kwargs)
-        # add registrant user's subjects and tags to the corresponding field choices
+        # add registrant user's subjects and tags to the corresponding field choices,
+        # only the selected ones are rendered, the others are loaded from the autocomplete endpoint
         self.fields['subject'].queryset = self.registrant_user.subject_set.all()
         self.fields['tags'].queryset = self.registrant_user.tag_set.all()
+        self.fields['subject'].widget.attrs['data-autocomplete-url'] = reverse('timing:autocomplete-api', args=['subjects'])
+        self.fields['tags'].widget.attrs['data-autocomplete-url'] = reverse('timing:autocomplete-api', args=['tags'])
         # add html attribute to the widget of fields
         self.fields['subject'].widget.attrs['class'] = 'form-select'
         self.fields['tags'].widget.attrs['class'] = 'form-select'
@@ -65,6 +88,8 @@ class TimeLogForm(forms.ModelForm):
         exclude = ['user', 'duration']
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date', 'max': datetime.date.today}),
+            'subject': LazySelect,
+            'tags': LazySelectMultiple,
         }
 
     def clean(self):
@@ -80,23 +105,14 @@ class TimeLogForm(forms.ModelForm):
             if duration == 0:
                 raise ValidationError("Both hour and minute fields can not be 0.")
             
-            if duration > 1440:
+            if duration > DAILY_MINUTES_LIMIT:
                 raise ValidationError("One day is 24 hours!")
 
-            # check the particular date's durations doesn't exceed 24 hours
-            previous_durations_total = 0
-            for timelog in self.registrant_user.timelogs.filter(date=date):
-                previous_durations_total += timelog.duration
-
-            if (previous_durations_total + duration) > 1440:
-                remaind_hours = (1440 - previous_durations_total) // 60
-                remaind_miuntes = (1440 - previous_durations_total) % 60
-                
-                if remaind_miuntes or remaind_hours:
-                    raise ValidationError(f'Your remaind duration for '
-                                          f'{date} is {remaind_hours} hours and {remaind_miuntes} minutes.')
-                else:
-                    raise ValidationError(f'There is no time left for {date}')
+            # check the particular date's durations doesn't exceed 24 hours, it's checked again
+            # atomically when the timelog is recorded (see timing.rollups.reserve_daily_minutes)
+            remaining_minutes = get_remaining_minutes(self.registrant_user.pk, date)
+            if duration > remaining_minutes:
+                raise daily_limit_error(date, remaining_minutes)
 
             clean_data['duration'] = duration
         
@@ -118,7 +134,7 @@ class SubjectForm(forms.ModelForm):
         clean_data = super().clean()
         name = clean_data.get('name')
         if name:
-            if name.lower() in [s.name for s in self.user_subjects]:
+            if name_exists(self.user_subjects, name):
                 raise ValidationError(f'{name.lower()} already exists.')
             clean_data['name'] = name.lower()
 
@@ -140,7 +156,7 @@ class TagForm(forms.ModelForm):
         clean_data = super().clean()
         name = clean_data.get('name')
         if name:
-            if name.lower() in [s.name for s in self.user_tags]:
+            if name_exists(self.user_tags, name):
                 raise ValidationError(f'{name.lower()} already exists.')
             clean_data['name'] = name.lower()
 
@@ -0,0 +1,162 @@
+"""
+Bulk creation of timelogs from CSV or NDJSON exports (see the import_timelogs command)
+and from the JSON batch api (see views.timelogs_batch_api).
+"""
+import csv
+import datetime
+import json
+
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .models import Subject, Tag, TimeLog
+from .rollups import DAILY_MINUTES_LIMIT, DailyLimitExceeded, record_timelogs
+
+
+TIMELOG_FIELDS = ('date', 'subject', 'duration', 'tags', 'description')
+TAGS_SEPARATOR = ';'
+
+
+
+class TimeLogImportError(Exception):
+    """Raised when the records can't be imported, nothing is imported then"""
+
+
+def read_csv_records(lines):
+    """Return the records of CSV lines (with a header row) as dicts"""
+    return csv.DictReader(lines)
+
+
+def read_ndjson_records(lines):
+    """Return the records of NDJSON lines (one JSON object per line) as dicts"""
+    return (json.loads(line) for line in lines if line.strip())
+
+
+RECORD_READERS = {
+    'csv': read_csv_records,
+    'ndjson': read_ndjson_records,
+}
+
+
+def parse_record(record):
+    """
+    Validate a record like TimeLogForm does.
+    Return a (date, subject name, duration, tag names, description) tuple, raise ValueError if it's invalid.
+    """
+    date = datetime.date.fromisoformat(str(record.get('date') or '').strip())
+    if date > datetime.date.today():
+        raise ValueError(f'the date {date} is in the future')
+
+    subject_name = str(record.get('subject') or '').strip().lower()
+    if not subject_name or len(subject_name) > Subject._meta.get_field('name').max_length:
+        raise ValueError(f'invalid subject "{subject_name}"')
+
+    duration = int(record.get('duration') or 0)
+    if not 0 < duration <= DAILY_MINUTES_LIMIT:
+        raise ValueError(f'the duration must be between 1 and {DAILY_MINUTES_LIMIT} minutes')
+
+    tags = record.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(TAGS_SEPARATOR)
+    # drop the empty and the repeated names, but keep the order
+    tag_names = tuple(dict.fromkeys(name for name in (str(tag).strip().lower() for tag in tags) if name))
+    if any(len(name) > Tag._meta.get_field('name').max_length for name in tag_names):
+        raise ValueError('a tag name is too long')
+
+    description = str(record.get('description') or '')
+    if len(description) > TimeLog._meta.get_field('description').max_length:
+        raise ValueError('the description is too long')
+
+    return date, subject_name, duration, tag_names, description
+
+
+def parse_records(records):
+    """Parse and validate all records, raise TimeLogImportError for the first invalid one"""
+    rows = []
+    try:
+        # the records are read lazily, so the reading errors are caught here too
+        for record in records:
+            rows.append(parse_record(record))
+    except (ValueError, TypeError, AttributeError, csv.Error) as exc:
+        raise TimeLogImportError(f'Record {len(rows) + 1}: {exc}') from exc
+    return rows
+
+
+def get_or_create_names(user, model, names, batch_size=1000, create_missing=True):
+    """
+    Return a dict that maps each (lowercase) name to the pk of the user's subject or tag,
+    the missing ones are created with bulk_create (or raise TimeLogImportError if create_missing is False).
+    Also return the number of the created ones.
+    """
+    names = sorted(names)
+    pks = {}
+    for i in range(0, len(names), batch_size):
+        pks.update(
+            model.objects.filter(user=user).annotate(lower_name=Lower('name'))
+            .filter(lower_name__in=names[i:i + batch_size]).values_list('lower_name', 'pk')
+        )
+    missing_names = [name for name in names if name not in pks]
+    if missing_names and not create_missing:
+        raise TimeLogImportError(f'Unknown {model._meta.verbose_name} "{missing_names[0]}".')
+    # the pks are uuids that are generated in python, so they are known without reading them back
+    new_objects = [model(user=user, name=name) for name in missing_names]
+    model.objects.bulk_create(new_objects, batch_size=batch_size)
+    pks.update((obj.name, obj.pk) for obj in new_objects)
+    return pks, len(new_objects)
+
+
+def create_timelogs(user, rows, batch_size=1000, create_missing_names=True):
+    """
+    Create the user's timelogs of parsed rows (and the missing subjects and tags) in one transaction
+    with batched inserts. The 24-hour limit of each date is checked for all the rows together,
+    raise TimeLogImportError (and create nothing) if a row can't be created.
+    Return the created timelogs and the number of the created subjects and tags.
+    """
+    with transaction.atomic():
+        subject_pks, created_subjects = get_or_create_names(
+            user, Subject, {row[1] for row in rows}, batch_size, create_missing_names
+        )
+        tag_pks, created_tags = get_or_create_names(
+            user, Tag, {name for row in rows for name in row[3]}, batch_size, create_missing_names
+        )
+
+        timelogs, timelog_tags = [], []
+        for date, subject_name, duration, tag_names, description in rows:
+            timelog = TimeLog(
+                user=user, subject_id=subject_pks[subject_name],
+                date=date, duration=duration, description=description
+            )
+            timelogs.append(timelog)
+            timelog_tags.extend(
+                TimeLog.tags.through(timelog_id=timelog.pk, tag_id=tag_pks[name]) for name in tag_names
+            )
+
+        try:
+            record_timelogs(user, timelogs, batch_size=batch_size)
+        except DailyLimitExceeded as exc:
+            raise TimeLogImportError(
+                f'The records of {exc.date} are more than its remaining {exc.remaining_minutes} minutes.'
+            ) from exc
+        TimeLog.objects.bulk_create(timelogs, batch_size=batch_size)
+        TimeLog.tags.through.objects.bulk_create(timelog_tags, batch_size=batch_size)
+
+        # rank the new timelogs' subjects and tags in the autocomplete like the recorded ones
+        now = timezone.now()
+        for model, pks in ((Subject, list(subject_pks.values())), (Tag, list(tag_pks.values()))):
+            for i in range(0, len(pks), batch_size):
+                model.objects.filter(pk__in=pks[i:i + batch_size]).update(last_used=now)
+
+    # bulk_create doesn't send the signals that invalidate the cached charts
+    bump_data_version(user.pk)
+    return timelogs, created_subjects, created_tags
+
+
+def import_timelogs(user, records, batch_size=1000):
+    """
+    Import the records as the user's timelogs, with the missing subjects and tags, all or nothing.
+    Return the number of the created timelogs, subjects and tags.
+    """
+    timelogs, created_subjects, created_tags = create_timelogs(user, parse_records(records), batch_size)
+    return len(timelogs), created_subjects, created_tags
@@ -0,0 +1,146 @@
+"""
+Background jobs queued in the database and run by `manage.py run_worker`, with no message broker.
+"""
+import datetime
+import logging
+import os
+import socket
+import traceback
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .deletion import delete_subject, delete_user
+from .models import Job, Subject
+from .rollups import rebuild_user_rollups
+
+
+RETRY_DELAY_SECONDS = 10
+STALE_JOB_SECONDS = 10 * 60
+# the progress (and so the heartbeat) of a running job is saved at most this often
+PROGRESS_SAVE_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+
+class UnknownJob(Exception):
+    """Raised when a job's name isn't registered"""
+
+
+def register_job(name):
+    """Register a function as the job of the name, it takes a progress(done, total=None) callback and JSON kwargs"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, user=None, label='', total=0, max_attempts=3, **kwargs):
+    """Queue a job, it's run by a worker once the current transaction is committed. Return the Job."""
+    if name not in _registry:
+        raise UnknownJob(name)
+    return Job.objects.create(
+        name=name, user=user, label=label, total=total, max_attempts=max_attempts, kwargs=kwargs
+    )
+
+
+def get_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def claim_jobs(worker_id, limit=1):
+    """Mark up to limit queued jobs that are due as running by the worker, return them"""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+        .order_by('run_after', 'created').values_list('pk', 'attempts')[:limit * 4]
+    )
+    claimed = []
+    for pk, attempts in candidates:
+        # another worker may have claimed it since it was read, then nothing is updated
+        updated = Job.objects.filter(pk=pk, status=Job.QUEUED, attempts=attempts).update(
+            status=Job.RUNNING, attempts=attempts + 1, locked_by=worker_id, locked_at=now
+        )
+        if updated:
+            claimed.append(pk)
+            if len(claimed) == limit:
+                break
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_after', 'created'))
+
+
+def requeue_stale_jobs(stale_seconds=STALE_JOB_SECONDS):
+    """Queue the running jobs whose worker has stopped saving them again, return their number"""
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=timezone.now() - datetime.timedelta(seconds=stale_seconds)
+    )
+    requeued = 0
+    for job in stale:
+        # the same conditional update as a claim, so a job that has just been saved is left alone
+        jobs = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_at=job.locked_at)
+        if job.attempts >= job.max_attempts:
+            jobs.update(status=Job.FAILED, error='The worker stopped.', finished=timezone.now())
+        else:
+            requeued += jobs.update(status=Job.QUEUED, locked_by='', locked_at=None)
+    return requeued
+
+
+def run_job(job):
+    """Run a claimed job and save its outcome, it never raises"""
+    state = {'done': job.progress, 'saved': timezone.now()}
+
+    def progress(done, total=None):
+        state['done'] = done
+        now = timezone.now()
+        if total is None and (now - state['saved']).total_seconds() < PROGRESS_SAVE_SECONDS:
+            return
+        state['saved'] = now
+        fields = {'progress': done, 'locked_at': now}
+        if total is not None:
+            fields['total'] = total
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(**fields)
+
+    try:
+        func = _registry.get(job.name)
+        if func is None:
+            raise UnknownJob(job.name)
+        result = func(progress, **job.kwargs)
+    except Exception:
+        logger.exception('The job %s (attempt %s) failed', job.pk, job.attempts)
+        fields = {'error': traceback.format_exc(), 'locked_by': '', 'locked_at': None}
+        if job.attempts < job.max_attempts:
+            delay = RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+            fields.update(status=Job.QUEUED, run_after=timezone.now() + datetime.timedelta(seconds=delay))
+        else:
+            fields.update(status=Job.FAILED, finished=timezone.now())
+    else:
+        fields = {'status': Job.DONE, 'result': result, 'error': '', 'finished': timezone.now()}
+    fields['progress'] = state['done']
+    # nothing is saved if the job was taken over by another worker meanwhile (see requeue_stale_jobs)
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(**fields)
+
+
+@register_job('delete_subject')
+def delete_subject_job(progress, subject_id):
+    subject = Subject.objects.filter(pk=subject_id).first()
+    # a retry of an attempt that has deleted it
+    if subject is None:
+        return 0
+    return delete_subject(subject, progress=progress)
+
+
+@register_job('delete_user')
+def delete_user_job(progress, user_id):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return 0
+    return delete_user(user, progress=progress)
+
+
+@register_job('rebuild_rollups')
+def rebuild_rollups_job(progress, user_id):
+    user = get_user_model().objects.get(pk=user_id)
+    return dict(zip(('created', 'updated', 'deleted'), rebuild_user_rollups(user)))
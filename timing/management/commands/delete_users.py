@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from timing.deletion import DELETE_CHUNK_SIZE, delete_user
+from timing.jobs import enqueue
+
+
+
+class Command(BaseCommand):
+    help = "Delete accounts with all of their data in chunks of set-wise DELETEs, without loading their timelogs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='+', help='The usernames of the accounts to delete.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=DELETE_CHUNK_SIZE,
+            help=f'Number of timelogs deleted in each transaction (default: {DELETE_CHUNK_SIZE}).'
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Queue a background job for each account instead (see run_worker).'
+        )
+
+    def handle(self, *args, **options):
+        users = list(get_user_model().objects.filter(username__in=options['usernames']).order_by('pk'))
+        missing = set(options['usernames']) - {user.username for user in users}
+        if missing:
+            raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        if options['enqueue']:
+            for user in users:
+                # not the user's own job, it'd be deleted with the account
+                enqueue('delete_user', label=f'Account "{user.username}"', total=user.timelogs.count(), user_id=user.pk)
+            self.stdout.write(self.style.SUCCESS(f'{len(users)} deletion(s) queued.'))
+            return
+
+        for user in users:
+            total = user.timelogs.count()
+
+            def progress(deleted, username=user.username):
+                self.stdout.write(f'{username}: {deleted}/{total} timelogs deleted')
+
+            delete_user(user, chunk_size=options['chunk_size'], progress=progress)
+            self.stdout.write(f'{user.username}: deleted')
+        self.stdout.write(self.style.SUCCESS(f'{len(users)} user(s) deleted.'))
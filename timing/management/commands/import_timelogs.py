@@ -0,0 +1,53 @@
+import os
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from timing.imports import RECORD_READERS, TIMELOG_FIELDS, TimeLogImportError, import_timelogs
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a user's timelogs from a CSV or NDJSON file with batched inserts, "
+        f"the missing subjects and tags are created. The fields are: {', '.join(TIMELOG_FIELDS)}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='The user who owns the imported timelogs.')
+        parser.add_argument('path', help='The CSV or NDJSON file, or - to read from stdin.')
+        parser.add_argument(
+            '--format', choices=sorted(RECORD_READERS),
+            help="The file's format (default: based on the file's extension, csv for stdin)."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows written per bulk query (default: 1000).'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist.')
+
+        path = options['path']
+        file_format = options['format'] or (os.path.splitext(path)[1].lstrip('.').lower() if path != '-' else 'csv')
+        if file_format not in RECORD_READERS:
+            raise CommandError(f'Unknown format "{file_format}", use --format to choose one of {sorted(RECORD_READERS)}.')
+
+        try:
+            if path == '-':
+                created = import_timelogs(user, RECORD_READERS[file_format](sys.stdin), options['batch_size'])
+            else:
+                with open(path, newline='', encoding='utf-8') as lines:
+                    created = import_timelogs(user, RECORD_READERS[file_format](lines), options['batch_size'])
+        except OSError as exc:
+            raise CommandError(f'Can not read {path}: {exc}')
+        except TimeLogImportError as exc:
+            raise CommandError(f'Nothing is imported. {exc}')
+
+        self.stdout.write(self.style.SUCCESS(
+            '{} timelog(s) imported, {} subject(s) and {} tag(s) created.'.format(*created)
+        ))
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from timing.jobs import enqueue
+from timing.rollups import rebuild_user_rollups
+
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily subject totals and daily totals from the timelogs and repair any drift, one user at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Only rebuild the rollups of these users (default: all users).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows written per bulk query (default: 1000).'
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Queue a background job for each user instead (see run_worker).'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        if options['enqueue']:
+            queued = 0
+            for user in users.iterator():
+                enqueue('rebuild_rollups', label=f'The rollups of {user.username}', user_id=user.pk)
+                queued += 1
+            self.stdout.write(self.style.SUCCESS(f'{queued} rollup rebuild(s) queued.'))
+            return
+
+        repaired_users = 0
+        for user in users.iterator():
+            created, updated, deleted = rebuild_user_rollups(user, batch_size=options['batch_size'])
+            if created or updated or deleted:
+                repaired_users += 1
+                self.stdout.write(
+                    f'{user.username}: {created} created, {updated} updated, {deleted} deleted'
+                )
+        self.stdout.write(self.style.SUCCESS(f'Rollups rebuilt, {repaired_users} user(s) had drift.'))
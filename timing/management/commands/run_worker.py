@@ -0,0 +1,89 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from timing.cache import CHARTS_CACHE_ALIAS
+from timing.jobs import claim_jobs, get_worker_id, requeue_stale_jobs, run_job
+
+
+# how often the jobs of the stopped workers are looked for
+REQUEUE_INTERVAL_SECONDS = 60
+
+
+def run_in_thread(job):
+    close_old_connections()
+    try:
+        run_job(job)
+    finally:
+        # the pool's thread may sit idle for long, so don't keep its connections open
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run the queued background jobs (see timing.jobs) in a thread pool until it's stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Number of jobs run at the same time (default: 4). Run more workers for CPU-bound jobs.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait for new jobs when the queue is empty (default: 1).'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no job is due, instead of waiting for new ones.'
+        )
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        if threads < 1:
+            raise CommandError('--threads must be positive.')
+        if isinstance(caches[CHARTS_CACHE_ALIAS], LocMemCache):
+            # the jobs' data version bumps would never reach the web workers, which'd keep serving stale pages
+            raise CommandError(
+                'The charts cache is local to each process, set DJANGO_CACHE_BACKEND to a shared cache '
+                '(e.g. file) for the web server and the worker.'
+            )
+        worker_id = get_worker_id()
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            # let the running jobs finish, they'd be retried from the start otherwise
+            self.stdout.write('Stopping, waiting for the running jobs...')
+            stopping.set()
+
+        previous_handlers = {signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        self.stdout.write(f'Worker {worker_id} started with {threads} thread(s).')
+        finished = 0
+        last_requeued = float('-inf')
+        try:
+            with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as executor:
+                running = set()
+                while not stopping.is_set():
+                    done = {future for future in running if future.done()}
+                    finished += len(done)
+                    running -= done
+                    close_old_connections()
+                    if time.monotonic() - last_requeued > REQUEUE_INTERVAL_SECONDS:
+                        requeue_stale_jobs()
+                        last_requeued = time.monotonic()
+                    jobs = claim_jobs(worker_id, limit=threads - len(running)) if len(running) < threads else []
+                    for job in jobs:
+                        running.add(executor.submit(run_in_thread, job))
+                    if not jobs:
+                        if options['burst'] and not running:
+                            break
+                        stopping.wait(options['poll_interval'])
+                finished += len(running)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker_id} stopped, {finished} job(s) run.'))
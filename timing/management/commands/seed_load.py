@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timing.seeding import SEED_PASSWORD, SeedError, seed_users
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate users with subjects, tags and years of timelog history for load testing, with bulk inserts. "
+        "The same options always generate the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', type=int, help='Number of users to create.')
+        parser.add_argument('--subjects', type=int, default=20, help='Subjects per user (default: 20).')
+        parser.add_argument('--tags', type=int, default=10, help='Tags per user (default: 10).')
+        parser.add_argument('--years', type=float, default=1, help='Years of timelog history (default: 1).')
+        parser.add_argument(
+            '--timelogs-per-day', type=int, default=3, help='Timelogs of each day (default: 3).'
+        )
+        parser.add_argument(
+            '--prefix', default='load', help='The usernames are PREFIX-1, PREFIX-2, ... (default: load).'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='The random seed (default: 0).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows written per bulk query (default: 1000).'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            users = seed_users(
+                options['users'], options['subjects'], options['tags'], options['years'],
+                options['timelogs_per_day'], options['prefix'], options['seed'], batch_size=options['batch_size']
+            )
+        except SeedError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(users)} user(s) created in {time.perf_counter() - started:.1f}s, '
+            f'they log in with the password "{SEED_PASSWORD}".'
+        ))
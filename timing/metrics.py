@@ -0,0 +1,326 @@
+"""
+Per-view request metrics in the Prometheus text format (see views.metrics).
+"""
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import ExitStack, suppress
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks (e.g. on Windows), so the files of the stopped workers are never pruned
+    fcntl = None
+
+from django.conf import settings
+from django.db import connections
+
+from .cache import fragment_cache_stats
+from .profiling import QueryTimer
+
+
+METRICS_PREFIX = 'wayd'
+METRICS_FLUSH_SECONDS = 5
+RETIRED_METRICS_NAME = 'retired'
+# (name, help, buckets) of the histograms, their buckets are upper bounds
+HISTOGRAMS = (
+    ('http_request_duration_seconds', 'The latency of the requests.',
+     (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    ('db_queries_per_request', 'The number of database queries of each request.',
+     (0, 1, 2, 3, 5, 10, 20, 50, 100)),
+    ('db_query_duration_seconds_per_request', 'The time of the database queries of each request.',
+     (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)),
+    ('http_response_size_bytes', 'The size of the responses, without the streaming ones.',
+     (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)),
+)
+COUNTERS = (
+    ('http_requests_total', 'The number of requests.'),
+    ('fragment_cache_hits_total', 'The hits of the cached template fragments.'),
+    ('fragment_cache_misses_total', 'The misses of the cached template fragments.'),
+    ('fragment_cache_render_seconds_total', 'The render time of the missed template fragments.'),
+    ('query_budget_exceeded_total', 'The broken query budgets (see timing.query_budget).'),
+)
+HISTOGRAM_BUCKETS = {name: buckets for name, _, buckets in HISTOGRAMS}
+
+
+
+class _ThreadSeries(threading.local):
+    def __init__(self):
+        # {(name, labels): values}, a histogram's values are the count of each bucket (and +Inf), the sum and the count
+        self.series = {}
+        with _series_lock:
+            _live_series[id(self.series)] = self.series
+        weakref.finalize(threading.current_thread(), _retire_series, self.series)
+
+
+def _retire_series(series):
+    # its thread has ended, so nothing changes the series anymore
+    with _series_lock:
+        del _live_series[id(series)]
+        for key, values in series.items():
+            _add_values(_retired_series, key, values)
+
+
+# reentrant, a thread may end (and its series be retired) while the lock is held by a snapshot
+_series_lock = threading.RLock()
+# the series of the running threads by their ids, and the sum of the ended threads' series
+_live_series = {}
+_retired_series = {}
+_thread_series = _ThreadSeries()
+_last_flushed = 0
+# the (pid, name) of this process' metrics file and the (path, file) of the lock it holds on it
+_process_name = (None, None)
+_process_lock = (None, None)
+
+
+def observe(name, labels, value):
+    """Add a value to a histogram"""
+    series = _thread_series.series
+    buckets = HISTOGRAM_BUCKETS[name]
+    values = series.get((name, labels))
+    if values is None:
+        values = series[(name, labels)] = [0] * (len(buckets) + 3)
+    values[bisect_left(buckets, value)] += 1
+    values[-2] += value
+    values[-1] += 1
+
+
+def increment(name, labels, value=1):
+    series = _thread_series.series
+    values = series.get((name, labels))
+    if values is None:
+        values = series[(name, labels)] = [0]
+    values[0] += value
+
+
+def snapshot():
+    """Return the sum of the threads' series of this process, with the fragment cache counters"""
+    with _series_lock:
+        total = {key: values[:] for key, values in list(_retired_series.items())}
+        live_series = list(_live_series.values())
+    for thread_series in live_series:
+        # copy() and the slices don't let other threads run, so they don't see a series that's being changed
+        for key, values in thread_series.copy().items():
+            _add_values(total, key, values[:])
+    for fragment, stats in fragment_cache_stats.as_dict().items():
+        labels = (('fragment', fragment),)
+        total[('fragment_cache_hits_total', labels)] = [stats['hits']]
+        total[('fragment_cache_misses_total', labels)] = [stats['misses']]
+        total[('fragment_cache_render_seconds_total', labels)] = [stats['render_ms'] / 1000]
+    return total
+
+
+def _add_values(total, key, values):
+    if key in total:
+        total[key] = [a + b for a, b in zip(total[key], values)]
+    else:
+        total[key] = values
+
+
+def _get_process_name():
+    global _process_name
+    pid, name = _process_name
+    # a forked worker gets its own name
+    if pid != os.getpid():
+        pid = os.getpid()
+        _process_name = pid, f'{pid}-{secrets.token_hex(4)}'
+    return _process_name[1]
+
+
+def _lock_process_file(directory):
+    """Hold a lock on this process' metrics file while it runs, so the others know it isn't stopped"""
+    global _process_lock
+    path = os.path.join(directory, f'{_get_process_name()}.lock')
+    if fcntl is None or _process_lock[0] == path:
+        return
+    lock_file = open(path, 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    # a forked worker's copy of its parent's lock is only closed, that doesn't release the parent's lock
+    if _process_lock[1] is not None:
+        _process_lock[1].close()
+    _process_lock = path, lock_file
+
+
+def _read_rows(path):
+    with open(path, encoding='utf-8') as metrics_file:
+        return json.load(metrics_file)
+
+
+def _write_rows(directory, name, rows):
+    # replace the file at once, so the other workers never read a half-written one
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False, encoding='utf-8') as tmp:
+        json.dump(rows, tmp)
+    os.replace(tmp.name, os.path.join(directory, f'{name}.json'))
+
+
+def _add_rows(total, rows):
+    for name, labels, values in rows:
+        _add_values(total, (name, tuple(tuple(label) for label in labels)), values)
+
+
+def _to_rows(metrics):
+    return [[name, list(labels), values] for (name, labels), values in metrics.items()]
+
+
+def flush(force=False):
+    """Save this process' metrics to settings.TIMING_METRICS_DIR, if it's set and they're old enough"""
+    global _last_flushed
+    directory = settings.TIMING_METRICS_DIR
+    now = time.monotonic()
+    if not directory or (not force and now - _last_flushed < METRICS_FLUSH_SECONDS):
+        return
+    _last_flushed = now
+    os.makedirs(directory, exist_ok=True)
+    _lock_process_file(directory)
+    _write_rows(directory, _get_process_name(), _to_rows(snapshot()))
+
+
+def _lock_if_stopped(lock_path):
+    """Return the lock of a stopped process' file (the caller closes it), None if the process runs"""
+    lock_file = open(lock_path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _retire(directory, path):
+    # under the lock of retired.json, another process may have retired the file while this one waited for it
+    try:
+        rows = _read_rows(path)
+    except FileNotFoundError:
+        return
+    retired = {}
+    try:
+        _add_rows(retired, _read_rows(os.path.join(directory, f'{RETIRED_METRICS_NAME}.json')))
+    except FileNotFoundError:
+        pass
+    _add_rows(retired, rows)
+    _write_rows(directory, RETIRED_METRICS_NAME, _to_rows(retired))
+    os.remove(path)
+
+
+def retire_stopped_processes(directory):
+    """Merge the metrics files of the stopped processes into retired.json and remove them"""
+    if fcntl is None:
+        return
+    own_name = _get_process_name()
+    for filename in os.listdir(directory):
+        name, extension = os.path.splitext(filename)
+        if extension != '.json' or name in (own_name, RETIRED_METRICS_NAME):
+            continue
+        # the lock is taken before the metrics file is written, so a file without one is a stopped process' too
+        lock_path = os.path.join(directory, f'{name}.lock')
+        try:
+            lock_file = _lock_if_stopped(lock_path)
+        except OSError:
+            continue
+        if lock_file is None:
+            continue
+        with lock_file, open(os.path.join(directory, f'{RETIRED_METRICS_NAME}.lock'), 'a') as retired_lock:
+            fcntl.flock(retired_lock, fcntl.LOCK_EX)
+            try:
+                _retire(directory, os.path.join(directory, filename))
+            except (OSError, ValueError):
+                # not a metrics file (or unreadable), it's left alone
+                continue
+            # the name is never used again, so its lock can go too
+            with suppress(FileNotFoundError):
+                os.remove(lock_path)
+
+
+def collect():
+    """Return the metrics of this process and of the other workers (see settings.TIMING_METRICS_DIR)"""
+    total = snapshot()
+    directory = settings.TIMING_METRICS_DIR
+    if directory and os.path.isdir(directory):
+        retire_stopped_processes(directory)
+        own_file = f'{_get_process_name()}.json'
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json') or filename == own_file:
+                continue
+            try:
+                _add_rows(total, _read_rows(os.path.join(directory, filename)))
+            except (OSError, ValueError):
+                continue
+    return total
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def render_metrics(metrics):
+    """Return the metrics in the Prometheus text format"""
+    by_name = {}
+    for (name, labels), values in sorted(metrics.items()):
+        by_name.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name, help_text, buckets in HISTOGRAMS:
+        full_name = f'{METRICS_PREFIX}_{name}'
+        lines += [f'# HELP {full_name} {help_text}', f'# TYPE {full_name} histogram']
+        for labels, values in by_name.get(name, ()):
+            cumulative = 0
+            for bound, count in zip((*map(_format_bound, buckets), '+Inf'), values):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{full_name}_sum{_format_labels(labels)} {values[-2]}')
+            lines.append(f'{full_name}_count{_format_labels(labels)} {values[-1]}')
+    for name, help_text in COUNTERS:
+        full_name = f'{METRICS_PREFIX}_{name}'
+        lines += [f'# HELP {full_name} {help_text}', f'# TYPE {full_name} counter']
+        for labels, values in by_name.get(name, ()):
+            lines.append(f'{full_name}{_format_labels(labels)} {values[0]}')
+    return '\n'.join(lines) + '\n'
+
+
+def get_view_name(request):
+    # the url name, not the path, so the number of the label values is bounded
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.view_name else 'unresolved'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_timer = QueryTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_timer))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            seconds = time.perf_counter() - started
+
+        view = get_view_name(request)
+        if view != 'timing:metrics':
+            labels = (('view', view),)
+            observe('http_request_duration_seconds', labels, seconds)
+            observe('db_queries_per_request', labels, query_timer.count)
+            observe('db_query_duration_seconds_per_request', labels, query_timer.seconds)
+            if not response.streaming:
+                observe('http_response_size_bytes', labels, len(response.content))
+            increment('http_requests_total', (('view', view), ('method', request.method),
+                                              ('status', str(response.status_code))))
+            flush()
+        return response
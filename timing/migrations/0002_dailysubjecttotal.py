@@ -0,0 +1,56 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_daily_subject_totals(apps, schema_editor):
+    TimeLog = apps.get_model('timing', 'TimeLog')
+    DailySubjectTotal = apps.get_model('timing', 'DailySubjectTotal')
+    rows = (
+        TimeLog.objects.order_by()
+        .values_list('user', 'subject', 'date')
+        .annotate(models.Sum('duration'), models.Count('pk'))
+    )
+    DailySubjectTotal.objects.bulk_create(
+        (
+            DailySubjectTotal(
+                user_id=user_id, subject_id=subject_id, date=date,
+                total_minutes=total_minutes, log_count=log_count
+            )
+            for user_id, subject_id, date, total_minutes, log_count in rows.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('timing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySubjectTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_minutes', models.PositiveIntegerField(default=0)),
+                ('log_count', models.PositiveIntegerField(default=0)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='timing.subject')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_subject_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailysubjecttotal',
+            index=models.Index(fields=['user', 'date'], name='daily_total_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysubjecttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'subject', 'date'), name='unique_daily_subject_total'),
+        ),
+        migrations.RunPython(populate_daily_subject_totals, migrations.RunPython.noop),
+    ]
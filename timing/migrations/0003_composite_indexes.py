@@ -0,0 +1,37 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timing', '0002_dailysubjecttotal'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dailysubjecttotal',
+            name='daily_total_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='dailysubjecttotal',
+            index=models.Index(fields=['user', 'date', 'subject', 'total_minutes'], name='daily_total_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['user', 'last_modified', 'id'], name='subject_user_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'last_modified', 'id'], name='tag_user_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelog',
+            index=models.Index(fields=['user', 'date', 'subject', 'duration'], name='timelog_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelog',
+            index=models.Index(fields=['user', 'last_modified', 'id'], name='timelog_user_modified_idx'),
+        ),
+    ]
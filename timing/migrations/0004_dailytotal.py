@@ -0,0 +1,44 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_daily_totals(apps, schema_editor):
+    TimeLog = apps.get_model('timing', 'TimeLog')
+    DailyTotal = apps.get_model('timing', 'DailyTotal')
+    # days that are already over 24 hours keep their real total, so nothing more can be added to them
+    rows = TimeLog.objects.order_by().values_list('user', 'date').annotate(models.Sum('duration'))
+    DailyTotal.objects.bulk_create(
+        (
+            DailyTotal(user_id=user_id, date=date, total_minutes=total_minutes)
+            for user_id, date, total_minutes in rows.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('timing', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_minutes', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailytotal',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_total'),
+        ),
+        migrations.RunPython(populate_daily_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:58
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timing', '0004_dailytotal'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='subject',
+            name='unique_subject_name_for_each_user',
+        ),
+        migrations.RemoveConstraint(
+            model_name='tag',
+            name='unique_tag_name_for_each_user',
+        ),
+        migrations.AddConstraint(
+            model_name='subject',
+            constraint=models.UniqueConstraint(django.db.models.expressions.F('user'), django.db.models.functions.text.Lower('name'), name='unique_subject_name_for_each_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(django.db.models.expressions.F('user'), django.db.models.functions.text.Lower('name'), name='unique_tag_name_for_each_user'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def populate_last_used(apps, schema_editor):
+    # the last time a timelog was recorded with each subject and tag
+    for model_name in ('Subject', 'Tag'):
+        model = apps.get_model('timing', model_name)
+        rows = (
+            model.objects.order_by().filter(timelog__isnull=False)
+            .annotate(last_timelog=models.Max('timelog__last_modified'))
+        )
+        to_update = []
+        for obj in rows.iterator():
+            obj.last_used = obj.last_timelog
+            to_update.append(obj)
+        model.objects.bulk_update(to_update, ['last_used'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timing', '0005_case_insensitive_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subject',
+            name='last_used',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='last_used',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['user', 'last_used'], name='subject_user_used_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'last_used'], name='tag_user_used_idx'),
+        ),
+        migrations.RunPython(populate_last_used, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.3 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timing', '0007_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timelog',
+            index=models.Index(fields=['user', 'date', 'last_modified', 'id'], name='timelog_user_export_idx'),
+        ),
+    ]
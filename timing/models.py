@@ -2,9 +2,12 @@ import uuid
 import datetime
 
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 
 
 class TimeLog(models.Model):
@@ -36,6 +39,14 @@ class TimeLog(models.Model):
 
     class Meta:
         ordering = ['-last_modified']
+        indexes = [
+            # the date range queries of the dashboard (it covers the subject and duration too)
+            models.Index(fields=('user', 'date', 'subject', 'duration'), name='timelog_user_date_idx'),
+            # the (cursor) paginated lists and the recent records
+            models.Index(fields=('user', 'last_modified', 'id'), name='timelog_user_modified_idx'),
+            # the keyset chunks of the exports (see timing.exports)
+            models.Index(fields=('user', 'date', 'last_modified', 'id'), name='timelog_user_export_idx'),
+        ]
 
     def get_absolute_url(self):
         return reverse('timing:timelog-detail', kwargs={'pk': self.pk})
@@ -54,11 +65,18 @@ class Subject(models.Model):
     name = models.CharField(max_length=200)
     description = models.CharField(max_length=500, blank=True)
     last_modified = models.DateTimeField(auto_now=True)
+    # when a timelog was last recorded with it, it ranks the autocomplete results
+    last_used = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['-last_modified']
         constraints = [
-            models.UniqueConstraint(fields=('user', 'name'), name='unique_subject_name_for_each_user')
+            # case-insensitive, so the names are checked with an index lookup on (user, LOWER(name))
+            models.UniqueConstraint(F('user'), Lower('name'), name='unique_subject_name_for_each_user')
+        ]
+        indexes = [
+            models.Index(fields=('user', 'last_modified', 'id'), name='subject_user_modified_idx'),
+            models.Index(fields=('user', 'last_used'), name='subject_user_used_idx'),
         ]
 
     def get_absolute_url(self):
@@ -77,15 +95,125 @@ class Tag(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     last_modified = models.DateTimeField(auto_now=True)
+    # when a timelog was last recorded with it, it ranks the autocomplete results
+    last_used = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['-last_modified']
         constraints = [
-            models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_for_each_user')
+            # case-insensitive, so the names are checked with an index lookup on (user, LOWER(name))
+            models.UniqueConstraint(F('user'), Lower('name'), name='unique_tag_name_for_each_user')
+        ]
+        indexes = [
+            models.Index(fields=('user', 'last_modified', 'id'), name='tag_user_modified_idx'),
+            models.Index(fields=('user', 'last_used'), name='tag_user_used_idx'),
         ]
     
     def get_absolute_url(self):
         return reverse('timing:tag-detail', kwargs={'pk': self.pk})
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class DailySubjectTotal(models.Model):
+    """
+    Pre-summed durations of a user's timelogs for each subject and date.
+    It's maintained by the views that write timelogs (see timing.rollups).
+    """
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='daily_subject_totals'
+    )
+    subject = models.ForeignKey('Subject', on_delete=models.CASCADE)
+    date = models.DateField()
+    total_minutes = models.PositiveIntegerField(default=0)
+    log_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'subject', 'date'), name='unique_daily_subject_total')
+        ]
+        indexes = [
+            # it covers the chart queries, so they don't read the table rows
+            models.Index(fields=('user', 'date', 'subject', 'total_minutes'), name='daily_total_user_date_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.subject_id} {self.total_minutes}'
+
+
+class DailyTotal(models.Model):
+    """
+    The ledger of a user's logged minutes for each date, it keeps every day within 24 hours.
+    It's checked and incremented in a single conditional UPDATE (see timing.rollups).
+    """
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='daily_totals'
+    )
+    date = models.DateField()
+    total_minutes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_total')
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.total_minutes}'
+
+
+class Job(models.Model):
+    """
+    A unit of background work, e.g. deleting a large subject. It's queued in the database and
+    run by the run_worker command (see timing.jobs), so it needs no message broker.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    # the name of the job's function (see timing.jobs.register_job) and its keyword arguments
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # what it works on, for the users, e.g. 'Subject "Django"'
+    label = models.CharField(max_length=300, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    # a failed attempt is retried after a delay
+    run_after = models.DateTimeField(default=timezone.now)
+    # the worker that runs it, its heartbeat and when it's finished
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            # the workers' lookup of the next queued job
+            models.Index(fields=('status', 'run_after'), name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} {self.label} ({self.status})'
@@ -0,0 +1,65 @@
+"""
+The NumPy aggregation engine of the dashboard (it needs numpy to be installed).
+"""
+from collections import defaultdict
+from itertools import count
+from operator import itemgetter
+
+import numpy as np
+
+
+def _column(rows, position, dtype=np.int64):
+    # read one column of the rows into an array, map and itemgetter keep the loop in C
+    return np.fromiter(map(itemgetter(position), rows), dtype=dtype, count=len(rows))
+
+
+def _index_codes(rows, position, keys):
+    # map the values of one column of the rows to their index in keys (-1 for unknown values)
+    index = defaultdict(lambda: -1, ((key, i) for i, key in enumerate(keys)))
+    return np.fromiter(
+        map(index.__getitem__, map(itemgetter(position), rows)),
+        dtype=np.int64, count=len(rows)
+    )
+
+
+def date_subject_matrix(rows, subject_ids, dates):
+    """
+    Sum up the minutes of (subject_id, date, minutes) rows into a subjects × dates matrix (list of lists).
+    """
+    rows = list(rows)
+    if not rows or not subject_ids or not dates:
+        return [[0] * len(dates) for _ in subject_ids]
+
+    subject_codes = _index_codes(rows, 0, subject_ids)
+    date_codes = _index_codes(rows, 1, dates)
+    minutes = _column(rows, 2)
+    known = (subject_codes >= 0) & (date_codes >= 0)
+    # flatten the (subject, date) pairs into matrix cells and sum up the minutes of each cell
+    cells = subject_codes[known] * len(dates) + date_codes[known]
+    matrix = np.bincount(cells, weights=minutes[known], minlength=len(subject_ids) * len(dates))
+    return matrix.astype(np.int64).reshape(len(subject_ids), len(dates)).tolist()
+
+
+def sum_durations_by_key(rows):
+    """
+    Sum up the minutes of (key, minutes) rows.
+    Return a dict that maps each key to its total minutes.
+    """
+    rows = list(rows)
+    if not rows:
+        return {}
+    # give each new key the next code while reading the key column
+    index = defaultdict(count().__next__)
+    codes = np.fromiter(map(index.__getitem__, map(itemgetter(0), rows)), dtype=np.int64, count=len(rows))
+    totals = np.bincount(codes, weights=_column(rows, 1), minlength=len(index))
+    return dict(zip(index, totals.astype(np.int64).tolist()))
+
+
+def subject_totals(daily_totals):
+    """Return a dict that maps each subject_id of a DailySubjectTotal queryset to its total minutes"""
+    return sum_durations_by_key(daily_totals.order_by().values_list('subject', 'total_minutes'))
+
+
+def tag_totals(timelogs):
+    """Return a dict that maps each tag_id of a TimeLog queryset to its total minutes"""
+    return sum_durations_by_key(timelogs.order_by().filter(tags__isnull=False).values_list('tags', 'duration'))
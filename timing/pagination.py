@@ -0,0 +1,98 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+
+
+class CursorPage:
+    """A page of a CursorPaginator, it knows the cursors of its neighbour pages but not its number"""
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset in (-last_modified, -id) order by seeking after (or before) the last
+    (or first) row of the current page, instead of counting all rows and skipping them with OFFSET.
+    So any page costs the same as the first one.
+    The cursors are opaque tokens that hold the direction and the (last_modified, id) position.
+    """
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_page(self, cursor=None):
+        position = self.parse_cursor(cursor)
+        if position is None:
+            # the first page
+            rows = list(self.queryset.order_by('-last_modified', '-pk')[:self.per_page + 1])
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif position[0] == 'next':
+            # the rows after the position, i.e. (last_modified, id) < position
+            _, last_modified, pk = position
+            rows = list(
+                self.queryset.filter(last_modified__lte=last_modified)
+                .exclude(last_modified=last_modified, pk__gte=pk)
+                .order_by('-last_modified', '-pk')[:self.per_page + 1]
+            )
+            has_next, has_previous = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            # the rows before the position, read in reverse order
+            _, last_modified, pk = position
+            rows = list(
+                self.queryset.filter(last_modified__gte=last_modified)
+                .exclude(last_modified=last_modified, pk__lte=pk)
+                .order_by('last_modified', 'pk')[:self.per_page + 1]
+            )
+            has_next, has_previous = True, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor('next', rows[-1]) if rows and has_next else None,
+            previous_cursor=self.encode_cursor('previous', rows[0]) if rows and has_previous else None
+        )
+
+    def parse_cursor(self, cursor):
+        # return the (direction, last_modified, pk) of the cursor or None for no (or an invalid) cursor
+        if not cursor:
+            return None
+        try:
+            direction, last_modified, pk = self.decode_cursor(cursor)
+            return direction, last_modified, self.queryset.model._meta.pk.to_python(pk)
+        except (ValueError, ValidationError):
+            return None
+
+    @staticmethod
+    def encode_cursor(direction, obj):
+        position = json.dumps([direction, obj.last_modified.isoformat(), str(obj.pk)])
+        return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            position = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, last_modified, pk = json.loads(position)
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise ValueError(f'Invalid cursor: {cursor}')
+        if direction not in ('next', 'previous'):
+            raise ValueError(f'Invalid cursor: {cursor}')
+        return direction, datetime.datetime.fromisoformat(last_modified), pk
@@ -0,0 +1,162 @@
+"""
+Opt-in profiling of single requests (?profile=1 or an "X-Profile: 1" header) for staff users only.
+"""
+import datetime
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+PROFILE_QUERY_FLAG = 'profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SAMPLE_INTERVAL = 0.001
+# a sample in these modules is counted as rendering, unless it's in the database code
+RENDER_MODULE = os.path.join('django', 'template', '')
+DB_MODULE = os.path.join('django', 'db', 'backends', '')
+
+
+
+class StackSampler(threading.Thread):
+    """Sample the stack of a thread until it's stopped"""
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        last_sampled = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            # weigh each sample by the time since the previous one, the interval isn't exact
+            self.samples.append((stack[::-1], now - last_sampled))
+            last_sampled = now
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class QueryTimer:
+    """A database execute wrapper which sums the time of the queries"""
+    def __init__(self):
+        self.seconds = 0
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def get_phases(samples, total_seconds, db_seconds):
+    """Split the request's time (in ms) into the database, rendering and python phases"""
+    sampled_seconds = sum(weight for _, weight in samples)
+    render_seconds = sum(
+        weight for stack, weight in samples
+        if any(RENDER_MODULE in filename for _, filename, _ in stack)
+        and not any(DB_MODULE in filename for _, filename, _ in stack)
+    )
+    # the rendering is estimated from its share of the samples, the database time is measured
+    render_seconds = total_seconds * render_seconds / sampled_seconds if sampled_seconds else 0
+    return {
+        'total_ms': round(total_seconds * 1000, 2),
+        'db_ms': round(db_seconds * 1000, 2),
+        'render_ms': round(render_seconds * 1000, 2),
+        'python_ms': round(max(total_seconds - db_seconds - render_seconds, 0) * 1000, 2),
+    }
+
+
+def create_speedscope_profile(name, samples):
+    """Return the samples in the speedscope file format, in milliseconds"""
+    frames, frame_indexes, profile_samples, weights = [], {}, [], []
+    for stack, weight in samples:
+        sample = []
+        for frame in stack:
+            if frame not in frame_indexes:
+                frame_indexes[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+            sample.append(frame_indexes[frame])
+        profile_samples.append(sample)
+        weights.append(round(weight * 1000, 3))
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'timing.profiling',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled', 'name': name, 'unit': 'milliseconds',
+            'startValue': 0, 'endValue': round(sum(weights), 3),
+            'samples': profile_samples, 'weights': weights,
+        }],
+    }
+
+
+def save_profile(request, samples, phases, queries_count):
+    """Save the speedscope file of the request, with its phases, return its path"""
+    os.makedirs(settings.TIMING_PROFILING_DIR, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    slug = re.sub(r'[^a-zA-Z0-9]+', '-', request.path).strip('-') or 'index'
+    path = os.path.join(settings.TIMING_PROFILING_DIR, f'{timestamp}-{request.user.pk}-{slug}.speedscope.json')
+    profile = create_speedscope_profile(f'{request.method} {request.get_full_path()}', samples)
+    # speedscope ignores the other keys
+    profile['phases'] = dict(phases, queries=queries_count)
+    with open(path, 'w', encoding='utf-8') as profile_file:
+        json.dump(profile, profile_file)
+    return path
+
+
+def is_profiling_requested(request):
+    if request.GET.get(PROFILE_QUERY_FLAG) != '1' and request.META.get(PROFILE_HEADER) != '1':
+        return False
+    # only now read the user, so the other requests don't pay for it
+    return request.user.is_staff
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_profiling_requested(request):
+            return self.get_response(request)
+
+        query_timer = QueryTimer()
+        sampler = StackSampler(threading.get_ident())
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_timer))
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+            total_seconds = time.perf_counter() - started
+
+        phases = get_phases(sampler.samples, total_seconds, query_timer.seconds)
+        path = save_profile(request, sampler.samples, phases, query_timer.count)
+        response['Server-Timing'] = ', '.join(
+            f'{phase};dur={phases[f"{phase}_ms"]}' for phase in ('db', 'render', 'python', 'total')
+        )
+        response['X-Profile-File'] = os.path.basename(path)
+        return response
@@ -0,0 +1,129 @@
+"""
+Query budgets: the most queries a view (or any block of code) may run, e.g. @query_budget(5).
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+REPEATED_QUERY_LIMIT = 3
+# the batches of a bulk_create (an INSERT of many rows) and of a bulk_update (an UPDATE with CASE WHEN)
+BULK_WRITE_RE = re.compile(
+    r'^\s*(INSERT\b.*(\), \.\.\.|UNION ALL \.\.\.)|UPDATE\b.*\bCASE WHEN\b)', re.IGNORECASE | re.DOTALL
+)
+WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a block of code runs more queries than its budget (see settings.TIMING_QUERY_BUDGET_MODE)"""
+
+
+def get_query_shape(sql):
+    """The SQL without its values, e.g. the queries of the pages of a list or of IN lists have the same shape"""
+    sql = re.sub(r'%s(\s*,\s*%s)*', '%s, ...', sql)
+    # the rows of a multi-row INSERT (SQLite's are SELECTs), so all the batches of a bulk_create have the same shape
+    sql = re.sub(r'\(%s, \.\.\.\)(\s*,\s*\(%s, \.\.\.\))+', '(%s, ...), ...', sql)
+    sql = re.sub(r'(\s+UNION ALL SELECT %s, \.\.\.)+', ' UNION ALL ...', sql)
+    return re.sub(r'\b\d+\b', 'N', sql)
+
+
+def iterate_within_budget(iterator, max_queries, max_repeats=REPEATED_QUERY_LIMIT, name=None):
+    """Yield the items of the iterator, each one is produced within its own query budget"""
+    iterator = iter(iterator)
+    while True:
+        with query_budget(max_queries, max_repeats, name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class query_budget(ContextDecorator):
+    """Count the queries of the block in this thread, a repeated query shape past max_repeats is an N+1"""
+    def __init__(self, max_queries, max_repeats=REPEATED_QUERY_LIMIT, name=None, max_queries_per_chunk=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.name = name
+        self.max_queries_per_chunk = max_queries_per_chunk
+
+    def __call__(self, func):
+        if self.name is None:
+            self.name = f'{func.__module__}.{func.__qualname__}'
+        decorated = super().__call__(func)
+        if self.max_queries_per_chunk is None:
+            return decorated
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            response = decorated(*args, **kwargs)
+            if getattr(response, 'streaming', False):
+                response.streaming_content = iterate_within_budget(
+                    response.streaming_content, self.max_queries_per_chunk, self.max_repeats,
+                    f'{self.name} (streamed chunk)'
+                )
+            return response
+        return wrapper
+
+    def _recreate_cm(self):
+        # each call of a decorated view counts its own queries, they may run at the same time
+        return type(self)(self.max_queries, self.max_repeats, self.name)
+
+    def _count_query(self, execute, sql, params, many, context):
+        shape = get_query_shape(sql)
+        # the batches of a bulk write are one operation, however many rows it writes
+        if shape not in self.shapes or not BULK_WRITE_RE.match(shape):
+            self.shapes[shape] += 1
+        if WRITE_RE.match(sql):
+            self._written_connections.add(context['connection'])
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.shapes = Counter()
+        self._written_connections = set()
+        self._wrappers = ExitStack()
+        for connection in connections.all():
+            self._wrappers.enter_context(connection.execute_wrapper(self._count_query))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrappers.close()
+        if exc_type is None:
+            self.check()
+        return False
+
+    @property
+    def count(self):
+        return sum(self.shapes.values())
+
+    def check(self):
+        problems = []
+        if self.count > self.max_queries:
+            problems.append(('budget', f'{self.count} queries, the budget is {self.max_queries}'))
+        for shape, repeats in self.shapes.most_common():
+            if repeats <= self.max_repeats:
+                break
+            problems.append(('repeated', f'the same query ran {repeats} times (N+1?): {shape[:300]}'))
+        if not problems:
+            return
+
+        for reason in {reason for reason, _ in problems}:
+            metrics.increment('query_budget_exceeded_total', (('budget', self.name or ''), ('reason', reason)))
+        message = f'{self.name or "query budget"}: ' + '; '.join(problem for _, problem in problems)
+        if settings.TIMING_QUERY_BUDGET_MODE != 'raise':
+            logger.warning(message)
+        elif any(not connection.in_atomic_block for connection in self._written_connections):
+            # the writes are committed, an error response would tell the client they've failed
+            logger.error(f'{message} (not raised, the writes are committed)')
+        else:
+            raise QueryBudgetExceeded(message)
@@ -0,0 +1,246 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .cache import bump_data_version
+from .models import DailySubjectTotal, DailyTotal, TimeLog
+
+
+# the minutes of one day
+DAILY_MINUTES_LIMIT = 1440
+
+
+
+class DailyLimitExceeded(Exception):
+    """Raised when a timelog doesn't fit in the remaining minutes of its date"""
+    def __init__(self, date, remaining_minutes):
+        self.date = date
+        self.remaining_minutes = remaining_minutes
+        super().__init__(f'{remaining_minutes} minutes are left for {date}')
+
+
+def get_remaining_minutes(user_id, date):
+    """Return the minutes of the date that the user can still log (a single indexed row lookup)"""
+    total_minutes = (
+        DailyTotal.objects.filter(user_id=user_id, date=date)
+        .values_list('total_minutes', flat=True).first()
+    )
+    return max(DAILY_MINUTES_LIMIT - (total_minutes or 0), 0)
+
+
+def reserve_daily_minutes(user_id, date, minutes):
+    """
+    Add the minutes to the user's daily total of the date, if the day still has room for them.
+    Raise DailyLimitExceeded otherwise.
+    """
+    daily_totals = DailyTotal.objects.filter(user_id=user_id, date=date)
+
+    def increment():
+        # check and increment in one statement (UPDATE ... WHERE total_minutes + x <= 1440),
+        # so two concurrent requests can't both take the last minutes of a day
+        return daily_totals.filter(total_minutes__lte=DAILY_MINUTES_LIMIT - minutes).update(
+            total_minutes=F('total_minutes') + minutes
+        )
+
+    if increment():
+        return
+    if minutes <= DAILY_MINUTES_LIMIT:
+        try:
+            with transaction.atomic():
+                DailyTotal.objects.create(user_id=user_id, date=date, total_minutes=minutes)
+            return
+        except IntegrityError:
+            # the row exists (maybe a concurrent request has just created it), so try it once more
+            if increment():
+                return
+    raise DailyLimitExceeded(date, get_remaining_minutes(user_id, date))
+
+
+def record_timelog(timelog):
+    """
+    Add a saved timelog to its user's daily total and daily subject total.
+    Raise DailyLimitExceeded if it doesn't fit in its date, call it in the transaction
+    that saves the timelog, so the timelog is rolled back too.
+    """
+    reserve_daily_minutes(timelog.user_id, timelog.date, timelog.duration)
+    daily_total, _ = DailySubjectTotal.objects.get_or_create(
+        user_id=timelog.user_id,
+        subject_id=timelog.subject_id,
+        date=timelog.date
+    )
+    # increment in the database, so concurrent requests can't overwrite each other
+    DailySubjectTotal.objects.filter(pk=daily_total.pk).update(
+        total_minutes=F('total_minutes') + timelog.duration,
+        log_count=F('log_count') + 1
+    )
+
+
+def record_timelogs(user, timelogs, batch_size=1000):
+    """
+    Add many new timelogs of a user to the daily totals and daily subject totals set-wise,
+    with a few bulk queries instead of a couple of queries per timelog.
+    The touched daily totals are locked and checked together, raise DailyLimitExceeded for
+    the first date that would go over 24 hours. Call it in the transaction that creates the timelogs.
+    """
+    minutes_by_date = defaultdict(int)
+    totals_by_subject_and_date = defaultdict(lambda: [0, 0])
+    for timelog in timelogs:
+        minutes_by_date[timelog.date] += timelog.duration
+        subject_total = totals_by_subject_and_date[(timelog.subject_id, timelog.date)]
+        subject_total[0] += timelog.duration
+        subject_total[1] += 1
+    dates = sorted(minutes_by_date)
+
+    daily_totals, daily_subject_totals = {}, {}
+    for i in range(0, len(dates), batch_size):
+        chunk = dates[i:i + batch_size]
+        daily_totals.update(
+            (row.date, row) for row in DailyTotal.objects.select_for_update().filter(user=user, date__in=chunk)
+        )
+        daily_subject_totals.update(
+            ((row.subject_id, row.date), row)
+            for row in DailySubjectTotal.objects.select_for_update().filter(user=user, date__in=chunk)
+        )
+
+    for date in dates:
+        stored_minutes = daily_totals[date].total_minutes if date in daily_totals else 0
+        if stored_minutes + minutes_by_date[date] > DAILY_MINUTES_LIMIT:
+            raise DailyLimitExceeded(date, max(DAILY_MINUTES_LIMIT - stored_minutes, 0))
+
+    to_create, to_update = [], []
+    for date in dates:
+        row = daily_totals.get(date)
+        if row is None:
+            to_create.append(DailyTotal(user=user, date=date, total_minutes=minutes_by_date[date]))
+        else:
+            row.total_minutes += minutes_by_date[date]
+            to_update.append(row)
+    DailyTotal.objects.bulk_create(to_create, batch_size=batch_size)
+    DailyTotal.objects.bulk_update(to_update, ['total_minutes'], batch_size=batch_size)
+
+    to_create, to_update = [], []
+    for (subject_id, date), (total_minutes, log_count) in totals_by_subject_and_date.items():
+        row = daily_subject_totals.get((subject_id, date))
+        if row is None:
+            to_create.append(DailySubjectTotal(
+                user=user, subject_id=subject_id, date=date,
+                total_minutes=total_minutes, log_count=log_count
+            ))
+        else:
+            row.total_minutes += total_minutes
+            row.log_count += log_count
+            to_update.append(row)
+    DailySubjectTotal.objects.bulk_create(to_create, batch_size=batch_size)
+    DailySubjectTotal.objects.bulk_update(to_update, ['total_minutes', 'log_count'], batch_size=batch_size)
+
+
+def discard_timelog(timelog):
+    """Remove a timelog (before deleting it) from its user's daily total and daily subject total"""
+    daily_totals = DailyTotal.objects.filter(user_id=timelog.user_id, date=timelog.date)
+    # drop the row if these were the last minutes of the day, otherwise decrement it
+    daily_totals.filter(total_minutes__lte=timelog.duration).delete()
+    daily_totals.update(total_minutes=F('total_minutes') - timelog.duration)
+
+    daily_subject_totals = DailySubjectTotal.objects.filter(
+        user_id=timelog.user_id,
+        subject_id=timelog.subject_id,
+        date=timelog.date
+    )
+    # drop the row if it was the last timelog of the day, otherwise decrement it
+    daily_subject_totals.filter(log_count__lte=1).delete()
+    daily_subject_totals.filter(total_minutes__gte=timelog.duration).update(
+        total_minutes=F('total_minutes') - timelog.duration,
+        log_count=F('log_count') - 1
+    )
+
+
+def discard_timelogs(user_id, timelogs):
+    """
+    Remove many timelogs of a user (a queryset, before deleting them) from the daily totals and
+    daily subject totals set-wise, with a few queries for all of them. Call it in the transaction
+    that deletes them.
+    """
+    timelogs = timelogs.filter(user_id=user_id).order_by()
+    minutes_by_date = dict(timelogs.values_list('date').annotate(Sum('duration')))
+    totals_by_subject_and_date = {
+        (subject_id, date): (total_minutes, log_count)
+        for subject_id, date, total_minutes, log_count
+        in timelogs.values_list('subject', 'date').annotate(Sum('duration'), Count('pk'))
+    }
+    if not minutes_by_date:
+        return
+
+    to_update, to_delete = [], []
+    for row in DailyTotal.objects.select_for_update().filter(user_id=user_id, date__in=minutes_by_date):
+        row.total_minutes -= minutes_by_date[row.date]
+        # drop the row if these were the last minutes of the day
+        (to_update if row.total_minutes > 0 else to_delete).append(row)
+    DailyTotal.objects.bulk_update(to_update, ['total_minutes'])
+    DailyTotal.objects.filter(pk__in=[row.pk for row in to_delete]).delete()
+
+    to_update, to_delete = [], []
+    daily_subject_totals = DailySubjectTotal.objects.select_for_update().filter(
+        user_id=user_id,
+        subject_id__in={subject_id for subject_id, _ in totals_by_subject_and_date},
+        date__in=minutes_by_date
+    )
+    for row in daily_subject_totals:
+        if (row.subject_id, row.date) not in totals_by_subject_and_date:
+            continue
+        total_minutes, log_count = totals_by_subject_and_date[(row.subject_id, row.date)]
+        row.total_minutes = max(row.total_minutes - total_minutes, 0)
+        row.log_count -= log_count
+        # drop the row if these were the last timelogs of the day
+        (to_update if row.log_count > 0 else to_delete).append(row)
+    DailySubjectTotal.objects.bulk_update(to_update, ['total_minutes', 'log_count'])
+    DailySubjectTotal.objects.filter(pk__in=[row.pk for row in to_delete]).delete()
+
+
+def rebuild_user_rollups(user, batch_size=1000):
+    """
+    Recompute the user's daily subject totals and daily totals from the timelogs and repair the stored rows.
+    Return the number of created, updated and deleted rows.
+    """
+    timelogs = TimeLog.objects.filter(user=user).order_by()
+    with transaction.atomic():
+        subject_counts = _repair_rows(
+            DailySubjectTotal, user, ('subject_id', 'date'), ('total_minutes', 'log_count'),
+            timelogs.values_list('subject', 'date').annotate(Sum('duration'), Count('pk')),
+            batch_size
+        )
+        daily_counts = _repair_rows(
+            DailyTotal, user, ('date',), ('total_minutes',),
+            timelogs.values_list('date').annotate(Sum('duration')),
+            batch_size
+        )
+    # the charts are built from the rollups, so the cached ones are stale now
+    bump_data_version(user.pk)
+    return tuple(a + b for a, b in zip(subject_counts, daily_counts))
+
+
+def _repair_rows(model, user, key_fields, value_fields, actual_rows, batch_size):
+    """Make the user's rows of a rollup model match the actual (*keys, *values) rows"""
+    stored = {
+        tuple(getattr(row, field) for field in key_fields): row
+        for row in model.objects.select_for_update().filter(user=user)
+    }
+    to_create, to_update = [], []
+    for actual_row in actual_rows.iterator(chunk_size=batch_size):
+        key, values = actual_row[:len(key_fields)], actual_row[len(key_fields):]
+        row = stored.pop(key, None)
+        if row is None:
+            to_create.append(model(user=user, **dict(zip(key_fields + value_fields, actual_row))))
+        elif tuple(getattr(row, field) for field in value_fields) != values:
+            for field, value in zip(value_fields, values):
+                setattr(row, field, value)
+            to_update.append(row)
+
+    model.objects.bulk_create(to_create, batch_size=batch_size)
+    model.objects.bulk_update(to_update, value_fields, batch_size=batch_size)
+    # whatever is left in stored doesn't belong to any timelog anymore
+    stale_pks = [row.pk for row in stored.values()]
+    for i in range(0, len(stale_pks), batch_size):
+        model.objects.filter(pk__in=stale_pks[i:i + batch_size]).delete()
+
+    return len(to_create), len(to_update), len(stale_pks)
@@ -0,0 +1,120 @@
+"""
+Route the read-only analytics (the dashboard, the paginated lists and the exports) to read replicas.
+"""
+import asyncio
+import contextvars
+import random
+from functools import wraps
+
+from django.conf import settings
+
+
+PRIMARY_DATABASE = 'default'
+# only the timing data is read from the replicas, the sessions and the users are always read from the primary
+REPLICA_APP_LABELS = {'timing'}
+PIN_COOKIE_NAME = 'pin_primary'
+READ_ONLY_METHODS = ('GET', 'HEAD')
+
+
+
+class RequestState:
+    """How the queries of the current request are routed"""
+    def __init__(self, pinned=False):
+        # a recent request of the browser has written, so its data may not be on the replicas yet
+        self.pinned = pinned
+        self.wrote = False
+        self.read_from_replica = False
+
+
+# the asgiref adapters copy the context, so the worker threads of async views see the request's state too
+_request_state = contextvars.ContextVar('timing_request_state', default=None)
+
+
+def reads_from_replica():
+    """Whether the timing data of the current request is read from a replica"""
+    state = _request_state.get()
+    return bool(
+        state is not None and state.read_from_replica and not state.pinned and not state.wrote
+        and settings.TIMING_REPLICA_DATABASES
+    )
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None:
+            # not in a request (e.g. a management command)
+            return None
+        if reads_from_replica() and model._meta.app_label in REPLICA_APP_LABELS:
+            return random.choice(settings.TIMING_REPLICA_DATABASES)
+        # not the instance's database (of the hints), which may be a replica
+        return PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is None:
+            return None
+        # the rest of the request reads what it has written from the primary
+        state.wrote = True
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas have the same rows as the primary
+        databases = {PRIMARY_DATABASE, *settings.TIMING_REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Keep the routing state of each request and pin the browser to the primary after it writes"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(pinned=PIN_COOKIE_NAME in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote and settings.TIMING_REPLICA_DATABASES:
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1', max_age=settings.TIMING_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def _iterate_in_context(context, iterator):
+    # a streaming response is iterated after the middleware has reset the request's state
+    iterator = iter(iterator)
+    while True:
+        try:
+            chunk = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield chunk
+
+
+def read_from_replica(view):
+    """Let the GET requests of the view read the timing data from a replica (see ReplicaPinningMiddleware)"""
+    def allow_replica(request):
+        state = _request_state.get()
+        if state is not None:
+            state.read_from_replica = request.method in READ_ONLY_METHODS
+
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            allow_replica(request)
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        allow_replica(request)
+        response = view(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = _iterate_in_context(contextvars.copy_context(), response.streaming_content)
+        return response
+    return wrapper
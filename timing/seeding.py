@@ -0,0 +1,67 @@
+"""
+Synthetic users with years of timelog history for load testing (see the seed_load command).
+"""
+import datetime
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from .imports import create_timelogs
+
+
+SEED_PASSWORD = 'seedpass123'
+
+
+
+class SeedError(Exception):
+    """Raised when the users can't be seeded, e.g. one of them exists already"""
+
+
+def generate_rows(rnd, subjects_count, tags_count, years, timelogs_per_day, end_date):
+    """Yield the (date, subject name, duration, tag names, description) rows of a user, oldest first"""
+    days_count = round(years * 365)
+    # the durations of a day must fit in its 24 hours
+    max_duration = min(180, 1440 // max(timelogs_per_day, 1))
+    for day in range(days_count - 1, -1, -1):
+        date = end_date - datetime.timedelta(days=day)
+        for _ in range(timelogs_per_day):
+            tag_names = tuple(sorted({f'tag {rnd.randrange(tags_count)}' for _ in range(rnd.randint(0, 2))})) \
+                if tags_count else ()
+            yield (
+                date, f'subject {rnd.randrange(subjects_count)}', rnd.randint(10, max_duration),
+                tag_names, f'seeded record {rnd.randrange(1_000_000)}'
+            )
+
+
+def seed_users(users_count, subjects_count=20, tags_count=10, years=1, timelogs_per_day=3,
+               username_prefix='load', seed=0, end_date=None, batch_size=1000):
+    """
+    Create users_count users (username_prefix-1, username_prefix-2, ...) with SEED_PASSWORD, each with
+    up to subjects_count subjects, tags_count tags and a timelog history of the given years before end_date
+    (default: today), with bulk inserts. Return the created users.
+    """
+    if subjects_count < 1:
+        raise SeedError('The users need at least one subject.')
+    User = get_user_model()
+    usernames = [f'{username_prefix}-{number}' for number in range(1, users_count + 1)]
+    if User.objects.filter(username__in=usernames).exists():
+        raise SeedError(f'Some of the "{username_prefix}-N" users exist already, use another prefix.')
+
+    # hashing is slow on purpose, so all the users share one hash
+    password = make_password(SEED_PASSWORD)
+    users = User.objects.bulk_create(
+        [User(username=username, email=f'{username}@example.com', password=password) for username in usernames],
+        batch_size=batch_size
+    )
+    if users and users[0].pk is None:
+        # the backend doesn't return the pks of bulk inserts (e.g. MySQL)
+        users = list(User.objects.filter(username__in=usernames).order_by('pk'))
+
+    end_date = end_date or datetime.date.today()
+    for number, user in enumerate(users, start=1):
+        # each user gets its own generator, so a user's data doesn't depend on the number of users
+        rnd = random.Random(f'{seed}:{number}')
+        rows = list(generate_rows(rnd, subjects_count, tags_count, years, timelogs_per_day, end_date))
+        create_timelogs(user, rows, batch_size=batch_size)
+    return users
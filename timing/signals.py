@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import bump_data_version
+from .models import TimeLog, Subject, Tag
+
+
+
+@receiver(post_save, sender=TimeLog)
+@receiver(post_save, sender=Subject)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=TimeLog)
+@receiver(post_delete, sender=Subject)
+@receiver(post_delete, sender=Tag)
+def invalidate_user_chart_data(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=TimeLog.tags.through)
+def invalidate_user_chart_data_on_tags_change(sender, instance, action, **kwargs):
+    # instance is a timelog or a tag depending on which side of the relation is changed
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_data_version(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def initialize_user_chart_data(sender, instance, created, **kwargs):
+    # don't let a new user see any chart data that was cached for a deleted user with the same id
+    if created:
+        bump_data_version(instance.pk)
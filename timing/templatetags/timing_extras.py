@@ -1,8 +1,41 @@
 from django import template
 
+from timing.cache import get_or_render_fragment
+
 
 register = template.Library()
 
 @register.filter
 def hours_and_minutes(value):
     return f'{value // 60}h {value % 60:0>2}m'
+
+
+class UserFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        user = context['request'].user
+        if not user.is_authenticated:
+            return self.nodelist.render(context)
+        return get_or_render_fragment(
+            user.pk, self.name.resolve(context), [str(var.resolve(context)) for var in self.vary_on],
+            lambda: self.nodelist.render(context)
+        )
+
+
+@register.tag
+def user_fragment(parser, token):
+    """
+    Cache the enclosed fragment for the request's user until the user's data changes, e.g.
+        {% user_fragment 'timelogs' request.GET.urlencode %} ... {% end_user_fragment %}
+    The values after the name (e.g. the page) are also part of the key.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f'"{bits[0]}" tag needs a fragment name.')
+    nodelist = parser.parse(('end_user_fragment',))
+    parser.delete_first_token()
+    return UserFragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,81 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from timing.models import DailySubjectTotal, DailyTotal, Subject, TimeLog
+from timing.rollups import rebuild_user_rollups
+
+
+
+class TimeLogAdminTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(
+            username='admin', password='testpass123', email='admin@email.com')
+        self.subject = Subject.objects.create(user=self.user, name='coding')
+        self.today = datetime.date.today()
+        self.client.login(username='admin', password='testpass123')
+
+    def form_data(self, duration, date=None):
+        return {
+            'user': self.user.pk, 'subject': self.subject.pk, 'description': '',
+            'date': (date or self.today).isoformat(), 'duration': duration,
+        }
+
+    def assertRollupsMatchTheTimelogs(self):
+        self.assertEqual(rebuild_user_rollups(self.user), (0, 0, 0))
+
+    def test_added_changed_and_deleted_timelogs_keep_the_rollups_in_step(self):
+        response = self.client.post(reverse('admin:timing_timelog_add'), self.form_data(60))
+        self.assertEqual(response.status_code, 302)
+        timelog = TimeLog.objects.get()
+        self.assertEqual(DailyTotal.objects.get().total_minutes, 60)
+        self.assertRollupsMatchTheTimelogs()
+
+        yesterday = self.today - datetime.timedelta(days=1)
+        change_url = reverse('admin:timing_timelog_change', args=[timelog.pk])
+        self.client.post(change_url, self.form_data(90, date=yesterday))
+        self.assertEqual(list(DailyTotal.objects.values_list('date', 'total_minutes')), [(yesterday, 90)])
+        self.assertRollupsMatchTheTimelogs()
+
+        self.client.post(reverse('admin:timing_timelog_delete', args=[timelog.pk]), {'post': 'yes'})
+        self.assertFalse(TimeLog.objects.exists())
+        self.assertFalse(DailyTotal.objects.exists())
+        self.assertFalse(DailySubjectTotal.objects.exists())
+
+    def test_changed_timelog_is_checked_against_the_daily_limit(self):
+        self.client.post(reverse('admin:timing_timelog_add'), self.form_data(1000))
+        response = self.client.post(reverse('admin:timing_timelog_add'), self.form_data(500))
+        self.assertContains(response, 'Your remaind duration for')
+        # its own minutes are free for the edited timelog
+        change_url = reverse('admin:timing_timelog_change', args=[TimeLog.objects.get().pk])
+        self.assertEqual(self.client.post(change_url, self.form_data(1440)).status_code, 302)
+        self.assertEqual(DailyTotal.objects.get().total_minutes, 1440)
+
+    def test_bulk_delete_discards_the_minutes(self):
+        for duration in (30, 40):
+            self.client.post(reverse('admin:timing_timelog_add'), self.form_data(duration))
+        other_subject = Subject.objects.create(user=self.user, name='reading')
+        TimeLog.objects.create(user=self.user, subject=other_subject, date=self.today, duration=20)
+        DailyTotal.objects.update(total_minutes=90)
+        DailySubjectTotal.objects.create(
+            user=self.user, subject=other_subject, date=self.today, total_minutes=20, log_count=1)
+
+        self.client.post(reverse('admin:timing_timelog_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(TimeLog.objects.filter(subject=self.subject).values_list('pk', flat=True)),
+        })
+        self.assertEqual(DailyTotal.objects.get().total_minutes, 20)
+        self.assertRollupsMatchTheTimelogs()
+
+    def test_rollups_are_read_only(self):
+        self.client.post(reverse('admin:timing_timelog_add'), self.form_data(60))
+        daily_total = DailyTotal.objects.get()
+        self.assertEqual(self.client.get(reverse('admin:timing_dailytotal_changelist')).status_code, 200)
+        with self.assertLogs('django', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('admin:timing_dailytotal_add')).status_code, 403)
+            response = self.client.post(
+                reverse('admin:timing_dailytotal_change', args=[daily_total.pk]), {'total_minutes': 0})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(DailyTotal.objects.get().total_minutes, 60)
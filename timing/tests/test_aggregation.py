@@ -0,0 +1,145 @@
+import datetime
+import importlib.util
+from types import SimpleNamespace
+from unittest import skipUnless
+
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+
+from timing.aggregation import (
+    get_aggregation_engine, sum_durations_by_subject_and_date, sum_durations_by_subject, sum_durations_by_tag
+)
+from timing.models import TimeLog, Subject, Tag
+from timing.rollups import record_timelog
+from timing.views import create_chart_data, create_date_based_chart_data
+
+
+
+class SumDurationsBySubjectAndDateTests(SimpleTestCase):
+    def setUp(self):
+        self.today = datetime.date(2022, 5, 10)
+        self.yesterday = self.today - datetime.timedelta(days=1)
+        self.subject_1 = SimpleNamespace(pk=1, name='subject 1')
+        self.subject_2 = SimpleNamespace(pk=2, name='subject 2')
+        # (subject_id, date, minutes) rows
+        self.timelogs = [
+            (1, self.today, 30),
+            (1, self.today, 45),
+            (2, self.today, 60),
+            (1, self.yesterday, 90),
+        ]
+
+    def test_durations_are_summed_per_subject_and_date(self):
+        spent_mins_table = sum_durations_by_subject_and_date(self.timelogs)
+        self.assertEqual(dict(spent_mins_table), {
+            (1, self.today): 75,
+            (2, self.today): 60,
+            (1, self.yesterday): 90,
+        })
+
+    def test_date_based_chart_data(self):
+        """dates without any record get 0 and subjects without record on an available date get 0.0"""
+        before_yesterday = self.yesterday - datetime.timedelta(days=1)
+        chart_data = create_date_based_chart_data(
+            self.timelogs,
+            [self.subject_1, self.subject_2],
+            [before_yesterday, self.yesterday, self.today],
+            {self.yesterday, self.today}
+        )
+        self.assertEqual(
+            chart_data['labels'],
+            [before_yesterday.isoformat(), self.yesterday.isoformat(), self.today.isoformat()]
+        )
+        self.assertEqual(chart_data['datasets'][0]['data'], [0, 1.5, 1.2])
+        self.assertEqual(chart_data['datasets'][1]['data'], [0, 0.0, 1.0])
+
+
+class SumDurationsQueryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        other_user = get_user_model().objects.create_user(
+            username='otheruser', password='testpass123', email='otheruser@email.com')
+        self.subject_1 = Subject.objects.create(user=self.user, name='subject 1')
+        self.subject_2 = Subject.objects.create(user=self.user, name='subject 2')
+        self.tag_1 = Tag.objects.create(user=self.user, name='tag 1')
+        self.tag_2 = Tag.objects.create(user=self.user, name='tag 2')
+        today = datetime.date.today()
+        TimeLog.objects.create(user=self.user, subject=self.subject_1, date=today, duration=30)\
+            .tags.add(self.tag_1, self.tag_2)
+        TimeLog.objects.create(user=self.user, subject=self.subject_1, date=today, duration=45)\
+            .tags.add(self.tag_1)
+        TimeLog.objects.create(user=self.user, subject=self.subject_2, date=today, duration=60)
+        # other user's records must not be counted
+        other_subject = Subject.objects.create(user=other_user, name='subject 1')
+        other_tag = Tag.objects.create(user=other_user, name='tag 1')
+        TimeLog.objects.create(user=other_user, subject=other_subject, date=today, duration=90)\
+            .tags.add(other_tag)
+
+    def test_sum_durations_by_subject(self):
+        with self.assertNumQueries(1):
+            spent_mins_by_subject = sum_durations_by_subject(self.user.timelogs.all())
+        self.assertEqual(spent_mins_by_subject, {self.subject_1.pk: 75, self.subject_2.pk: 60})
+
+    def test_sum_durations_by_tag(self):
+        with self.assertNumQueries(1):
+            spent_mins_by_tag = sum_durations_by_tag(self.user.timelogs.all())
+        self.assertEqual(spent_mins_by_tag, {self.tag_1.pk: 75, self.tag_2.pk: 30})
+
+
+@skipUnless(importlib.util.find_spec('numpy'), 'numpy is not installed')
+class NumpyAggregationEngineTests(TestCase):
+    """The numpy engine must give the same results as the pure-Python engine"""
+    def setUp(self):
+        self.python_engine = get_aggregation_engine('python')
+        self.numpy_engine = get_aggregation_engine('numpy')
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.subject_1 = Subject.objects.create(user=self.user, name='subject 1')
+        self.subject_2 = Subject.objects.create(user=self.user, name='subject 2')
+        self.tag_1 = Tag.objects.create(user=self.user, name='tag 1')
+        self.tag_2 = Tag.objects.create(user=self.user, name='tag 2')
+        self.today = datetime.date.today()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+        for subject, date, duration, tags in (
+            (self.subject_1, self.today, 30, [self.tag_1, self.tag_2]),
+            (self.subject_1, self.today, 45, [self.tag_1]),
+            (self.subject_2, self.yesterday, 60, []),
+        ):
+            timelog = TimeLog.objects.create(user=self.user, subject=subject, date=date, duration=duration)
+            timelog.tags.add(*tags)
+            record_timelog(timelog)
+
+    def test_date_subject_matrix(self):
+        rows = list(self.user.timelogs.values_list('subject', 'date', 'duration'))
+        # a row of an unknown subject and a date out of range are ignored
+        rows += [(None, self.today, 10), (self.subject_1.pk, self.today + datetime.timedelta(days=1), 10)]
+        subject_ids = [self.subject_1.pk, self.subject_2.pk]
+        dates = [self.yesterday, self.today]
+        matrix = self.numpy_engine.date_subject_matrix(rows, subject_ids, dates)
+        self.assertEqual(matrix, [[0, 75], [60, 0]])
+        self.assertEqual(matrix, self.python_engine.date_subject_matrix(rows, subject_ids, dates))
+        self.assertEqual(self.numpy_engine.date_subject_matrix([], subject_ids, dates), [[0, 0], [0, 0]])
+
+    def test_subject_and_tag_totals(self):
+        for engine in (self.python_engine, self.numpy_engine):
+            self.assertEqual(
+                engine.subject_totals(self.user.daily_subject_totals.all()),
+                {self.subject_1.pk: 75, self.subject_2.pk: 60}
+            )
+            self.assertEqual(
+                engine.tag_totals(self.user.timelogs.all()),
+                {self.tag_1.pk: 75, self.tag_2.pk: 30}
+            )
+
+    def test_charts_are_the_same_with_both_engines(self):
+        for kind in ('date', 'subject', 'tag'):
+            self.assertEqual(
+                create_chart_data(self.user, kind, engine=self.python_engine),
+                create_chart_data(self.user, kind, engine=self.numpy_engine)
+            )
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_aggregation_engine('fortran')
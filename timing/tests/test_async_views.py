@@ -0,0 +1,61 @@
+import asyncio
+import datetime
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.test import AsyncRequestFactory, TransactionTestCase
+from django.urls import reverse
+
+from timing import async_views
+from timing.cache import CHARTS_CACHE_ALIAS
+from timing.models import Subject, TimeLog
+from timing.rollups import record_timelog
+
+
+
+class AsyncHomeViewTests(TransactionTestCase):
+    """The reads run in worker threads with their own connections, so the data must be committed"""
+    def setUp(self):
+        caches[CHARTS_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        subject = Subject.objects.create(user=self.user, name='coding')
+        record_timelog(TimeLog.objects.create(
+            user=self.user, subject=subject, date=datetime.date.today(), duration=90, description='async record'))
+
+    def get(self, user, path='/home/'):
+        request = AsyncRequestFactory().get(path)
+        request.user = user
+        return asyncio.run(async_views.home(request))
+
+    def test_home_leaves_the_charts_to_the_api(self):
+        response = self.get(self.user, '/home/?bucket=week')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('async record', content)
+        for kind in ('date', 'subject', 'tag'):
+            self.assertIn(f'data-url="{reverse("timing:chart-data-api", kwargs={"kind": kind})}?bucket=week"', content)
+        self.assertNotIn('application/json', content)
+
+    def test_anonymous_user_is_redirected_to_login(self):
+        response = self.get(AnonymousUser())
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/accounts/login/?next=/home/', response['Location'])
+
+    def test_reads_run_concurrently(self):
+        # each read waits until the other has started, which can't happen if they run one after another
+        barrier = threading.Barrier(2, timeout=5)
+
+        def concurrently(func):
+            def wrapper(*args):
+                barrier.wait()
+                return func(*args)
+            return wrapper
+
+        with mock.patch.object(async_views, 'get_user_date_bounds', concurrently(async_views.get_user_date_bounds)), \
+                mock.patch.object(async_views, 'get_recent_timelogs', concurrently(async_views.get_recent_timelogs)):
+            response = self.get(self.user)
+        self.assertEqual(response.status_code, 200)
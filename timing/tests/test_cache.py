@@ -0,0 +1,110 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from timing.cache import bump_data_version, fragment_cache_stats, get_or_create_chart_data
+from timing.models import Subject, Tag, TimeLog
+from timing.views import create_color
+
+
+
+class ChartDataCacheTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+
+    def test_chart_data_is_created_once_for_each_version(self):
+        create_chart_data = mock.Mock(return_value={'labels': []})
+        for _ in range(3):
+            chart_data = get_or_create_chart_data(self.user.pk, ('home', None, None), create_chart_data)
+        self.assertEqual(chart_data, {'labels': []})
+        self.assertEqual(create_chart_data.call_count, 1)
+        # another date range has its own entry
+        get_or_create_chart_data(self.user.pk, ('home', '2022-01-01', '2022-02-01'), create_chart_data)
+        self.assertEqual(create_chart_data.call_count, 2)
+
+        bump_data_version(self.user.pk)
+        get_or_create_chart_data(self.user.pk, ('home', None, None), create_chart_data)
+        self.assertEqual(create_chart_data.call_count, 3)
+
+    def test_user_data_changes_invalidate_chart_data(self):
+        create_chart_data = mock.Mock(return_value={})
+        subject = Subject.objects.create(user=self.user, name='subject')
+        get_or_create_chart_data(self.user.pk, ('home',), create_chart_data)
+        timelog = TimeLog.objects.create(user=self.user, subject=subject, date=datetime.date.today(), duration=60)
+        get_or_create_chart_data(self.user.pk, ('home',), create_chart_data)
+        timelog.tags.add(Tag.objects.create(user=self.user, name='tag'))
+        get_or_create_chart_data(self.user.pk, ('home',), create_chart_data)
+        timelog.delete()
+        get_or_create_chart_data(self.user.pk, ('home',), create_chart_data)
+        self.assertEqual(create_chart_data.call_count, 4)
+
+    def test_chart_data_api_reuses_cached_chart_data(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('timing:chart-data-api', kwargs={'kind': 'subject'})
+        first_response = self.client.get(url)
+        with mock.patch('timing.views.create_chart_data') as create_chart_data:
+            second_response = self.client.get(url)
+        create_chart_data.assert_not_called()
+        self.assertEqual(first_response.content, second_response.content)
+
+    def test_colors_are_deterministic(self):
+        subject = Subject.objects.create(user=self.user, name='subject')
+        self.assertEqual(create_color(subject.pk), create_color(subject.pk))
+        self.assertRegex(create_color(subject.pk), r'^rgb\(\d{1,3},\d{1,3},\d{1,3}\)$')
+
+
+
+class UserFragmentCacheTests(TestCase):
+    def setUp(self):
+        fragment_cache_stats.reset()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.subject = Subject.objects.create(user=self.user, name='coding')
+        TimeLog.objects.create(
+            user=self.user, subject=self.subject, date=datetime.date.today(), duration=90, description='first')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_rows_are_rendered_once_until_the_data_changes(self):
+        url = reverse('timing:timelogs')
+        self.assertContains(self.client.get(url), '1h 30m')
+        self.assertContains(self.client.get(url), '1h 30m')
+        stats = fragment_cache_stats.as_dict()['timelogs']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertGreater(stats['saved_ms'], 0)
+
+        TimeLog.objects.create(
+            user=self.user, subject=self.subject, date=datetime.date.today(), duration=30, description='second')
+        self.assertContains(self.client.get(url), 'second')
+        self.subject.name = 'renamed'
+        self.subject.save()
+        self.assertContains(self.client.get(url), 'renamed')
+        self.assertEqual(fragment_cache_stats.as_dict()['timelogs']['misses'], 3)
+
+    def test_pages_and_users_have_their_own_fragments(self):
+        self.client.get(reverse('timing:subjects'))
+        self.client.get(reverse('timing:subjects'), {'page': 1})
+        self.assertEqual(fragment_cache_stats.as_dict()['subjects']['misses'], 2)
+
+        other_user = get_user_model().objects.create_user(
+            username='otheruser', password='testpass123', email='otheruser@email.com')
+        self.client.force_login(other_user)
+        self.assertNotContains(self.client.get(reverse('timing:subjects')), 'coding')
+
+    def test_recent_timelogs_are_not_queried_on_a_hit(self):
+        self.client.get(reverse('timing:home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('timing:home'))
+        self.assertContains(response, 'first')
+        self.assertEqual(fragment_cache_stats.as_dict()['recent_timelogs']['hits'], 1)
+
+    def test_stats_api_is_for_staff_only(self):
+        url = reverse('timing:fragment-cache-stats-api')
+        self.client.get(reverse('timing:tags'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(url).json()['fragments']['tags']['misses'], 1)
@@ -0,0 +1,121 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from timing.deletion import delete_subject, delete_user
+from timing.jobs import claim_jobs, run_job
+from timing.models import DailySubjectTotal, DailyTotal, Job, Subject, Tag, TimeLog
+from timing.rollups import rebuild_user_rollups, record_timelogs
+
+
+
+def run_next_job():
+    job, = claim_jobs('test-worker')
+    run_job(job)
+    job.refresh_from_db()
+    return job.result
+
+
+class DeletionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.subject = Subject.objects.create(user=self.user, name='heavy subject')
+        self.other_subject = Subject.objects.create(user=self.user, name='other subject')
+        self.tag = Tag.objects.create(user=self.user, name='tag 1')
+        self.today = datetime.date.today()
+
+    def create_timelogs(self, user, subject, count, duration=10):
+        timelogs = TimeLog.objects.bulk_create(
+            TimeLog(user=user, subject=subject, duration=duration,
+                    date=self.today - datetime.timedelta(days=i % 3))
+            for i in range(count)
+        )
+        record_timelogs(user, timelogs)
+        tag, _ = Tag.objects.get_or_create(user=user, name='tag 1')
+        TimeLog.tags.through.objects.bulk_create(
+            TimeLog.tags.through(timelog_id=timelog.pk, tag_id=tag.pk) for timelog in timelogs
+        )
+        return timelogs
+
+    def test_delete_subject_in_chunks_removes_its_minutes_from_the_rollups(self):
+        self.create_timelogs(self.user, self.subject, 5)
+        self.create_timelogs(self.user, self.other_subject, 2, duration=30)
+        progress = []
+
+        # the timelogs are never loaded, only their ids
+        with mock.patch.object(TimeLog, 'from_db') as from_db:
+            deleted = delete_subject(self.subject, chunk_size=2, progress=progress.append)
+        from_db.assert_not_called()
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertFalse(Subject.objects.filter(pk=self.subject.pk).exists())
+        self.assertEqual(TimeLog.objects.count(), 2)
+        self.assertEqual(TimeLog.tags.through.objects.count(), 2)
+        self.assertTrue(Tag.objects.filter(pk=self.tag.pk).exists())
+        # the daily totals lost the subject's minutes and match the remaining timelogs
+        self.assertEqual(sorted(DailyTotal.objects.values_list('total_minutes', flat=True)), [30, 30])
+        self.assertEqual(set(DailySubjectTotal.objects.values_list('subject', flat=True)), {self.other_subject.pk})
+        self.assertEqual(rebuild_user_rollups(self.user), (0, 0, 0))
+
+    def test_delete_user_with_all_of_its_data(self):
+        other_user = get_user_model().objects.create_user(username='otheruser', password='testpass123')
+        other_subject = Subject.objects.create(user=other_user, name='heavy subject')
+        self.create_timelogs(self.user, self.subject, 5)
+        self.create_timelogs(other_user, other_subject, 3)
+
+        self.assertEqual(delete_user(self.user, chunk_size=2), 5)
+
+        self.assertFalse(get_user_model().objects.filter(pk=self.user.pk).exists())
+        for model in (TimeLog, Subject, Tag, DailyTotal, DailySubjectTotal):
+            self.assertFalse(model.objects.filter(user_id=self.user.pk).exists())
+        self.assertEqual(TimeLog.objects.filter(user=other_user).count(), 3)
+        self.assertFalse(TimeLog.tags.through.objects.exclude(timelog__user=other_user).exists())
+        self.assertEqual(rebuild_user_rollups(other_user), (0, 0, 0))
+
+    def test_delete_users_command(self):
+        self.create_timelogs(self.user, self.subject, 3)
+        out = StringIO()
+        call_command('delete_users', 'testuser', '--chunk-size', '2', stdout=out)
+        self.assertIn('testuser: 2/3 timelogs deleted', out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class SubjectDeleteViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.subject = Subject.objects.create(user=self.user, name='heavy subject')
+        timelogs = TimeLog.objects.bulk_create(
+            TimeLog(user=self.user, subject=self.subject, duration=10) for _ in range(3)
+        )
+        record_timelogs(self.user, timelogs)
+        self.client.login(username='testuser', password='testpass123')
+        self.page_url = reverse('timing:subject-delete', kwargs={'pk': self.subject.pk})
+
+    def test_small_subject_is_deleted_at_once(self):
+        response = self.client.post(self.page_url)
+        self.assertRedirects(response, reverse('timing:subjects'))
+        self.assertFalse(TimeLog.objects.exists())
+        self.assertFalse(DailyTotal.objects.exists())
+
+    @mock.patch('timing.views.BACKGROUND_DELETION_THRESHOLD', 2)
+    def test_large_subject_is_deleted_by_a_job(self):
+        response = self.client.post(self.page_url)
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('timing:job-detail', kwargs={'pk': job.pk}))
+        self.assertEqual((job.name, job.user, job.label, job.total), ('delete_subject', self.user, 'Subject "heavy subject"', 3))
+        self.assertTrue(Subject.objects.exists())
+
+        self.assertEqual(run_next_job(), 3)
+        self.assertFalse(Subject.objects.exists())
+        self.assertFalse(DailyTotal.objects.exists())
+        response = self.client.get(reverse('timing:job-detail', kwargs={'pk': job.pk}), follow=True)
+        self.assertRedirects(response, reverse('timing:subjects'))
+        self.assertContains(response, 'Subject &quot;heavy subject&quot; successfully deleted!')
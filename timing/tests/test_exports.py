@@ -0,0 +1,84 @@
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from timing.exports import iter_timelog_records
+from timing.imports import import_timelogs, read_ndjson_records
+from timing.models import Subject, Tag, TimeLog
+
+
+
+class ExportTimeLogsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        other_user = get_user_model().objects.create_user(
+            username='otheruser', password='testpass123', email='otheruser@email.com')
+        self.today = datetime.date.today()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+        subject = Subject.objects.create(user=self.user, name='coding')
+        tags = [Tag.objects.create(user=self.user, name=name) for name in ('happy', 'focused')]
+        timelog = TimeLog.objects.create(
+            user=self.user, subject=subject, date=self.today, duration=90, description='a, "quoted" one')
+        timelog.tags.set(tags)
+        TimeLog.objects.create(user=self.user, subject=subject, date=self.yesterday, duration=30)
+        TimeLog.objects.create(
+            user=other_user, subject=Subject.objects.create(user=other_user, name='other'),
+            date=self.today, duration=10)
+        self.client.login(username='testuser', password='testpass123')
+
+    def export(self, file_format):
+        response = self.client.get(reverse('timing:timelogs-export', kwargs={'file_format': file_format}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        response, content = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="timelogs-', response['Content-Disposition'])
+        self.assertEqual(content.splitlines(), [
+            'date,subject,duration,tags,description',
+            f'{self.yesterday},coding,30,,',
+            f'{self.today},coding,90,focused;happy,"a, ""quoted"" one"',
+        ])
+
+    def test_ndjson_export_can_be_imported(self):
+        response, content = self.export('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(records[1], {
+            'date': self.today.isoformat(), 'subject': 'coding', 'duration': 90,
+            'tags': ['focused', 'happy'], 'description': 'a, "quoted" one',
+        })
+        new_user = get_user_model().objects.create_user(
+            username='newuser', password='testpass123', email='newuser@email.com')
+        self.assertEqual(import_timelogs(new_user, read_ndjson_records(StringIO(content))), (2, 1, 2))
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('timing:timelogs-export', kwargs={'file_format': 'xml'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_tags_are_read_once_per_chunk(self):
+        # one query for the timelogs and one for the tags of each chunk (and a last, empty chunk), not one per row
+        with self.assertNumQueries(5):
+            chunks = list(iter_timelog_records(self.user, chunk_size=1))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1])
+
+    def test_chunks_continue_after_the_previous_row(self):
+        subject = Subject.objects.get(name='coding')
+        # the same date and last modified time, only their ids tell them apart
+        timelogs = TimeLog.objects.bulk_create(
+            TimeLog(user=self.user, subject=subject, date=self.yesterday, duration=minutes) for minutes in (1, 2, 3)
+        )
+        TimeLog.objects.filter(pk__in=[timelog.pk for timelog in timelogs]).update(
+            last_modified=TimeLog.objects.get(duration=30).last_modified)
+        chunks = list(iter_timelog_records(self.user, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        durations = [duration for chunk in chunks for _, _, duration, _, _ in chunk]
+        self.assertEqual(sorted(durations[:4]), [1, 2, 3, 30])
+        self.assertEqual(durations[4], 90)
@@ -2,9 +2,11 @@ from datetime import date
 
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 
 from timing.forms import DateForm, TimeLogForm, SubjectForm, TagForm
 from timing.models import Subject, Tag, TimeLog
+from timing.rollups import record_timelog
 
 
 class DateFormTests(TestCase):
@@ -79,6 +81,13 @@ class TimeLogFormTests(TestCase):
         form = TimeLogForm(data=form_data, registrant_user=self.user_1)
         self.assertTrue(form.is_valid())
 
+    def test_widgets_render_only_the_selected_options(self):
+        form = TimeLogForm(data={'subject': self.subject_1.pk, 'tags': [self.tag_1.pk]}, registrant_user=self.user_1)
+        self.assertIn(f'<option value="{self.subject_1.pk}" selected>subject 1</option>', str(form['subject']))
+        tags_html = str(form['tags'])
+        self.assertIn('tag 1', tags_html)
+        self.assertNotIn('tag 2', tags_html)
+
     def test_fill_out_form_with_wrong_subject_is_not_valid(self):
         form_data = {
             'subject': self.baduser_subject,
@@ -139,11 +148,11 @@ class TimeLogFormTests(TestCase):
     def test_exceed_remind_duration_of_one_date_is_not_valid(self):
         # create and save one timelog
         today = date.today()
-        TimeLog.objects.create(
+        record_timelog(TimeLog.objects.create(
             user=self.user_1,
             subject=self.subject_1,
             duration=12*60, # 12 hours
-            date=today)
+            date=today))
         # create form for today's date with 12 hours and 1 minutes duration
         form_data = {
             'subject': self.subject_1,
@@ -162,11 +171,11 @@ class TimeLogFormTests(TestCase):
     def test_exceed_duration_of_one_date_with_no_reminder_is_not_valid(self):
         # create and save one timelog
         today = date.today()
-        TimeLog.objects.create(
+        record_timelog(TimeLog.objects.create(
             user=self.user_1,
             subject=self.subject_1,
             duration=24*60, # 24 hours
-            date=today)
+            date=today))
         # create form for today's date with 1 hours and 1 minutes duration
         form_data = {
             'subject': self.subject_1,
@@ -206,6 +215,15 @@ class SubjectFormTests(TestCase):
             form.non_field_errors()
         )
 
+    def test_repeated_subject_name_is_checked_case_insensitively(self):
+        form = SubjectForm(data={'name': 'Subject 1'}, user_subjects=self.test_user.subject_set.all())
+        self.assertFalse(form.is_valid())
+        self.assertIn('subject 1 already exists.', form.non_field_errors())
+
+    def test_database_rejects_repeated_subject_name_in_other_case(self):
+        with self.assertRaises(IntegrityError):
+            Subject.objects.create(user=self.test_user, name='SUBJECT 1')
+
 
 class TagFormTests(TestCase):
     def setUp(self):
@@ -226,4 +244,13 @@ class TagFormTests(TestCase):
         self.assertIn(
             'tag 1 already exists.',
             form.non_field_errors()
-        )
\ No newline at end of file
+        )
+
+    def test_repeated_tag_name_is_checked_case_insensitively(self):
+        form = TagForm(data={'name': 'TAG 1'}, user_tags=self.test_user.tag_set.all())
+        self.assertFalse(form.is_valid())
+        self.assertIn('tag 1 already exists.', form.non_field_errors())
+
+    def test_database_rejects_repeated_tag_name_in_other_case(self):
+        with self.assertRaises(IntegrityError):
+            Tag.objects.create(user=self.test_user, name='Tag 1')
@@ -0,0 +1,100 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from timing.imports import TimeLogImportError, import_timelogs, read_csv_records, read_ndjson_records
+from timing.models import DailySubjectTotal, DailyTotal, Subject, Tag, TimeLog
+from timing.rollups import record_timelog
+
+
+
+class ImportTimeLogsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.today = datetime.date.today()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+
+    def csv_lines(self, *rows):
+        return StringIO('date,subject,duration,tags,description\n' + ''.join(f'{row}\n' for row in rows))
+
+    def test_import_csv_records(self):
+        Subject.objects.create(user=self.user, name='coding')
+        lines = self.csv_lines(
+            f'{self.today},Coding,90,focused;happy,some description',
+            f'{self.today},reading,30,focused,',
+            f'{self.yesterday},reading,45,,',
+        )
+        self.assertEqual(import_timelogs(self.user, read_csv_records(lines)), (3, 1, 2))
+
+        self.assertEqual(self.user.subject_set.count(), 2)
+        self.assertEqual(set(self.user.tag_set.values_list('name', flat=True)), {'focused', 'happy'})
+        coding = TimeLog.objects.get(user=self.user, subject__name='coding')
+        self.assertEqual(set(coding.tags.values_list('name', flat=True)), {'focused', 'happy'})
+        self.assertEqual(coding.description, 'some description')
+        # the rollups are updated too
+        self.assertEqual(DailyTotal.objects.get(user=self.user, date=self.today).total_minutes, 120)
+        self.assertEqual(
+            DailySubjectTotal.objects.get(user=self.user, subject__name='reading', date=self.yesterday).total_minutes,
+            45
+        )
+
+    def test_import_ndjson_records(self):
+        lines = StringIO('\n'.join(json.dumps(record) for record in [
+            {'date': self.today.isoformat(), 'subject': 'coding', 'duration': 60, 'tags': ['focused']},
+            {'date': self.today.isoformat(), 'subject': 'coding', 'duration': 30},
+        ]))
+        self.assertEqual(import_timelogs(self.user, read_ndjson_records(lines)), (2, 1, 1))
+        daily_total = DailySubjectTotal.objects.get(user=self.user, date=self.today)
+        self.assertEqual((daily_total.total_minutes, daily_total.log_count), (90, 2))
+
+    def test_daily_limit_is_checked_for_all_records_together(self):
+        subject = Subject.objects.create(user=self.user, name='coding')
+        record_timelog(TimeLog.objects.create(user=self.user, subject=subject, date=self.today, duration=600))
+        lines = self.csv_lines(
+            f'{self.yesterday},coding,1000,,',
+            f'{self.today},coding,500,,',
+            f'{self.today},coding,400,,',
+        )
+        with self.assertRaisesMessage(TimeLogImportError, f'The records of {self.today} are more than its remaining 840 minutes.'):
+            import_timelogs(self.user, read_csv_records(lines))
+        # nothing is imported
+        self.assertEqual(TimeLog.objects.count(), 1)
+        self.assertEqual(list(DailyTotal.objects.values_list('date', 'total_minutes')), [(self.today, 600)])
+
+    def test_invalid_record(self):
+        lines = self.csv_lines(f'{self.today},coding,30,,', f'{self.today},coding,0,,')
+        with self.assertRaisesMessage(TimeLogImportError, 'Record 2: the duration must be between 1 and 1440 minutes'):
+            import_timelogs(self.user, read_csv_records(lines))
+        self.assertFalse(Subject.objects.exists())
+
+    def test_number_of_queries_does_not_grow_with_records(self):
+        lines = self.csv_lines(*(
+            f'{self.today - datetime.timedelta(days=day)},subject {day % 5},60,tag {day % 3},'
+            for day in range(200)
+        ))
+        with self.assertNumQueries(16):
+            import_timelogs(self.user, read_csv_records(lines))
+        self.assertEqual(TimeLog.objects.count(), 200)
+        self.assertEqual(TimeLog.tags.through.objects.count(), 200)
+
+    def test_import_timelogs_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'timelogs.ndjson')
+            with open(path, 'w') as file:
+                file.write(json.dumps({'date': self.today.isoformat(), 'subject': 'coding', 'duration': 60}))
+            out = StringIO()
+            call_command('import_timelogs', 'testuser', path, stdout=out)
+        self.assertIn('1 timelog(s) imported, 1 subject(s) and 0 tag(s) created.', out.getvalue())
+        self.assertTrue(TimeLog.objects.filter(user=self.user, duration=60).exists())
+
+    def test_import_timelogs_command_with_unknown_user(self):
+        with self.assertRaisesMessage(CommandError, 'User "nobody" does not exist.'):
+            call_command('import_timelogs', 'nobody', 'timelogs.csv')
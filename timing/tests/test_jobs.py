@@ -0,0 +1,157 @@
+import datetime
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from timing import jobs
+from timing.cache import CHARTS_CACHE_ALIAS
+from timing.models import Job, Subject, TimeLog
+
+
+
+def flaky_job(progress, fail_times):
+    progress(1, total=2)
+    if Job.objects.get(name='flaky').attempts <= fail_times:
+        raise RuntimeError('not yet')
+    progress(2)
+    return {'answer': 42}
+
+
+@mock.patch.dict(jobs._registry, {'flaky': flaky_job})
+class JobsTests(TestCase):
+    def run_next(self, worker_id='worker-1'):
+        job, = jobs.claim_jobs(worker_id)
+        jobs.run_job(job)
+        job.refresh_from_db()
+        return job
+
+    def test_unknown_jobs_cannot_be_queued(self):
+        with self.assertRaises(jobs.UnknownJob):
+            jobs.enqueue('unknown')
+
+    def test_job_is_claimed_by_one_worker(self):
+        job = jobs.enqueue('flaky', fail_times=0)
+        self.assertEqual(jobs.claim_jobs('worker-1', limit=2), [job])
+        self.assertEqual(jobs.claim_jobs('worker-2'), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.RUNNING, 1, 'worker-1'))
+
+    def test_successful_job_saves_its_result_and_progress(self):
+        jobs.enqueue('flaky', fail_times=0)
+        job = self.run_next()
+        self.assertEqual((job.status, job.result, job.progress, job.total), (Job.DONE, {'answer': 42}, 2, 2))
+        self.assertIsNotNone(job.finished)
+
+    def test_failed_job_is_retried_later_until_its_attempts_are_used_up(self):
+        jobs.enqueue('flaky', max_attempts=2, fail_times=5)
+        with self.assertLogs('timing.jobs', 'ERROR'):
+            job = self.run_next()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.QUEUED, 1, ''))
+        self.assertIn('RuntimeError: not yet', job.error)
+        self.assertGreater(job.run_after, timezone.now())
+        # it isn't due yet
+        self.assertEqual(jobs.claim_jobs('worker-1'), [])
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('timing.jobs', 'ERROR'):
+            job = self.run_next()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_retry_can_succeed(self):
+        jobs.enqueue('flaky', fail_times=1)
+        with self.assertLogs('timing.jobs', 'ERROR'):
+            self.run_next()
+        Job.objects.update(run_after=timezone.now())
+        job = self.run_next()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.DONE, 2, ''))
+
+    def test_jobs_of_stopped_workers_are_queued_again(self):
+        jobs.enqueue('flaky', fail_times=0)
+        jobs.enqueue('flaky', fail_times=0, max_attempts=1)
+        jobs.claim_jobs('worker-1', limit=2)
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+
+        Job.objects.update(locked_at=timezone.now() - datetime.timedelta(seconds=jobs.STALE_JOB_SECONDS + 1))
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        self.assertEqual(
+            sorted(Job.objects.values_list('max_attempts', 'status')),
+            [(1, Job.FAILED), (3, Job.QUEUED)]
+        )
+
+
+class JobViewsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.other_user = get_user_model().objects.create_user(username='otheruser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_job_progress(self):
+        job = Job.objects.create(user=self.user, name='delete_subject', label='Subject "big"', total=10)
+        response = self.client.get(reverse('timing:job-detail', kwargs={'pk': job.pk}))
+        self.assertContains(response, 'Waiting to start')
+
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, progress=4, attempts=1)
+        response = self.client.get(reverse('timing:job-detail', kwargs={'pk': job.pk}))
+        self.assertContains(response, '4 of 10 records deleted')
+        response = self.client.get(reverse('timing:job-api', kwargs={'pk': job.pk}))
+        self.assertEqual(response.json(), {'status': 'running', 'progress': 4, 'total': 10, 'attempts': 1})
+
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED)
+        response = self.client.get(reverse('timing:job-detail', kwargs={'pk': job.pk}))
+        self.assertContains(response, 'It has failed')
+
+    def test_other_users_cannot_see_the_job(self):
+        job = Job.objects.create(user=self.other_user, name='delete_subject', label='Subject "theirs"')
+        response = self.client.get(reverse('timing:job-detail', kwargs={'pk': job.pk}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('timing:job-api', kwargs={'pk': job.pk}))
+        self.assertEqual(response.status_code, 404)
+
+
+class RunWorkerCommandTests(TransactionTestCase):
+    def setUp(self):
+        # the worker needs a charts cache that the web server shares
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}
+        shared_caches = override_settings(CACHES={**settings.CACHES, CHARTS_CACHE_ALIAS: shared_cache})
+        shared_caches.enable()
+        self.addCleanup(shared_caches.disable)
+
+    def test_worker_runs_the_queued_jobs(self):
+        user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        for number in range(3):
+            subject = Subject.objects.create(user=user, name=f'subject {number}')
+            TimeLog.objects.create(user=user, subject=subject, duration=10)
+            jobs.enqueue('delete_subject', user=user, subject_id=str(subject.pk))
+        jobs.enqueue('rebuild_rollups', user_id=user.pk)
+
+        out = StringIO()
+        # one thread, the in-memory test database locks whole tables
+        call_command('run_worker', '--threads', '1', '--burst', '--poll-interval', '0.01', stdout=out)
+
+        self.assertIn('4 job(s) run', out.getvalue())
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 4)
+        self.assertFalse(Subject.objects.exists())
+
+    def test_worker_refuses_a_per_process_charts_cache(self):
+        local_cache = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        with override_settings(CACHES={**settings.CACHES, CHARTS_CACHE_ALIAS: local_cache}):
+            with self.assertRaisesMessage(CommandError, 'DJANGO_CACHE_BACKEND'):
+                call_command('run_worker', '--burst', stdout=StringIO())
+
+    def test_commands_can_queue_their_work(self):
+        get_user_model().objects.create_user(username='testuser', password='testpass123')
+        call_command('rebuild_rollups', 'testuser', '--enqueue', stdout=StringIO())
+        call_command('delete_users', 'testuser', '--enqueue', stdout=StringIO())
+        self.assertEqual(sorted(Job.objects.values_list('name', 'status')), [
+            ('delete_user', Job.QUEUED), ('rebuild_rollups', Job.QUEUED),
+        ])
@@ -0,0 +1,138 @@
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from timing import metrics
+
+
+
+def parse_samples(content):
+    """Return the {'name{labels}': value} samples of a Prometheus text"""
+    return {
+        line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+        for line in content.splitlines() if line and not line.startswith('#')
+    }
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        get_user_model().objects.create_user(username='testuser', password='testpass123', email='testuser@email.com')
+        self.client.login(username='testuser', password='testpass123')
+
+    def get_samples(self):
+        response = self.client.get(reverse('timing:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return parse_samples(response.content.decode())
+
+    def test_requests_are_measured_by_url_name(self):
+        before = self.get_samples()
+        self.client.get(reverse('timing:home'))
+        self.client.get(reverse('timing:home'))
+        self.client.get(reverse('timing:tags'))
+        after = self.get_samples()
+
+        def delta(sample):
+            return after.get(sample, 0) - before.get(sample, 0)
+
+        self.assertEqual(delta('wayd_http_request_duration_seconds_count{view="timing:home"}'), 2)
+        self.assertEqual(delta('wayd_http_request_duration_seconds_bucket{view="timing:home",le="+Inf"}'), 2)
+        self.assertEqual(delta('wayd_http_requests_total{view="timing:tags",method="GET",status="200"}'), 1)
+        self.assertGreater(delta('wayd_db_queries_per_request_sum{view="timing:home"}'), 0)
+        self.assertGreater(delta('wayd_db_query_duration_seconds_per_request_sum{view="timing:home"}'), 0)
+        self.assertGreater(delta('wayd_http_response_size_bytes_sum{view="timing:tags"}'), 1000)
+        # the buckets are cumulative
+        self.assertLessEqual(
+            after['wayd_http_request_duration_seconds_bucket{view="timing:home",le="0.005"}'],
+            after['wayd_http_request_duration_seconds_bucket{view="timing:home",le="10.0"}']
+        )
+        # the scrapes aren't measured
+        self.assertNotIn('wayd_http_request_duration_seconds_count{view="timing:metrics"}', after)
+
+    def test_only_allowed_addresses_can_read_the_metrics(self):
+        response = self.client.get(reverse('timing:metrics'), REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 403)
+
+    def test_series_of_all_threads_are_summed(self):
+        labels = (('view', 'test:threads'),)
+        thread = threading.Thread(target=metrics.increment, args=('http_requests_total', labels, 3))
+        thread.start()
+        thread.join()
+        metrics.increment('http_requests_total', labels, 2)
+        self.assertEqual(metrics.snapshot()[('http_requests_total', labels)], [5])
+
+    def test_series_of_the_ended_threads_are_merged(self):
+        labels = (('view', 'test:ended-threads'),)
+        live_series = len(metrics._live_series)
+        for _ in range(20):
+            thread = threading.Thread(target=metrics.increment, args=('http_requests_total', labels))
+            thread.start()
+            thread.join()
+        del thread
+        gc.collect()
+        self.assertEqual(len(metrics._live_series), live_series)
+        self.assertEqual(metrics.snapshot()[('http_requests_total', labels)], [20])
+
+    def add_worker(self, directory, name, rows, running):
+        with open(os.path.join(directory, f'{name}.json'), 'w', encoding='utf-8') as worker_file:
+            json.dump(rows, worker_file)
+        if running and metrics.fcntl is not None:
+            # the lock of another open file conflicts with this process' own, like another process' would
+            lock_file = open(os.path.join(directory, f'{name}.lock'), 'a')
+            self.addCleanup(lock_file.close)
+            metrics.fcntl.flock(lock_file, metrics.fcntl.LOCK_EX)
+
+    def test_metrics_of_the_other_workers_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        labels = (('view', 'test:workers'),)
+        metrics.observe('http_request_duration_seconds', labels, 0.02)
+        with override_settings(TIMING_METRICS_DIR=directory):
+            metrics.flush(force=True)
+            with open(os.path.join(directory, f'{metrics._get_process_name()}.json'), encoding='utf-8') as own_file:
+                rows = json.load(own_file)
+            # another running worker with the same metrics
+            self.add_worker(directory, '1-running', rows, running=True)
+            content = metrics.render_metrics(metrics.collect())
+        samples = parse_samples(content)
+        self.assertEqual(
+            samples['wayd_http_request_duration_seconds_count{view="test:workers"}'],
+            2 * metrics.snapshot()[('http_request_duration_seconds', labels)][-1]
+        )
+        self.assertEqual(samples['wayd_http_request_duration_seconds_bucket{view="test:workers",le="0.01"}'], 0)
+
+    @skipIf(metrics.fcntl is None, 'no file locks')
+    def test_metrics_of_the_stopped_workers_are_retired(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        labels = (('view', 'test:retired'),)
+        rows = [['http_requests_total', [list(label) for label in labels], [3]]]
+        with override_settings(TIMING_METRICS_DIR=directory):
+            metrics.flush(force=True)
+            self.add_worker(directory, '1-running', rows, running=True)
+            self.add_worker(directory, '2-stopped', rows, running=False)
+            self.add_worker(directory, '3-stopped', rows, running=False)
+            for _ in range(2):
+                self.assertEqual(metrics.collect()[('http_requests_total', labels)], [9])
+        files = set(os.listdir(directory))
+        self.assertTrue({'1-running.json', 'retired.json'} <= files)
+        self.assertFalse({'2-stopped.json', '2-stopped.lock', '3-stopped.json', '3-stopped.lock'} & files)
+        with open(os.path.join(directory, 'retired.json'), encoding='utf-8') as retired_file:
+            self.assertEqual(json.load(retired_file), [['http_requests_total', [['view', 'test:retired']], [6]]])
+
+    def test_a_reused_pid_gets_another_file(self):
+        name = metrics._get_process_name()
+        self.assertTrue(name.startswith(f'{os.getpid()}-'))
+        self.assertEqual(metrics._get_process_name(), name)
+        # e.g. a forked worker, or a container's process after a restart
+        with mock.patch.object(metrics, '_process_name', metrics._process_name), \
+                mock.patch.object(metrics.os, 'getpid', return_value=os.getpid() + 1):
+            self.assertNotIn(name, metrics._get_process_name())
@@ -0,0 +1,66 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from timing.models import Tag
+from timing.pagination import CursorPaginator
+
+
+
+class CursorPaginatorTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        for i in range(25):
+            Tag.objects.create(user=self.user, name=f'tag {i}')
+        # some rows share the same last_modified, the id breaks the ties
+        now = timezone.now()
+        for i, tag in enumerate(Tag.objects.all()):
+            Tag.objects.filter(pk=tag.pk).update(last_modified=now - datetime.timedelta(seconds=i // 3))
+        self.ordered_tags = list(Tag.objects.order_by('-last_modified', '-pk'))
+        self.paginator = CursorPaginator(self.user.tag_set.all(), per_page=10)
+
+    def test_walk_forward_and_backward(self):
+        pages = [self.paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([tag for page in pages for tag in page], self.ordered_tags)
+        self.assertFalse(pages[0].has_previous())
+
+        # go back from the last page
+        previous_page = self.paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous_page), list(pages[1]))
+        first_page = self.paginator.get_page(previous_page.previous_cursor)
+        self.assertEqual(list(first_page), list(pages[0]))
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+    def test_pages_dont_count_nor_skip_rows(self):
+        page = self.paginator.get_page()
+        with CaptureQueriesContext(connection) as queries:
+            self.paginator.get_page(page.next_cursor)
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_gives_the_first_page(self):
+        for cursor in ('invalid', 'WyJuZXh0IiwgIngiLCAieSJd', 'bm90IGpzb24'):
+            self.assertEqual(list(self.paginator.get_page(cursor)), self.ordered_tags[:10])
+
+    def test_tags_page_with_cursor(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('timing:tags'))
+        self.assertIsNone(response.context['page_range'])
+        self.assertContains(response, f'?cursor={response.context["page_obj"].next_cursor}')
+        response = self.client.get(reverse('timing:tags'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(list(response.context['page_obj']), self.ordered_tags[10:20])
+        # the numbered pages still work
+        response = self.client.get(reverse('timing:tags'), {'page': 3})
+        self.assertEqual(list(response.context['page_obj']), self.ordered_tags[20:])
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from timing.profiling import get_phases
+
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.profiles_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiles_dir)
+        settings_override = override_settings(TIMING_PROFILING_DIR=self.profiles_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com', is_staff=True)
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_staff_can_profile_a_request(self):
+        response = self.client.get(reverse('timing:home'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response['Server-Timing'], r'^db;dur=[\d.]+, render;dur=[\d.]+, python;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+        self.assertEqual(os.listdir(self.profiles_dir), [response['X-Profile-File']])
+
+        with open(os.path.join(self.profiles_dir, response['X-Profile-File']), encoding='utf-8') as profile_file:
+            profile = json.load(profile_file)
+        self.assertEqual(profile['profiles'][0]['type'], 'sampled')
+        self.assertEqual(len(profile['profiles'][0]['samples']), len(profile['profiles'][0]['weights']))
+        self.assertGreater(profile['phases']['queries'], 0)
+        self.assertEqual(set(profile['phases']), {'total_ms', 'db_ms', 'render_ms', 'python_ms', 'queries'})
+
+    def test_header_triggers_profiling(self):
+        response = self.client.get(reverse('timing:tags'), HTTP_X_PROFILE='1')
+        self.assertIn('Server-Timing', response)
+
+    def test_other_users_and_requests_are_not_profiled(self):
+        with mock.patch('timing.profiling.StackSampler') as sampler:
+            response = self.client.get(reverse('timing:tags'))
+            self.assertNotIn('Server-Timing', response)
+            self.user.is_staff = False
+            self.user.save()
+            response = self.client.get(reverse('timing:tags'), {'profile': '1'}, HTTP_X_PROFILE='1')
+            self.assertNotIn('Server-Timing', response)
+        sampler.assert_not_called()
+        self.assertEqual(os.listdir(self.profiles_dir), [])
+
+
+class PhasesTests(TestCase):
+    def test_render_is_estimated_from_the_samples(self):
+        python_frame = ('view', os.path.join('timing', 'views.py'), 1)
+        render_frame = ('render', os.path.join('django', 'template', 'base.py'), 1)
+        db_frame = ('execute', os.path.join('django', 'db', 'backends', 'utils.py'), 1)
+        samples = [
+            ([python_frame], 0.2),
+            ([python_frame, render_frame], 0.1),
+            # a query of a lazy queryset while rendering is database time
+            ([python_frame, render_frame, db_frame], 0.1),
+            ([python_frame, db_frame], 0.1),
+        ]
+        self.assertEqual(get_phases(samples, total_seconds=1, db_seconds=0.4), {
+            'total_ms': 1000, 'db_ms': 400, 'render_ms': 200, 'python_ms': 400,
+        })
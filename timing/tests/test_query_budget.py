@@ -0,0 +1,111 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from timing import metrics
+from timing.models import Subject, Tag, TimeLog
+from timing.query_budget import QueryBudgetExceeded, get_query_shape, query_budget
+
+
+
+@override_settings(TIMING_QUERY_BUDGET_MODE='raise')
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        subject = Subject.objects.create(user=self.user, name='coding')
+        tag = Tag.objects.create(user=self.user, name='focused')
+        for day in range(5):
+            timelog = TimeLog.objects.create(
+                user=self.user, subject=subject, date=datetime.date.today() - datetime.timedelta(days=day), duration=30)
+            timelog.tags.add(tag)
+
+    def test_too_many_queries_break_the_budget(self):
+        with query_budget(2):
+            list(TimeLog.objects.all())
+            list(Subject.objects.all())
+        with self.assertRaisesMessage(QueryBudgetExceeded, '3 queries, the budget is 2'):
+            with query_budget(2):
+                list(TimeLog.objects.all())
+                list(Subject.objects.all())
+                list(Tag.objects.all())
+
+    def test_repeated_queries_break_the_budget(self):
+        with query_budget(10):
+            [list(timelog.tags.all()) for timelog in TimeLog.objects.prefetch_related('tags')]
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'the same query ran 5 times (N+1?)'):
+            with query_budget(10):
+                [list(timelog.tags.all()) for timelog in TimeLog.objects.all()]
+
+    def test_decorated_functions_count_each_call(self):
+        @query_budget(1)
+        def read_timelogs(with_subjects=False):
+            list(TimeLog.objects.all())
+            if with_subjects:
+                list(Subject.objects.all())
+
+        read_timelogs()
+        read_timelogs()
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'test_decorated_functions_count_each_call.<locals>.read_timelogs'):
+            read_timelogs(with_subjects=True)
+
+    def test_batches_of_a_bulk_write_count_once(self):
+        with query_budget(2) as budget:
+            subjects = Subject.objects.bulk_create(
+                Subject(user=self.user, name=f'subject {number}') for number in range(1000))
+            for subject in subjects:
+                subject.description = 'bulk'
+            Subject.objects.bulk_update(subjects, ['description'], batch_size=100)
+        self.assertEqual(budget.count, 2)
+        self.assertEqual(Subject.objects.filter(description='bulk').count(), 1000)
+
+    def test_streamed_chunks_have_their_own_budget(self):
+        @query_budget(0, max_queries_per_chunk=1)
+        def stream_view(queries_per_chunk):
+            def chunks():
+                for _ in range(3):
+                    yield ''.join(str(TimeLog.objects.count()) for _ in range(queries_per_chunk))
+            return StreamingHttpResponse(chunks())
+
+        # nothing has run yet
+        response = stream_view(queries_per_chunk=1)
+        self.assertEqual(len(list(response.streaming_content)), 3)
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'stream_view (streamed chunk): 2 queries, the budget is 1'):
+            list(stream_view(queries_per_chunk=2).streaming_content)
+
+    @override_settings(TIMING_QUERY_BUDGET_MODE='warn')
+    def test_broken_budget_is_logged_and_counted_in_production(self):
+        labels = (('budget', 'warned block'), ('reason', 'budget'))
+        before = metrics.snapshot().get(('query_budget_exceeded_total', labels), [0])[0]
+        with self.assertLogs('timing.query_budget', 'WARNING') as logs:
+            with query_budget(0, name='warned block'):
+                list(TimeLog.objects.all())
+        self.assertIn('warned block: 1 queries, the budget is 0', logs.output[0])
+        self.assertEqual(metrics.snapshot()[('query_budget_exceeded_total', labels)], [before + 1])
+
+    def test_query_shapes_ignore_the_values_and_the_rows(self):
+        self.assertEqual(
+            get_query_shape('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 10'),
+            get_query_shape('SELECT * FROM t WHERE id IN (%s) LIMIT 20')
+        )
+        self.assertEqual(
+            get_query_shape('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'),
+            get_query_shape('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)')
+        )
+        self.assertEqual(
+            get_query_shape('INSERT INTO t (a, b) SELECT %s, %s UNION ALL SELECT %s, %s UNION ALL SELECT %s, %s'),
+            get_query_shape('INSERT INTO t (a, b) SELECT %s, %s UNION ALL SELECT %s, %s')
+        )
+
+
+@override_settings(TIMING_QUERY_BUDGET_MODE='raise')
+class CommittedWritesTests(TransactionTestCase):
+    def test_broken_budget_after_committed_writes_is_only_logged(self):
+        user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        with self.assertLogs('timing.query_budget', 'ERROR') as logs:
+            with query_budget(0, name='committed block'):
+                Subject.objects.create(user=user, name='coding')
+        self.assertIn('committed block: 1 queries, the budget is 0 (not raised, the writes are committed)', logs.output[0])
+        self.assertTrue(Subject.objects.exists())
@@ -0,0 +1,130 @@
+import re
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from timing.forms import SubjectForm, TagForm, TimeLogForm
+from timing.models import Subject, Tag, TimeLog
+from timing.rollups import record_timelog
+
+
+# the tables of the hot queries, a full scan of any of them is a regression
+HOT_TABLES = (
+    'timing_timelog', 'timing_subject', 'timing_tag', 'timing_timelog_tags',
+    'timing_dailysubjecttotal', 'timing_dailytotal',
+)
+
+
+def explain(sql, params=()):
+    """Return the query plan of a query as a list of lines"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN FORMAT=JSON {sql}', params)
+        return [cursor.fetchone()[0]]
+
+
+def full_scans(plan):
+    """Return the hot tables that the query plan reads with a full table scan"""
+    if connection.vendor == 'sqlite':
+        # "SCAN table" (with or without "USING INDEX") walks the whole table or one of its indexes
+        scans = (re.match(r'SCAN (\w+)', line) for line in plan)
+        return [match[1] for match in scans if match and match[1] in HOT_TABLES]
+    tables = re.findall(r'"table_name": "(\w+)",\s*"access_type": "ALL"', plan[0])
+    return [table for table in tables if table in HOT_TABLES]
+
+
+class QueryPlanTests(TestCase):
+    """
+    Capture the queries of the hot paths and make sure none of them regresses to a full table scan.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        other_user = get_user_model().objects.create_user(
+            username='otheruser', password='testpass123', email='otheruser@email.com')
+        today = date.today()
+        for user in (cls.user, other_user):
+            for i in range(3):
+                subject = Subject.objects.create(user=user, name=f'subject {i}')
+                tag = Tag.objects.create(user=user, name=f'tag {i}')
+                for day in range(5):
+                    timelog = TimeLog.objects.create(
+                        user=user, subject=subject, duration=30, date=today - timedelta(days=day))
+                    timelog.tags.add(tag)
+                    record_timelog(timelog)
+        # let the planner see the real shape of the tables
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertNoFullScans(self, captured):
+        selects = [query['sql'] for query in captured if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = explain(sql)
+            with self.subTest(sql=sql):
+                self.assertEqual(full_scans(plan), [], msg='\n'.join(plan))
+
+    def capture(self, url, **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return captured
+
+    def test_home_page(self):
+        self.assertNoFullScans(self.capture(reverse('timing:home')))
+
+    def test_chart_data_api(self):
+        end = date.today()
+        start = end - timedelta(days=3)
+        for kind in ('date', 'subject', 'tag'):
+            with self.subTest(kind=kind):
+                captured = self.capture(
+                    reverse('timing:chart-data-api', args=[kind]), start=start, end=end)
+                self.assertNoFullScans(captured)
+
+    def test_timelog_list(self):
+        response = self.client.get(reverse('timing:timelogs'))
+        self.assertNoFullScans(self.capture(reverse('timing:timelogs')))
+        # the next pages seek on (last_modified, id)
+        cursor = response.context['page_obj'].next_cursor
+        self.assertNoFullScans(self.capture(reverse('timing:timelogs'), cursor=cursor))
+
+    def test_autocomplete_api(self):
+        for kind in ('subjects', 'tags'):
+            with self.subTest(kind=kind):
+                url = reverse('timing:autocomplete-api', args=[kind])
+                self.assertNoFullScans(self.capture(url, q='s'))
+                self.assertNoFullScans(self.capture(url))
+
+    def test_subject_and_tag_lists(self):
+        self.assertNoFullScans(self.capture(reverse('timing:subjects')))
+        self.assertNoFullScans(self.capture(reverse('timing:tags')))
+
+    def test_remaining_duration_check_of_timelog_form(self):
+        subject = self.user.subject_set.first()
+        form = TimeLogForm(
+            data={'subject': subject.pk, 'hours': 1, 'minutes': 0, 'date': date.today()},
+            registrant_user=self.user)
+        with CaptureQueriesContext(connection) as captured:
+            form.is_valid()
+        self.assertNoFullScans(captured)
+
+    def test_name_checks_of_subject_and_tag_forms(self):
+        forms = (
+            SubjectForm(data={'name': 'Subject 0'}, user_subjects=self.user.subject_set.all()),
+            TagForm(data={'name': 'new tag'}, user_tags=self.user.tag_set.all()),
+        )
+        for form in forms:
+            with CaptureQueriesContext(connection) as captured:
+                form.is_valid()
+            self.assertNoFullScans(captured)
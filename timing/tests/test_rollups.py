@@ -0,0 +1,145 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+
+from timing.cache import get_or_create_chart_data
+from timing.models import DailySubjectTotal, DailyTotal, Subject, TimeLog
+from timing.rollups import (
+    DailyLimitExceeded, discard_timelog, get_remaining_minutes, rebuild_user_rollups,
+    record_timelog, reserve_daily_minutes
+)
+
+
+
+class DailySubjectTotalTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.subject = Subject.objects.create(user=self.user, name='subject 1')
+        self.today = datetime.date.today()
+
+    def create_timelog(self, duration):
+        timelog = TimeLog.objects.create(user=self.user, subject=self.subject, date=self.today, duration=duration)
+        record_timelog(timelog)
+        return timelog
+
+    def test_record_and_discard_timelogs(self):
+        timelog_1 = self.create_timelog(30)
+        timelog_2 = self.create_timelog(45)
+        daily_total = DailySubjectTotal.objects.get(user=self.user, subject=self.subject, date=self.today)
+        self.assertEqual((daily_total.total_minutes, daily_total.log_count), (75, 2))
+
+        discard_timelog(timelog_1)
+        daily_total.refresh_from_db()
+        self.assertEqual((daily_total.total_minutes, daily_total.log_count), (45, 1))
+        # the row is removed with the last timelog of the day
+        discard_timelog(timelog_2)
+        self.assertFalse(DailySubjectTotal.objects.exists())
+
+    def test_views_keep_daily_totals_up_to_date(self):
+        self.client.login(username='testuser', password='testpass123')
+        self.client.post(reverse('timing:timelogs'), data={
+            'subject': self.subject.pk,
+            'hours': 1,
+            'minutes': 30,
+            'date': self.today.isoformat(),
+        })
+        daily_total = DailySubjectTotal.objects.get(user=self.user, subject=self.subject, date=self.today)
+        self.assertEqual((daily_total.total_minutes, daily_total.log_count), (90, 1))
+
+        timelog = TimeLog.objects.get(user=self.user)
+        self.client.post(reverse('timing:timelog-delete', kwargs={'pk': timelog.pk}))
+        self.assertFalse(DailySubjectTotal.objects.exists())
+
+        self.create_timelog(30)
+        self.client.post(reverse('timing:subject-delete', kwargs={'pk': self.subject.pk}))
+        self.assertFalse(DailySubjectTotal.objects.exists())
+        # the subject's minutes can be logged again
+        self.assertFalse(DailyTotal.objects.exists())
+
+    def test_rebuild_user_rollups_repairs_drift(self):
+        self.create_timelog(30)
+        # a timelog without rollup, a drifted row and a stale row
+        TimeLog.objects.create(user=self.user, subject=self.subject, date=self.today, duration=15)
+        yesterday = self.today - datetime.timedelta(days=1)
+        DailySubjectTotal.objects.create(
+            user=self.user, subject=self.subject, date=yesterday, total_minutes=10, log_count=1)
+
+        # the daily subject total and the daily total of today are both updated
+        self.assertEqual(rebuild_user_rollups(self.user), (0, 2, 1))
+        self.assertEqual(
+            list(DailySubjectTotal.objects.values_list('date', 'total_minutes', 'log_count')),
+            [(self.today, 45, 2)]
+        )
+        self.assertEqual(list(DailyTotal.objects.values_list('date', 'total_minutes')), [(self.today, 45)])
+        # nothing to repair anymore
+        self.assertEqual(rebuild_user_rollups(self.user), (0, 0, 0))
+
+    def test_rebuild_user_rollups_invalidates_the_chart_data(self):
+        create_chart_data = mock.Mock(return_value={})
+        get_or_create_chart_data(self.user.pk, ('home',), create_chart_data)
+        rebuild_user_rollups(self.user)
+        get_or_create_chart_data(self.user.pk, ('home',), create_chart_data)
+        self.assertEqual(create_chart_data.call_count, 2)
+
+    def test_rebuild_rollups_command(self):
+        TimeLog.objects.create(user=self.user, subject=self.subject, date=self.today, duration=15)
+        call_command('rebuild_rollups', 'testuser', stdout=StringIO())
+        daily_total = DailySubjectTotal.objects.get(user=self.user, subject=self.subject, date=self.today)
+        self.assertEqual((daily_total.total_minutes, daily_total.log_count), (15, 1))
+
+
+class DailyTotalTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.subject = Subject.objects.create(user=self.user, name='subject 1')
+        self.today = datetime.date.today()
+
+    def test_reserve_daily_minutes_up_to_the_limit(self):
+        reserve_daily_minutes(self.user.pk, self.today, 1000)
+        reserve_daily_minutes(self.user.pk, self.today, 440)
+        self.assertEqual(DailyTotal.objects.get(user=self.user, date=self.today).total_minutes, 1440)
+        self.assertEqual(get_remaining_minutes(self.user.pk, self.today), 0)
+
+    def test_reserve_daily_minutes_beyond_the_limit_raises(self):
+        reserve_daily_minutes(self.user.pk, self.today, 1000)
+        with self.assertRaises(DailyLimitExceeded) as cm:
+            reserve_daily_minutes(self.user.pk, self.today, 441)
+        self.assertEqual(cm.exception.remaining_minutes, 440)
+        # the failed reservation doesn't change the total
+        self.assertEqual(DailyTotal.objects.get(user=self.user, date=self.today).total_minutes, 1000)
+
+    def test_discard_timelog_frees_its_minutes(self):
+        timelog = TimeLog.objects.create(user=self.user, subject=self.subject, date=self.today, duration=1440)
+        record_timelog(timelog)
+        self.assertEqual(get_remaining_minutes(self.user.pk, self.today), 0)
+        discard_timelog(timelog)
+        self.assertEqual(get_remaining_minutes(self.user.pk, self.today), 1440)
+        self.assertFalse(DailyTotal.objects.exists())
+
+    def test_view_rejects_timelog_when_the_day_is_taken_concurrently(self):
+        """If another request takes the day after the form is validated, nothing is saved"""
+        self.client.login(username='testuser', password='testpass123')
+        reserve_daily_minutes(self.user.pk, self.today, 1400)
+        # the form still sees the whole day, like a request that validated before the other one committed
+        with mock.patch('timing.forms.get_remaining_minutes', return_value=1440):
+            response = self.client.post(reverse('timing:timelogs'), data={
+                'subject': self.subject.pk,
+                'hours': 1,
+                'minutes': 0,
+                'date': self.today.isoformat(),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            f'Your remaind duration for {self.today} is 0 hours and 40 minutes.',
+            response.context['timelog_form'].non_field_errors()
+        )
+        self.assertFalse(TimeLog.objects.exists())
+        self.assertFalse(DailySubjectTotal.objects.exists())
+        self.assertEqual(DailyTotal.objects.get(user=self.user, date=self.today).total_minutes, 1400)
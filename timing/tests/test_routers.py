@@ -0,0 +1,83 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from timing.models import Subject, TimeLog
+from timing.routers import PIN_COOKIE_NAME
+
+
+
+@override_settings(TIMING_REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """
+    The 'replica' test database isn't replicated, so the timelog has a different description in
+    each database and the pages show which one they've read.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        self.subject = Subject.objects.create(user=self.user, name='coding')
+        timelog = TimeLog.objects.create(
+            user=self.user, subject=self.subject, date=datetime.date.today(), duration=30, description='on primary')
+        # the same rows on the replica
+        self.user.save(using='replica')
+        self.subject.save(using='replica')
+        timelog.description = 'on replica'
+        timelog.save(using='replica')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_lists_and_exports_read_from_the_replica(self):
+        for url in (reverse('timing:timelogs'), reverse('timing:timelogs') + '?page=1', reverse('timing:home')):
+            response = self.client.get(url)
+            self.assertContains(response, 'on replica')
+            self.assertNotContains(response, 'on primary')
+        response = self.client.get(reverse('timing:timelogs-export', kwargs={'file_format': 'csv'}))
+        self.assertIn('on replica', b''.join(response.streaming_content).decode())
+
+    def test_rows_and_charts_read_from_the_replica_are_not_cached(self):
+        # they'd be cached for the current version of the data, which a lagging replica may not have yet
+        Subject.objects.using('replica').filter(pk=self.subject.pk).update(name='old name')
+        chart_url = reverse('timing:chart-data-api', kwargs={'kind': 'subject'})
+        self.assertContains(self.client.get(reverse('timing:timelogs')), 'on replica')
+        self.assertIn('old name', self.client.get(chart_url).content.decode())
+
+        # a pinned browser reads from the primary, and the primary's rows are cached
+        self.client.cookies[PIN_COOKIE_NAME] = '1'
+        self.assertContains(self.client.get(reverse('timing:timelogs')), 'on primary')
+        self.assertIn('coding', self.client.get(chart_url).content.decode())
+        del self.client.cookies[PIN_COOKIE_NAME]
+        self.assertContains(self.client.get(reverse('timing:timelogs')), 'on primary')
+        self.assertIn('coding', self.client.get(chart_url).content.decode())
+
+    def test_reads_without_the_decorator_use_the_primary(self):
+        response = self.client.get(reverse('timing:timelog-detail', kwargs={'pk': TimeLog.objects.get().pk}))
+        self.assertContains(response, 'on primary')
+
+    def test_reads_after_a_write_are_sticky_to_the_primary(self):
+        response = self.client.post(reverse('timing:timelogs'), {
+            'subject': self.subject.pk, 'hours': 1, 'minutes': 0, 'date': datetime.date.today().isoformat(),
+            'description': 'new one'
+        }, follow=True)
+        # the redirected list is read from the primary, which has the new timelog
+        self.assertEqual(response.redirect_chain[0][0], reverse('timing:timelogs'))
+        self.assertContains(response, 'new one')
+        self.assertContains(response, 'on primary')
+        self.assertIn(PIN_COOKIE_NAME, self.client.cookies)
+
+        # the browser reads from the replica again once the pin expires (the list's rows are cached now)
+        del self.client.cookies[PIN_COOKIE_NAME]
+        response = self.client.get(reverse('timing:timelogs-export', kwargs={'file_format': 'csv'}))
+        self.assertIn('on replica', b''.join(response.streaming_content).decode())
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(TimeLog.objects.get().description, 'on primary')
+
+    @override_settings(TIMING_REPLICA_DATABASES=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertContains(self.client.get(reverse('timing:timelogs')), 'on primary')
+        self.client.post(reverse('timing:subjects'), {'name': 'reading'})
+        self.assertNotIn(PIN_COOKIE_NAME, self.client.cookies)
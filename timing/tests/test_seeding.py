@@ -0,0 +1,52 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.test import TestCase
+
+from timing.models import DailyTotal, Subject, Tag, TimeLog
+from timing.seeding import SEED_PASSWORD, seed_users
+
+
+
+class SeedLoadTests(TestCase):
+    def test_command_creates_users_with_history(self):
+        out = StringIO()
+        call_command('seed_load', '2', '--subjects', '3', '--tags', '2', '--years', '0.1',
+                     '--timelogs-per-day', '2', stdout=out)
+        self.assertIn('2 user(s) created', out.getvalue())
+
+        users = get_user_model().objects.filter(username__in=['load-1', 'load-2'])
+        self.assertEqual(users.count(), 2)
+        for user in users:
+            self.assertTrue(user.check_password(SEED_PASSWORD))
+            self.assertEqual(TimeLog.objects.filter(user=user).count(), 36 * 2)
+            self.assertLessEqual(Subject.objects.filter(user=user).count(), 3)
+            self.assertLessEqual(Tag.objects.filter(user=user).count(), 2)
+            # the rollups are recorded with the timelogs
+            self.assertEqual(
+                DailyTotal.objects.filter(user=user).aggregate(Sum('total_minutes'))['total_minutes__sum'],
+                TimeLog.objects.filter(user=user).aggregate(Sum('duration'))['duration__sum']
+            )
+        self.assertEqual(
+            TimeLog.objects.filter(user__username='load-1').latest('date').date, datetime.date.today()
+        )
+
+    def test_same_options_generate_the_same_data(self):
+        end_date = datetime.date(2022, 5, 1)
+
+        def rows(prefix):
+            seed_users(1, years=0.05, username_prefix=prefix, seed=7, end_date=end_date)
+            return list(
+                TimeLog.objects.filter(user__username=f'{prefix}-1')
+                .order_by('date', 'subject__name', 'duration').values_list('date', 'subject__name', 'duration')
+            )
+        self.assertEqual(rows('first'), rows('second'))
+
+    def test_existing_users_are_not_seeded_again(self):
+        call_command('seed_load', '1', '--years', '0.01', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'exist already'):
+            call_command('seed_load', '1', '--years', '0.01', stdout=StringIO())
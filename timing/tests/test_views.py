@@ -1,13 +1,18 @@
 import datetime
 import json
 from time import sleep
+from unittest import mock
 
 from django.test import TestCase
 from django.urls import reverse, resolve
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 
 import timing
-from timing.models import TimeLog, Subject, Tag
+from timing.views import BATCH_MAX_TIMELOGS
+from timing.models import DailyTotal, TimeLog, Subject, Tag
+from timing.rollups import record_timelog, record_timelogs
 
 
 
@@ -117,6 +122,8 @@ class HomeViewTests(TestCase):
             duration=120
         )
         timelog_4.tags.add(tag_1)
+        for timelog in (timelog_1, timelog_2, timelog_3, timelog_4):
+            record_timelog(timelog)
 
         # date based chart datasets
         date_based_chart_labels = [yesterday.isoformat(), today.isoformat()]
@@ -136,34 +143,41 @@ class HomeViewTests(TestCase):
             ((timelog_1.duration + timelog_3.duration) // 60),
             ((timelog_1.duration + timelog_4.duration) // 60)
         ]
-        # get json charts data from home page and convert it to python objects
-        response = self.client.get(self.url, data={'start': yesterday.isoformat(), 'end': today.isoformat()})
-        date_based_chart_data = response.context['date_based_chart_data']
-        subject_based_chart_data = response.context['subject_based_chart_data']
-        tag_based_chart_data = response.context['tag_based_chart_data']
+        # get json charts data from the chart data api and convert it to python objects
+        date_range = {'start': yesterday.isoformat(), 'end': today.isoformat()}
+        response = self.client.get(self.url, data=date_range)
+        date_based_chart_data, subject_based_chart_data, tag_based_chart_data = [
+            self.client.get(reverse('timing:chart-data-api', kwargs={'kind': kind}), data=date_range).json()
+            for kind in ('date', 'subject', 'tag')
+        ]
 
         # date based chart data asserts
         self.assertEqual(date_based_chart_data['labels'], date_based_chart_labels)
+        # the datasets are columnar, one list per dataset property
+        self.assertEqual(
+            date_based_chart_data['datasets']['label'],
+            [dataset['label'] for dataset in date_based_chart_datasets]
+        )
         # test firs dataset
         self.assertEqual(
-            date_based_chart_data['datasets'][0]['data'],
+            date_based_chart_data['datasets']['data'][0],
             date_based_chart_datasets[0]['data']
         )
         # test seccond dataset
         self.assertEqual(
-            date_based_chart_data['datasets'][1]['data'],
+            date_based_chart_data['datasets']['data'][1],
             date_based_chart_datasets[1]['data']
         )
         # subject based chart data asserts
         self.assertEqual(subject_based_chart_data['labels'], subject_based_chart_labels)
         self.assertEqual(
-            subject_based_chart_data['datasets'][0]['data'],
+            subject_based_chart_data['datasets']['data'][0],
             subject_based_chart_dataset_data
         )
         # tag based chart data asserts
         self.assertEqual(tag_based_chart_data['labels'], tag_based_chart_labels)
         self.assertEqual(
-            tag_based_chart_data['datasets'][0]['data'],
+            tag_based_chart_data['datasets']['data'][0],
             tag_based_chart_dataset_data
         )
 
@@ -176,6 +190,226 @@ class HomeViewTests(TestCase):
         )
 
 
+class ChartDataApiViewTests(TestCase):
+    def setUp(self):
+        get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_chart_data_api_url_resolves_chart_data_api_view(self):
+        view = resolve(reverse('timing:chart-data-api', kwargs={'kind': 'date'}))
+        self.assertEqual(view.func, timing.views.chart_data_api)
+
+    def test_chart_data_api_without_records(self):
+        for kind in ('date', 'subject', 'tag'):
+            response = self.client.get(reverse('timing:chart-data-api', kwargs={'kind': kind}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(response.json()['labels'], [])
+
+    def test_unknown_chart_kind(self):
+        response = self.client.get(reverse('timing:chart-data-api', kwargs={'kind': 'unknown'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_chart_data_is_gzipped(self):
+        # responses shorter than 200 bytes aren't compressed
+        user = get_user_model().objects.get(username='testuser')
+        for i in range(10):
+            Subject.objects.create(user=user, name=f'subject {i}')
+        response = self.client.get(
+            reverse('timing:chart-data-api', kwargs={'kind': 'subject'}),
+            HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class DateBucketsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        self.subject = Subject.objects.create(user=self.user, name='subject')
+        self.url = reverse('timing:chart-data-api', kwargs={'kind': 'date'})
+
+    def create_timelog(self, date, duration):
+        record_timelog(TimeLog.objects.create(user=self.user, subject=self.subject, date=date, duration=duration))
+
+    def test_bucket_by_week(self):
+        # 2022-05-02 is monday
+        self.create_timelog(datetime.date(2022, 5, 3), 60)
+        self.create_timelog(datetime.date(2022, 5, 8), 30)
+        self.create_timelog(datetime.date(2022, 5, 9), 120)
+        chart_data = self.client.get(self.url, data={'bucket': 'week'}).json()
+        self.assertEqual(chart_data['bucket'], 'week')
+        self.assertEqual(chart_data['labels'], ['2022-05-02', '2022-05-09'])
+        self.assertEqual(chart_data['datasets']['data'], [[1.5, 2.0]])
+
+    def test_bucket_by_month(self):
+        self.create_timelog(datetime.date(2022, 1, 31), 60)
+        self.create_timelog(datetime.date(2022, 3, 1), 90)
+        chart_data = self.client.get(self.url, data={'bucket': 'month'}).json()
+        self.assertEqual(chart_data['labels'], ['2022-01-01', '2022-02-01', '2022-03-01'])
+        self.assertEqual(chart_data['datasets']['data'], [[1.0, 0, 1.5]])
+
+    def test_bucket_is_chosen_by_range_length(self):
+        self.create_timelog(datetime.date(2019, 1, 1), 60)
+        self.create_timelog(datetime.date(2022, 5, 10), 60)
+        chart_data = self.client.get(self.url).json()
+        self.assertEqual(chart_data['bucket'], 'month')
+        self.assertEqual(len(chart_data['labels']), 41)
+        # an unknown bucket is ignored
+        chart_data = self.client.get(self.url, data={'bucket': 'year'}).json()
+        self.assertEqual(chart_data['bucket'], 'month')
+        chart_data = self.client.get(self.url, data={'start': '2022-05-01', 'end': '2022-05-10'}).json()
+        self.assertEqual(chart_data['bucket'], 'day')
+
+
+class AutocompleteApiViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        other_user = get_user_model().objects.create_user(
+            username='otheruser', password='testpass123', email='otheruser@email.com')
+        for name in ('reading', 'running', 'coding'):
+            Subject.objects.create(user=self.user, name=name)
+        Subject.objects.create(user=other_user, name='rowing')
+        self.url = reverse('timing:autocomplete-api', args=['subjects'])
+        self.client.login(username='testuser', password='testpass123')
+
+    def names(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.json()['results']]
+
+    def test_prefix_search_is_case_insensitive(self):
+        self.assertEqual(self.names(q='R'), ['reading', 'running'])
+        self.assertEqual(self.names(q='run'), ['running'])
+        self.assertEqual(self.names(q='x'), [])
+
+    def test_recently_used_names_rank_first(self):
+        subject = Subject.objects.get(user=self.user, name='running')
+        self.client.post(reverse('timing:timelogs'), data={
+            'subject': subject.pk, 'hours': 1, 'minutes': 0, 'date': datetime.date.today().isoformat()})
+        self.assertEqual(self.names(q='r'), ['running', 'reading'])
+        self.assertEqual(self.names(), ['running', 'coding', 'reading'])
+
+    def test_limit(self):
+        self.assertEqual(len(self.names(limit=2)), 2)
+        self.assertEqual(len(self.names(limit='bad')), 3)
+
+    def test_tags(self):
+        Tag.objects.create(user=self.user, name='focused')
+        response = self.client.get(reverse('timing:autocomplete-api', args=['tags']), {'q': 'foc'})
+        self.assertEqual([result['name'] for result in response.json()['results']], ['focused'])
+
+    def test_unknown_kind(self):
+        response = self.client.get(reverse('timing:autocomplete-api', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_timelog_form_renders_only_the_selected_options(self):
+        response = self.client.get(reverse('timing:timelogs'))
+        self.assertContains(response, 'data-autocomplete-url="%s"' % self.url)
+        self.assertNotContains(response, 'reading')
+
+
+class TimelogsBatchApiViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass123', email='testuser@email.com')
+        Subject.objects.create(user=self.user, name='coding')
+        Tag.objects.create(user=self.user, name='focused')
+        self.url = reverse('timing:timelogs-batch-api')
+        self.today = datetime.date.today()
+        self.client.login(username='testuser', password='testpass123')
+
+    def post(self, entries):
+        return self.client.post(self.url, json.dumps({'timelogs': entries}), content_type='application/json')
+
+    def entries(self, count, duration=60, first_day=0):
+        return [
+            {'date': (self.today - datetime.timedelta(days=day)).isoformat(), 'subject': 'coding',
+             'duration': duration, 'tags': ['focused']}
+            for day in range(first_day, first_day + count)
+        ]
+
+    def test_create_timelogs(self):
+        response = self.post(self.entries(3))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['created']), 3)
+        self.assertEqual(TimeLog.objects.filter(user=self.user, tags__name='focused').count(), 3)
+        self.assertEqual(self.user.daily_totals.count(), 3)
+
+    def test_number_of_queries_does_not_grow_with_entries(self):
+        # the first request also reads the user into the users cache
+        self.post([])
+        with CaptureQueriesContext(connection) as few:
+            self.post(self.entries(2))
+        with CaptureQueriesContext(connection) as many:
+            self.post(self.entries(20, first_day=2))
+        self.assertEqual(len(few), len(many))
+
+    def test_largest_batch_stays_within_the_budget(self):
+        # several bulk insert batches on SQLite, the entries share the 24 hours of their dates
+        entries = self.entries(BATCH_MAX_TIMELOGS // 10, duration=60) * 10
+        response = self.post(entries)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(TimeLog.objects.filter(tags__name='focused').count(), BATCH_MAX_TIMELOGS)
+        self.assertEqual(set(self.user.daily_totals.values_list('total_minutes', flat=True)), {600})
+
+    def test_daily_limit_is_checked_for_all_entries(self):
+        entries = self.entries(1, duration=1000) + self.entries(1, duration=441)
+        response = self.post(entries)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.today), response.json()['error'])
+        self.assertFalse(TimeLog.objects.exists())
+
+    def test_unknown_subject_rejects_the_batch(self):
+        entries = self.entries(1) + [{'date': self.today.isoformat(), 'subject': 'unknown', 'duration': 10}]
+        response = self.post(entries)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Unknown subject "unknown".')
+        self.assertFalse(TimeLog.objects.exists())
+
+    def test_invalid_body(self):
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.post([{'date': 'yesterday', 'subject': 'coding', 'duration': 10}])
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['error'].startswith('Record 1:'))
+
+    def test_lost_race_for_a_new_daily_total_is_retried_once(self):
+        calls = []
+
+        def lose_the_first_race(user, timelogs, **kwargs):
+            calls.append(len(timelogs))
+            if len(calls) == 1:
+                # a concurrent request has inserted the daily total of the same date first
+                raise IntegrityError('UNIQUE constraint failed: timing_dailytotal.user_id, timing_dailytotal.date')
+            return record_timelogs(user, timelogs, **kwargs)
+
+        with mock.patch('timing.imports.record_timelogs', side_effect=lose_the_first_race):
+            response = self.post(self.entries(1))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(TimeLog.objects.count(), 1)
+        self.assertEqual(DailyTotal.objects.get().total_minutes, 60)
+
+    def test_lost_race_twice_is_a_conflict(self):
+        with mock.patch('timing.imports.record_timelogs', side_effect=IntegrityError):
+            response = self.post(self.entries(1))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(TimeLog.objects.exists())
+
+    def test_get_is_not_allowed(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
 class TimeLogDetailViewTests(TestCase):
     def setUp(self):
         user = get_user_model().objects.create_user(username='test', password='testpass123')
@@ -238,6 +472,15 @@ class SubjectsViewTests(TestCase):
         response = self.client.post(self.page_url, subject_data, follow=True)
         self.assertContains(response, "Subject &quot;test subject&quot; successfully added!")
 
+    def test_add_subject_created_concurrently(self):
+        """If the same name is created after the form is validated, the unique constraint rejects it"""
+        Subject.objects.create(user=self.testuser, name='test subject')
+        with mock.patch('timing.forms.name_exists', return_value=False):
+            response = self.client.post(self.page_url, {'name': 'Test Subject'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('test subject already exists.', response.context['subject_form'].non_field_errors())
+        self.assertEqual(self.testuser.subject_set.count(), 1)
+
 
 class SubjectDetailViewTests(TestCase):
     def setUp(self):
@@ -315,6 +558,15 @@ class TagsViewTests(TestCase):
         response = self.client.post(self.page_url, {'name': 'test tag'}, follow=True)
         self.assertContains(response, "Tag &quot;test tag&quot; successfully added!")
 
+    def test_add_tag_created_concurrently(self):
+        """If the same name is created after the form is validated, the unique constraint rejects it"""
+        Tag.objects.create(user=self.testuser, name='test tag')
+        with mock.patch('timing.forms.name_exists', return_value=False):
+            response = self.client.post(self.page_url, {'name': 'TEST TAG'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('test tag already exists.', response.context['tag_form'].non_field_errors())
+        self.assertEqual(self.testuser.tag_set.count(), 1)
+
 
 class TagDetailViewTests(TestCase):
     def setUp(self):
@@ -425,6 +677,7 @@ class TimelogDeleteTests(TestCase):
             duration=120
         )
         self.timelog.tags.add(tag_1, tag_2)
+        record_timelog(self.timelog)
         
         self.client.login(username='testuser', password='testpass123')
         self.url = reverse('timing:timelog-delete', kwargs={'pk': self.timelog.pk})
@@ -1,14 +1,22 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 
 app_name = 'timing'
 urlpatterns = [
     path('', views.index, name='index'),
-    path('home/', views.home, name='home'),
+    path('metrics', views.metrics, name='metrics'),
+    path('home/', async_views.home if settings.TIMING_ASYNC_VIEWS else views.home, name='home'),
+    path('api/charts/<slug:kind>/', views.chart_data_api, name='chart-data-api'),
+    path('api/autocomplete/<slug:kind>/', views.autocomplete_api, name='autocomplete-api'),
+    path('api/timelogs/batch/', views.timelogs_batch_api, name='timelogs-batch-api'),
+    path('api/stats/fragment-cache/', views.fragment_cache_stats_api, name='fragment-cache-stats-api'),
+    path('api/jobs/<uuid:pk>/', views.job_api, name='job-api'),
     # timelogs
     path('timelogs/', views.timelogs, name='timelogs'),
+    path('timelogs/export/<slug:file_format>/', views.timelogs_export, name='timelogs-export'),
     path('timelogs/<uuid:pk>/', views.timelog_detail, name='timelog-detail'),
     path('timelogs/delete/<uuid:pk>/', views.timelog_delete, name='timelog-delete'),
     # subjects
@@ -18,5 +26,7 @@ urlpatterns = [
     # tags
     path('tags/', views.tags, name='tags'),
     path('tags/<uuid:pk>/', views.tag_detail, name='tag-detail'),
-    path('tags/delete/<uuid:pk>/', views.tag_delete, name='tag-delete')
+    path('tags/delete/<uuid:pk>/', views.tag_delete, name='tag-delete'),
+    # background jobs
+    path('jobs/<uuid:pk>/', views.job_detail, name='job-detail'),
 ]
\ No newline at end of file
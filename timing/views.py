@@ -1,16 +1,54 @@
 import datetime
-from random import randint
+import hashlib
+import json
+from urllib.parse import urlencode
 
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect, render, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Max, Min
 from django.core.paginator import Paginator
 from django.contrib import messages
-
-from .forms import DateForm, TimeLogForm, SubjectForm, TagForm
-
-
-
+from django.db import IntegrityError, OperationalError, transaction
+
+from .forms import DateForm, TimeLogForm, SubjectForm, TagForm, daily_limit_error, name_exists
+from .aggregation import get_aggregation_engine, sum_durations_by_subject_and_period
+from .rollups import DailyLimitExceeded, record_timelog, discard_timelog
+from .cache import fragment_cache_stats, get_or_create_chart_data
+from .pagination import CursorPaginator
+from .autocomplete import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, mark_used, search_names
+from .exports import EXPORT_FORMATS, iter_timelog_records
+from .metrics import collect, render_metrics
+from .imports import TimeLogImportError, create_timelogs, parse_records
+from .routers import read_from_replica
+from .query_budget import query_budget
+from .deletion import BACKGROUND_DELETION_THRESHOLD, delete_subject
+from .jobs import enqueue
+from .models import Job
+
+
+CHART_KINDS = ('date', 'subject', 'tag')
+AUTOCOMPLETE_KINDS = ('subjects', 'tags')
+# the maximum number of timelogs in a batch api request
+BATCH_MAX_TIMELOGS = 1000
+DATE_BUCKETS = ('day', 'week', 'month')
+# the longest date ranges (in days) that are shown by day and by week, longer ones are shown by month
+DAY_BUCKET_MAX_DAYS = 92
+WEEK_BUCKET_MAX_DAYS = 731
+# MySQL's error code of a deadlock, the transaction is rolled back and can simply run again
+MYSQL_DEADLOCK_ERROR = 1213
+# the page each kind of background job goes back to when it's done, and what it does
+JOB_REDIRECTS = {'delete_subject': 'timing:subjects'}
+JOB_VERBS = {'delete_subject': 'deleted', 'delete_user': 'deleted', 'rebuild_rollups': 'rebuilt'}
+
+
+
+@query_budget(2)
 def index(request):
     if request.user.is_authenticated:
         return redirect('timing:home')
@@ -18,38 +56,123 @@ def index(request):
 
 
 @login_required
+@read_from_replica
+@query_budget(5)
 def home(request):
-    user_timelogs = request.user.timelogs
-    # get min and max date from user's timelogs
-    min_date, max_date = user_timelogs.aggregate(Min('date'), Max('date')).values()
+    min_date, max_date = get_user_date_bounds(request.user)
+    timelogs = request.user.timelogs.select_related('subject').all()[:10]
+    # the charts are fetched from the chart data api by the page itself
+    return render(request, 'timing/home.html', create_home_context(request, min_date, max_date, timelogs))
+
+
+def create_home_context(request, min_date, max_date, timelogs):
+    # the context of the home page (see also async_views.home)
+    start, end = request.GET.get('start'), request.GET.get('end')
     date_form = DateForm(min_date=min_date, max_date=max_date)
-    if request.GET.get('start') and request.GET.get('end'):
+    chart_params = {}
+    if start and end:
         date_form = DateForm(request.GET, min_date=min_date, max_date=max_date)
-        if date_form.is_valid():
-            # override the min and max dates with user's specified dates
-            form_dates = date_form.clean()
-            min_date, max_date = form_dates['start'], form_dates['end']
-    
-    dates = create_dates_list(min_date, max_date)
-    available_dates = set(user_timelogs.filter(date__range=(min_date, max_date))\
-                          .values_list('date', flat=True).distinct())
-    user_subjects = request.user.subject_set.all().order_by('last_modified')
-    user_tags = request.user.tag_set.all().order_by('last_modified')
-    related_timelogs = list(user_timelogs.select_related('subject').prefetch_related('tags')\
-                            .filter(date__range=(min_date, max_date), subject__in=user_subjects))
-    context = {
-        'date_based_chart_data': create_date_based_chart_data(
-            related_timelogs, user_subjects, dates, available_dates
-        ),
-        'subject_based_chart_data': create_subject_based_chart_data(related_timelogs, user_subjects),
-        'tag_based_chart_data':  create_tag_based_chart_data(related_timelogs, user_tags),
-        'timelogs': user_timelogs.select_related('subject').all()[:10],
+        # validate the form to show its errors
+        date_form.is_valid()
+        chart_params.update(start=start, end=end)
+    bucket = request.GET.get('bucket')
+    if bucket in DATE_BUCKETS:
+        chart_params['bucket'] = bucket
+
+    return {
+        'chart_query': urlencode(chart_params),
+        'date_buckets': DATE_BUCKETS,
+        'bucket': bucket,
+        'timelogs': timelogs,
         'date_form': date_form
     }
-    return render(request, 'timing/home.html', context)
 
 
 @login_required
+@read_from_replica
+@gzip_page
+@query_budget(5)
+def chart_data_api(request, kind):
+    if kind not in CHART_KINDS:
+        raise Http404(f'There is no "{kind}" chart.')
+    content = get_chart_content(
+        request.user, kind, request.GET.get('start'), request.GET.get('end'), request.GET.get('bucket')
+    )
+    return HttpResponse(content, content_type='application/json')
+
+
+@login_required
+@query_budget(2)
+def autocomplete_api(request, kind):
+    """Return the user's subjects or tags whose names start with ?q=, the most recently used first"""
+    if kind not in AUTOCOMPLETE_KINDS:
+        raise Http404('Unknown autocomplete kind')
+    queryset = request.user.subject_set.all() if kind == 'subjects' else request.user.tag_set.all()
+    try:
+        limit = min(max(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 1), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    results = search_names(queryset, request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [{'id': str(pk), 'name': name} for pk, name in results]})
+
+
+@staff_member_required
+@query_budget(1)
+def fragment_cache_stats_api(request):
+    """Return the hits and misses of the cached template fragments of this process, and the time they saved"""
+    return JsonResponse({'fragments': fragment_cache_stats.as_dict()})
+
+
+@query_budget(1)
+def metrics(request):
+    """The request metrics in the Prometheus text format, only for the scrapers of settings.TIMING_METRICS_ALLOWED_IPS"""
+    if request.META.get('REMOTE_ADDR') not in settings.TIMING_METRICS_ALLOWED_IPS:
+        raise PermissionDenied
+    return HttpResponse(render_metrics(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@login_required
+@require_POST
+# a batch of any size runs about 12 queries (the batches of its bulk inserts count once), twice for a
+# retry after a lost race
+@query_budget(30)
+def timelogs_batch_api(request):
+    """
+    Create many timelogs of a JSON body, all of them or none, e.g.
+    {"timelogs": [{"date": "2022-03-20", "subject": "coding", "duration": 90, "tags": ["focused"], "description": ""}]}
+    The subjects and tags must exist, the 24-hour limit is checked for all the dates together.
+    """
+    try:
+        entries = json.loads(request.body)['timelogs']
+        if not isinstance(entries, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'The body must be a JSON object with a "timelogs" list.'}, status=400)
+    if len(entries) > BATCH_MAX_TIMELOGS:
+        return JsonResponse({'error': f'A batch can have at most {BATCH_MAX_TIMELOGS} timelogs.'}, status=400)
+
+    try:
+        rows = parse_records(entries)
+        try:
+            timelogs, _, _ = create_timelogs(request.user, rows, create_missing_names=False)
+        except (IntegrityError, OperationalError) as exc:
+            if not is_lost_race(exc):
+                raise
+            # try it once more, the daily totals that the concurrent request has created are locked now
+            try:
+                timelogs, _, _ = create_timelogs(request.user, rows, create_missing_names=False)
+            except (IntegrityError, OperationalError) as exc:
+                if not is_lost_race(exc):
+                    raise
+                return JsonResponse({'error': 'A concurrent request has changed the same dates, try again.'}, status=409)
+    except TimeLogImportError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({'created': [str(timelog.pk) for timelog in timelogs]}, status=201)
+
+
+@login_required
+@read_from_replica
+@query_budget(25)
 def timelogs(request):
     # timelog form
     user = request.user
@@ -62,28 +185,49 @@ def timelogs(request):
             timelog = timelog_form.save(commit=False)
             timelog.user = user
             timelog.duration = duration
-            timelog.save()
-            timelog_form.save_m2m()
-            messages.add_message(
-                    request, level=250,
-                    message='Record successfully added!',
-                    extra_tags='success')
-            return redirect('timing:timelogs')
+            try:
+                with transaction.atomic():
+                    timelog.save()
+                    timelog_form.save_m2m()
+                    record_timelog(timelog)
+                    mark_used(timelog)
+            except DailyLimitExceeded as exc:
+                # a concurrent request has taken the remaining minutes of the date since the form was validated
+                timelog_form.add_error(None, daily_limit_error(exc.date, exc.remaining_minutes))
+            else:
+                messages.add_message(
+                        request, level=250,
+                        message='Record successfully added!',
+                        extra_tags='success')
+                return redirect('timing:timelogs')
 
     # pagination the timelog records
-    page_num = request.GET.get('page')
-    paginator = Paginator(user.timelogs.select_related('subject'), per_page=10)
-    page_obj = paginator.get_page(page_num)
+    page_obj, page_range = paginate(request, user.timelogs.select_related('subject'))
 
     context = {
         'page_obj': page_obj,
-        'page_range': paginator.get_elided_page_range(page_obj.number),
+        'page_range': page_range,
         'timelog_form': timelog_form
     }
     return render(request, 'timing/timelogs_list.html', context)
 
 
 @login_required
+@read_from_replica
+# the rows are read while the response is streamed, a keyset query and the tags of each chunk
+@query_budget(0, max_queries_per_chunk=2)
+def timelogs_export(request, file_format):
+    """Stream all of the user's timelogs as a CSV or NDJSON file, without loading them in memory"""
+    if file_format not in EXPORT_FORMATS:
+        raise Http404('Unknown export format')
+    stream, content_type = EXPORT_FORMATS[file_format]
+    response = StreamingHttpResponse(stream(iter_timelog_records(request.user)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="timelogs-{datetime.date.today()}.{file_format}"'
+    return response
+
+
+@login_required
+@query_budget(5)
 def timelog_detail(request, pk):
     timelog = get_object_or_404(request.user.timelogs.all(), pk=pk)
     context = {
@@ -93,10 +237,13 @@ def timelog_detail(request, pk):
 
 
 @login_required
+@query_budget(12)
 def timelog_delete(request, pk):
     timelog = get_object_or_404(request.user.timelogs.all(), pk=pk)
     if request.method == 'POST':
-        timelog.delete()
+        with transaction.atomic():
+            discard_timelog(timelog)
+            timelog.delete()
         messages.add_message(request, level=250, extra_tags='success',
                              message='Record successfully deleted!')
         return redirect('timing:timelogs')
@@ -106,6 +253,8 @@ def timelog_delete(request, pk):
 
 
 @login_required
+@read_from_replica
+@query_budget(8)
 def subjects(request):
     all_user_subjects = request.user.subject_set.all()
     subject_form = SubjectForm(user_subjects=all_user_subjects)
@@ -114,27 +263,26 @@ def subjects(request):
         if subject_form.is_valid():
             subject = subject_form.save(commit=False)
             subject.user = request.user
-            subject.save()
-            messages.add_message(
-                request, level=250,
-                message=f'Subject "{subject.name}" successfully added!',
-                extra_tags='success')
-            return redirect('timing:subjects')
+            if save_with_unique_name(subject_form, subject, all_user_subjects):
+                messages.add_message(
+                    request, level=250,
+                    message=f'Subject "{subject.name}" successfully added!',
+                    extra_tags='success')
+                return redirect('timing:subjects')
 
     # pagination
-    page_num = request.GET.get('page')
-    paginator = Paginator(all_user_subjects, per_page=10)
-    page_obj = paginator.get_page(page_num)
+    page_obj, page_range = paginate(request, all_user_subjects)
 
     context = {
         'page_obj': page_obj,
-        'page_range': paginator.get_elided_page_range(page_obj.number),
+        'page_range': page_range,
         'subject_form': subject_form
     }
     return render(request, 'timing/subjects.html', context)
 
 
 @login_required
+@query_budget(8)
 def subject_detail(request, pk):
     subject = get_object_or_404(request.user.subject_set.all(), pk=pk)
     user_subjects = request.user.subject_set.exclude(pk=pk)
@@ -145,8 +293,7 @@ def subject_detail(request, pk):
             user_subjects=user_subjects,
             data=request.POST
         )
-        if subject_form.is_valid():
-            subject_form.save()
+        if subject_form.is_valid() and save_with_unique_name(subject_form, subject, user_subjects):
             messages.add_message(
                 request, level=250, extra_tags='success',
                 message='subject successfully updated!'
@@ -158,10 +305,18 @@ def subject_detail(request, pk):
 
 
 @login_required
+@query_budget(20)
 def subject_delete(request, pk):
     subject = get_object_or_404(request.user.subject_set.all(), pk=pk)
     if request.method == 'POST':
-        subject.delete()
+        timelogs_count = subject.timelog_set.count()
+        if timelogs_count > BACKGROUND_DELETION_THRESHOLD:
+            job = enqueue('delete_subject', user=request.user, label=f'Subject "{subject.name}"',
+                          total=timelogs_count, subject_id=str(subject.pk))
+            return redirect('timing:job-detail', pk=job.pk)
+        # set-wise in short transactions, its timelogs aren't loaded by the collector
+        # and their minutes are removed from the daily totals
+        delete_subject(subject)
         messages.add_message(request, level=250, extra_tags='success',
                              message=f'Subject "{subject.name}" successfully deleted!')
         return redirect('timing:subjects')
@@ -171,6 +326,36 @@ def subject_delete(request, pk):
 
 
 @login_required
+@query_budget(2)
+def job_detail(request, pk):
+    """The progress of a background job, it goes back to its list once the job is done"""
+    job = get_object_or_404(request.user.jobs.all(), pk=pk)
+    if job.status == Job.DONE:
+        messages.add_message(request, level=250, extra_tags='success',
+                             message=f'{job.label} successfully {JOB_VERBS.get(job.name, "processed")}!')
+        return redirect(JOB_REDIRECTS.get(job.name, 'timing:home'))
+
+    context = {
+        'job': job,
+        'verb': JOB_VERBS.get(job.name, 'processed'),
+        'percent': round(100 * job.progress / job.total) if job.total else 0,
+    }
+    return render(request, 'timing/job_detail.html', context)
+
+
+@login_required
+@query_budget(2)
+def job_api(request, pk):
+    """Return the status and the progress of a background job"""
+    job = get_object_or_404(request.user.jobs.all(), pk=pk)
+    return JsonResponse({
+        'status': job.status, 'progress': job.progress, 'total': job.total, 'attempts': job.attempts,
+    })
+
+
+@login_required
+@read_from_replica
+@query_budget(8)
 def tags(request):
     all_user_tags = request.user.tag_set.all()
     tag_form = TagForm(user_tags=all_user_tags)
@@ -179,27 +364,26 @@ def tags(request):
         if tag_form.is_valid():
             tag = tag_form.save(commit=False)
             tag.user = request.user
-            tag.save()
-            messages.add_message(
-                request, level=250,
-                message=f'Tag "{tag.name}" successfully added!',
-                extra_tags='success')
-            return redirect('timing:tags')
+            if save_with_unique_name(tag_form, tag, all_user_tags):
+                messages.add_message(
+                    request, level=250,
+                    message=f'Tag "{tag.name}" successfully added!',
+                    extra_tags='success')
+                return redirect('timing:tags')
 
     # pagination
-    page_num = request.GET.get('page')
-    paginator = Paginator(all_user_tags, per_page=10)
-    page_obj = paginator.get_page(page_num)
+    page_obj, page_range = paginate(request, all_user_tags)
 
     context = {
         'page_obj': page_obj,
-        'page_range': paginator.get_elided_page_range(page_obj.number),
+        'page_range': page_range,
         'tag_form': tag_form
     }
     return render(request, 'timing/tags.html', context)
 
 
 @login_required
+@query_budget(8)
 def tag_detail(request, pk):
     tag = get_object_or_404(request.user.tag_set.all(), pk=pk)
     user_tags = request.user.tag_set.exclude(pk=pk)
@@ -210,8 +394,7 @@ def tag_detail(request, pk):
             user_tags=user_tags,
             data=request.POST
         )
-        if tag_form.is_valid():
-            tag_form.save()
+        if tag_form.is_valid() and save_with_unique_name(tag_form, tag, user_tags):
             messages.add_message(
                 request, level=250, extra_tags='success',
                 message='tag successfully updated!'
@@ -223,6 +406,7 @@ def tag_detail(request, pk):
 
 
 @login_required
+@query_budget(8)
 def tag_delete(request, pk):
     tag = get_object_or_404(request.user.tag_set.all(), pk=pk)
     if request.method == 'POST':
@@ -235,21 +419,123 @@ def tag_delete(request, pk):
     return render(request, 'timing/tag_delete.html', context)
 
 
-def create_date_based_chart_data(related_timelogs, subjects, dates, available_dates):
+def save_with_unique_name(form, obj, user_objects):
+    """
+    Save a validated subject or tag. If a concurrent request has taken its name since the form
+    was validated, the unique constraint rejects it, then add the error to the form and return False.
+    """
+    try:
+        with transaction.atomic():
+            obj.save()
+    except IntegrityError:
+        if not name_exists(user_objects, obj.name):
+            raise
+        form.add_error(None, f'{obj.name} already exists.')
+        return False
+    return True
+
+
+def is_lost_race(exc):
+    # a concurrent transaction has inserted the same row first (e.g. the daily total of a new date),
+    # or it has deadlocked with this one on MySQL
+    return isinstance(exc, IntegrityError) or exc.args[:1] == (MYSQL_DEADLOCK_ERROR,)
+
+
+def paginate(request, queryset, per_page=10):
+    # the numbered (offset) pagination is kept for the ?page= links, otherwise the rows are paginated
+    # with a cursor, which doesn't count the rows nor skip them. so it has no page range.
+    if request.GET.get('page'):
+        paginator = Paginator(queryset.order_by('-last_modified', '-pk'), per_page=per_page)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        return page_obj, paginator.get_elided_page_range(page_obj.number)
+    return CursorPaginator(queryset, per_page=per_page).get_page(request.GET.get('cursor')), None
+
+
+def get_user_date_bounds(user):
+    # get min and max date from user's timelogs
+    return get_or_create_chart_data(
+        user.pk, ('date-bounds',),
+        lambda: tuple(user.daily_subject_totals.aggregate(Min('date'), Max('date')).values())
+    )
+
+
+def get_chart_content(user, kind, start=None, end=None, bucket=None):
+    # only the date based chart is bucketed, by day, week or month (chosen by the range length if not given)
+    if kind != 'date' or bucket not in DATE_BUCKETS:
+        bucket = None
+    # the serialized chart data is cached for each date range until the user's data changes
+    return get_or_create_chart_data(
+        user.pk, (kind, start, end, bucket),
+        lambda: json.dumps(
+            create_columnar_chart_data(create_chart_data(user, kind, start, end, bucket)),
+            separators=(',', ':')
+        )
+    )
+
+
+def get_chart_date_range(user, start=None, end=None):
+    min_date, max_date = get_user_date_bounds(user)
+    if start and end:
+        date_form = DateForm({'start': start, 'end': end}, min_date=min_date, max_date=max_date)
+        if date_form.is_valid():
+            # override the min and max dates with user's specified dates
+            form_dates = date_form.clean()
+            min_date, max_date = form_dates['start'], form_dates['end']
+    return min_date, max_date
+
+
+def create_chart_data(user, kind, start=None, end=None, bucket=None, engine=None):
+    # the charts are built from the pre-summed daily subject totals instead of the raw timelogs
+    # except the tag based chart, which needs the timelogs' tags
+    engine = engine or get_aggregation_engine()
+    min_date, max_date = get_chart_date_range(user, start, end)
+    related_daily_totals = user.daily_subject_totals.filter(date__range=(min_date, max_date))
+    if kind == 'date':
+        bucket = bucket or choose_date_bucket(min_date, max_date)
+        spent_mins_rows = list(sum_durations_by_subject_and_period(related_daily_totals, bucket))
+        available_dates = {date for _, date, _ in spent_mins_rows}
+        chart_data = create_date_based_chart_data(
+            spent_mins_rows,
+            user.subject_set.all().order_by('last_modified'),
+            create_dates_list(min_date, max_date, bucket),
+            available_dates,
+            engine
+        )
+        chart_data['bucket'] = bucket
+        return chart_data
+    if kind == 'subject':
+        return create_subject_based_chart_data(
+            engine.subject_totals(related_daily_totals),
+            user.subject_set.all().order_by('last_modified')
+        )
+    return create_tag_based_chart_data(
+        engine.tag_totals(user.timelogs.filter(date__range=(min_date, max_date))),
+        user.tag_set.all().order_by('last_modified')
+    )
+
+
+def create_columnar_chart_data(chart_data):
+    # turn the list of dataset objects into one list per dataset property, so property names
+    # aren't repeated for each dataset, e.g. {'label': [...], 'backgroundColor': [...], 'data': [[...], ...]}
+    datasets = chart_data['datasets']
+    columns = {key: [dataset[key] for dataset in datasets] for key in (datasets[0] if datasets else {})}
+    return {**chart_data, 'datasets': columns}
+
+
+def create_date_based_chart_data(related_timelogs, subjects, dates, available_dates, engine=None):
     # create json data for date based chart (stacked bar chart)
+    # sum up the duration time (based on minutes) of related timelogs for each subject and date at once
+    engine = engine or get_aggregation_engine()
+    spent_mins_matrix = engine.date_subject_matrix(related_timelogs, [subject.pk for subject in subjects], dates)
     datasets = []
     # create dataset and add them to the datasets list
-    for subject in subjects:
+    for subject, spent_mins_list in zip(subjects, spent_mins_matrix):
         dataset = {}
-        # generate random color for each dataset
-        dataset['backgroundColor'] = f'rgb({randint(0, 255)},{randint(0, 255)},{randint(0, 255)})'
+        dataset['backgroundColor'] = create_color(subject.pk)
         dataset['label'] = subject.name
         dataset['data'] = []
-        # get all related timelogs with each date and sum up the duration time (based on minutes)
-        for date in dates:
+        for date, spent_mins in zip(dates, spent_mins_list):
             if date in available_dates:
-                spent_mins = sum(timelog.duration for timelog in related_timelogs
-                                 if timelog.date == date and timelog.subject == subject)
                 # add the sum of timelogs duration based on hours to the data
                 dataset['data'].append(round((spent_mins / 60), 1))
             else:
@@ -260,8 +546,9 @@ def create_date_based_chart_data(related_timelogs, subjects, dates, available_da
     return {'labels': [d.isoformat() for d in dates], 'datasets': datasets}
 
 
-def create_subject_based_chart_data(related_timelogs, subjects):
+def create_subject_based_chart_data(spent_mins_by_subject, subjects):
     # create json data for subject based chart (doughnut chart)
+    # spent_mins_by_subject maps each subject id to its total duration (based on minutes)
     labels = []
     dataset = {
         'data': [],
@@ -269,20 +556,21 @@ def create_subject_based_chart_data(related_timelogs, subjects):
     }
     for subject in subjects:
         labels.append(subject.name)
-        spent_mins = sum(timelog.duration for timelog in related_timelogs
-                         if timelog.subject == subject)
+        spent_mins = spent_mins_by_subject.get(subject.pk, 0)
         dataset['data'].append(round((spent_mins / 60), 1))
-        dataset['backgroundColor'].append(f'rgb({randint(0, 255)},{randint(0, 255)},{randint(0, 255)})')
+        dataset['backgroundColor'].append(create_color(subject.pk))
     
-    # sort the labels and data
-    labels = [label for label, _ in sorted(zip(labels, dataset['data']), key=lambda t: t[1], reverse=True)]
-    dataset['data'].sort(reverse=True)
+    # sort the labels, data and colors based on data
+    labels, dataset['data'], dataset['backgroundColor'] = sort_chart_data(
+        labels, dataset['data'], dataset['backgroundColor']
+    )
 
     return {'labels': labels, 'datasets': [dataset]}
 
 
-def create_tag_based_chart_data(related_timelogs, tags):
+def create_tag_based_chart_data(spent_mins_by_tag, tags):
     # create json data for tag based chart (horizontal bar chart)
+    # spent_mins_by_tag maps each tag id to its total duration (based on minutes)
     labels = []
     dataset = {
         'data': [],
@@ -290,23 +578,64 @@ def create_tag_based_chart_data(related_timelogs, tags):
     }
     for tag in tags:
         labels.append(tag.name)
-        spent_mins = sum(timelog.duration for timelog in related_timelogs
-                         if tag in timelog.tags.all())
+        spent_mins = spent_mins_by_tag.get(tag.pk, 0)
         dataset['data'].append(round((spent_mins / 60), 1))
-        dataset['backgroundColor'].append(f'rgb({randint(0, 255)},{randint(0, 255)},{randint(0, 255)})')
+        dataset['backgroundColor'].append(create_color(tag.pk))
     
-    # sort the labels and data
-    labels = [label for label, _ in sorted(zip(labels, dataset['data']), key=lambda t: t[1], reverse=True)]
-    dataset['data'].sort(reverse=True)
+    # sort the labels, data and colors based on data
+    labels, dataset['data'], dataset['backgroundColor'] = sort_chart_data(
+        labels, dataset['data'], dataset['backgroundColor']
+    )
     
     return {'labels': labels, 'datasets': [dataset]}
 
 
-def create_dates_list(min_date, max_date):
+def create_color(key):
+    # derive the color from the subject's or tag's id, so it's the same on every request
+    red, green, blue = hashlib.md5(str(key).encode()).digest()[:3]
+    return f'rgb({red},{green},{blue})'
+
+
+def sort_chart_data(labels, data, colors):
+    # sort the labels and colors along with the data in descending order
+    if not labels:
+        return [], [], []
+    rows = sorted(zip(labels, data, colors), key=lambda t: t[1], reverse=True)
+    return [list(column) for column in zip(*rows)]
+
+
+def choose_date_bucket(min_date, max_date):
+    # keep the number of labels bounded no matter how long the date range is
+    if min_date is None or (max_date - min_date).days < DAY_BUCKET_MAX_DAYS:
+        return 'day'
+    if (max_date - min_date).days < WEEK_BUCKET_MAX_DAYS:
+        return 'week'
+    return 'month'
+
+
+def truncate_date(date, bucket='day'):
+    # return the first day of the date's bucket (week starts on monday)
+    if bucket == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    if bucket == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def create_dates_list(min_date, max_date, bucket='day'):
+    # create the list of the first days of each bucket between the min and max dates
     if min_date and max_date:
+        min_date = truncate_date(min_date, bucket)
         dates = [min_date]
-        while min_date < max_date:
-            min_date += datetime.timedelta(days=1)
+        while True:
+            if bucket == 'week':
+                min_date += datetime.timedelta(days=7)
+            elif bucket == 'month':
+                min_date = (min_date + datetime.timedelta(days=31)).replace(day=1)
+            else:
+                min_date += datetime.timedelta(days=1)
+            if min_date > max_date:
+                break
             dates.append(min_date)
         return dates
     return []
\ No newline at end of file